@@ -33,6 +33,7 @@ from app.models import (
     audit,
     alert,
     report,
+    factors,
 )
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,36 @@
+"""Add factor_version to events_enriched
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 09:00:00
+
+The worker reloads factor files without restarting and tags every enriched
+event with the version (content hash) of the factor snapshot that produced
+its kwh/water_l/co2_kg values. Storing it lets re-enrichment jobs find the
+rows computed with outdated factors.
+
+Existing rows keep factor_version = NULL (factors unknown).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add nullable factor_version column to events_enriched."""
+    op.add_column('events_enriched',
+        sa.Column('factor_version', sa.String(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Remove factor_version column from events_enriched."""
+    op.drop_column('events_enriched', 'factor_version')
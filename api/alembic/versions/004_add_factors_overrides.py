@@ -0,0 +1,68 @@
+"""Add factors_overrides table
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 10:00:00
+
+Org-scoped factor overrides (docs/ARCHITECTURE.md: factors_overrides).
+One row per (org_id, provider, model); model = '' covers every model of
+the provider and NULL factors fall back to the global defaults.
+
+Workers cache overrides in process. A trigger sends
+NOTIFY factors_overrides, '<org_id>' on every change so the caches are
+invalidated when the writing transaction commits, whichever client wrote it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create factors_overrides and its change-notification trigger."""
+    op.create_table(
+        'factors_overrides',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('org_id', sa.String(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False, server_default=''),
+        sa.Column('kwh_per_call', sa.Float(), nullable=True),
+        sa.Column('pue', sa.Float(), nullable=True),
+        sa.Column('water_l_per_kwh', sa.Float(), nullable=True),
+        sa.Column('co2_kg_per_kwh', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('org_id', 'provider', 'model', name='uq_factors_overrides_org_provider_model')
+    )
+
+    op.execute("""
+        CREATE FUNCTION notify_factors_overrides() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('factors_overrides', COALESCE(NEW.org_id, OLD.org_id));
+            IF TG_OP = 'UPDATE' AND NEW.org_id IS DISTINCT FROM OLD.org_id THEN
+                PERFORM pg_notify('factors_overrides', OLD.org_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER factors_overrides_notify
+        AFTER INSERT OR UPDATE OR DELETE ON factors_overrides
+        FOR EACH ROW EXECUTE FUNCTION notify_factors_overrides()
+    """)
+
+
+def downgrade() -> None:
+    """Drop factors_overrides and its trigger."""
+    op.execute("DROP TRIGGER IF EXISTS factors_overrides_notify ON factors_overrides")
+    op.execute("DROP FUNCTION IF EXISTS notify_factors_overrides()")
+    op.drop_table('factors_overrides')
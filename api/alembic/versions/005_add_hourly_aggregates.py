@@ -0,0 +1,58 @@
+"""Add hourly_org_agg and hourly_provider_agg tables
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 12:00:00
+
+Hourly rollups maintained by the worker next to the daily ones, so sub-day
+ranges (alert windows such as "1h", query ranges under 48 hours) never scan
+events_enriched. Rows are kept for WORKER_HOURLY_RETENTION_DAYS and pruned
+by `python -m worker.maintenance prune-hourly`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the hourly aggregate tables."""
+    op.create_table(
+        'hourly_org_agg',
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('org_id', sa.String(), nullable=False),
+        sa.Column('call_count', sa.Integer(), nullable=True),
+        sa.Column('kwh', sa.Float(), nullable=True),
+        sa.Column('water_l', sa.Float(), nullable=True),
+        sa.Column('co2_kg', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('hour', 'org_id')
+    )
+    op.create_index('ix_hourly_org_org_hour', 'hourly_org_agg', ['org_id', 'hour'])
+
+    op.create_table(
+        'hourly_provider_agg',
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('org_id', sa.String(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('call_count', sa.Integer(), nullable=True),
+        sa.Column('kwh', sa.Float(), nullable=True),
+        sa.Column('water_l', sa.Float(), nullable=True),
+        sa.Column('co2_kg', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('hour', 'org_id', 'provider')
+    )
+    op.create_index('ix_hourly_provider_org_hour', 'hourly_provider_agg', ['org_id', 'hour'])
+
+
+def downgrade() -> None:
+    """Drop the hourly aggregate tables."""
+    op.drop_index('ix_hourly_provider_org_hour', table_name='hourly_provider_agg')
+    op.drop_table('hourly_provider_agg')
+    op.drop_index('ix_hourly_org_org_hour', table_name='hourly_org_agg')
+    op.drop_table('hourly_org_agg')
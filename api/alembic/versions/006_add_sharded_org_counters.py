@@ -0,0 +1,54 @@
+"""Add sharded daily_org_agg counters
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 13:00:00
+
+Every event of an org increments the same daily_org_agg (date, org_id) row,
+so concurrent workers queue on its row lock and the row churns dead tuples.
+daily_org_agg gains a `shard` key column: each worker adds an org's deltas
+to its own shard (out of orgs.agg_shards, default 1) and readers sum across
+shards. Existing rows become shard 0.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add orgs.agg_shards and the daily_org_agg shard key column."""
+    op.add_column('orgs', sa.Column('agg_shards', sa.Integer(), nullable=False, server_default='1'))
+    op.create_check_constraint('ck_orgs_agg_shards', 'orgs', 'agg_shards BETWEEN 1 AND 64')
+
+    op.add_column('daily_org_agg', sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+    op.drop_constraint('daily_org_agg_pkey', 'daily_org_agg', type_='primary')
+    op.create_primary_key('daily_org_agg_pkey', 'daily_org_agg', ['date', 'org_id', 'shard'])
+
+
+def downgrade() -> None:
+    """Fold shards back into one row per (date, org_id) and drop the shard columns."""
+    op.execute("""
+        CREATE TEMP TABLE daily_org_agg_folded ON COMMIT DROP AS
+        SELECT date, org_id, sum(call_count) AS call_count, sum(kwh) AS kwh,
+               sum(water_l) AS water_l, sum(co2_kg) AS co2_kg
+        FROM daily_org_agg GROUP BY date, org_id
+    """)
+    op.execute("DELETE FROM daily_org_agg")
+    op.drop_constraint('daily_org_agg_pkey', 'daily_org_agg', type_='primary')
+    op.drop_column('daily_org_agg', 'shard')
+    op.create_primary_key('daily_org_agg_pkey', 'daily_org_agg', ['date', 'org_id'])
+    op.execute("""
+        INSERT INTO daily_org_agg (date, org_id, call_count, kwh, water_l, co2_kg)
+        SELECT date, org_id, call_count, kwh, water_l, co2_kg FROM daily_org_agg_folded
+    """)
+
+    op.drop_constraint('ck_orgs_agg_shards', 'orgs', type_='check')
+    op.drop_column('orgs', 'agg_shards')
@@ -0,0 +1,51 @@
+"""Time-ordered events_enriched ids
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 14:00:00
+
+Random ids (gen_random_uuid(), uuid4) scatter primary key inserts over the
+whole index, so every insert touches a random leaf page once the index no
+longer fits in memory. The worker now assigns UUIDv7 ids (48-bit Unix
+milliseconds first) at enrichment time; this adds the matching uuid_v7()
+SQL function and makes it the column default for any other writer.
+
+Existing ids are left as they are. To rewrite them as well, run
+`python -m worker.maintenance rekey-events` and then
+REINDEX INDEX CONCURRENTLY events_enriched_pkey.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create uuid_v7() and use it as the events_enriched.id default."""
+    # A v4 UUID with its first 48 bits replaced by the timestamp and the
+    # version nibble turned from 4 (0100) into 7 (0111)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION uuid_v7(ts timestamptz DEFAULT clock_timestamp())
+        RETURNS uuid AS $$
+            SELECT encode(
+                set_bit(set_bit(
+                    overlay(uuid_send(gen_random_uuid())
+                            PLACING substring(int8send(floor(extract(epoch FROM ts) * 1000)::bigint) FROM 3)
+                            FROM 1 FOR 6),
+                    52, 1), 53, 1),
+                'hex')::uuid
+        $$ LANGUAGE sql VOLATILE
+    """)
+    op.execute("ALTER TABLE events_enriched ALTER COLUMN id SET DEFAULT uuid_v7()::text")
+
+
+def downgrade() -> None:
+    """Drop the default and uuid_v7()."""
+    op.execute("ALTER TABLE events_enriched ALTER COLUMN id DROP DEFAULT")
+    op.execute("DROP FUNCTION IF EXISTS uuid_v7(timestamptz)")
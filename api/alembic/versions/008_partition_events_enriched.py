@@ -0,0 +1,129 @@
+"""Range-partition events_enriched by day on ts
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 15:00:00
+
+events_enriched becomes a partitioned table with one partition per UTC day
+(events_enriched_pYYYYMMDD), so inserts only maintain the indexes of the
+current day, queries bounded on ts touch only the partitions they need, and
+retention drops whole days instead of deleting rows.
+
+The existing table is not rewritten: it is attached as the partition
+events_enriched_legacy covering everything before the day after its newest
+event. Attaching needs a unique (id, ts) index and a validated CHECK on ts,
+both of which scan the table while the migration holds its lock; on a large
+table, build the index online first:
+
+    CREATE UNIQUE INDEX CONCURRENTLY events_enriched_legacy_id_ts ON events_enriched (id, ts);
+
+Daily partitions are created for the next PARTITION_DAYS_AHEAD days and then
+kept ahead by `python -m worker.maintenance create-partitions`; events
+outside every partition land in events_enriched_default until then.
+"""
+from datetime import date, datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITION_DAYS_AHEAD = 14
+
+INDEXES = {
+    'ix_events_org_ts': ['org_id', 'ts'],
+    'ix_events_user_ts': ['user_id', 'ts'],
+    'ix_events_enriched_org_id': ['org_id'],
+    'ix_events_enriched_ts': ['ts'],
+    'ix_events_enriched_user_id': ['user_id'],
+}
+
+
+def _create_day_partition(day: date):
+    start, end = day, day + timedelta(days=1)
+    op.execute(
+        f"CREATE TABLE events_enriched_p{day:%Y%m%d} PARTITION OF events_enriched "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    """Swap events_enriched for a partitioned table with the old one as its first partition."""
+    newest = op.get_bind().execute(sa.text("SELECT max(ts) FROM events_enriched")).scalar()
+    today = datetime.utcnow().date()
+    cutover = max(today, newest.date() + timedelta(days=1)) if newest else today
+
+    op.rename_table('events_enriched', 'events_enriched_legacy')
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+    # Match the coming parent's primary key, reusing an index built beforehand;
+    # this also frees the events_enriched_pkey name
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS events_enriched_legacy_id_ts "
+        "ON events_enriched_legacy (id, ts)"
+    )
+    op.execute("ALTER TABLE events_enriched_legacy DROP CONSTRAINT events_enriched_pkey")
+    op.execute(
+        "ALTER TABLE events_enriched_legacy ADD CONSTRAINT events_enriched_legacy_pkey "
+        "PRIMARY KEY USING INDEX events_enriched_legacy_id_ts"
+    )
+
+    op.create_table(
+        'events_enriched',
+        sa.Column('id', sa.String(), nullable=False, server_default=sa.text("uuid_v7()::text")),
+        sa.Column('org_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=True),
+        sa.Column('tokens_in', sa.Integer(), nullable=True),
+        sa.Column('tokens_out', sa.Integer(), nullable=True),
+        sa.Column('node_type', sa.String(), nullable=True),
+        sa.Column('region', sa.String(), nullable=True),
+        sa.Column('kwh', sa.Float(), nullable=False),
+        sa.Column('water_l', sa.Float(), nullable=False),
+        sa.Column('co2_kg', sa.Float(), nullable=False),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.Column('source', sa.String(), nullable=True),
+        sa.Column('metadata', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('factor_version', sa.String(), nullable=True),
+        # The partition key must be part of every unique constraint
+        sa.PrimaryKeyConstraint('id', 'ts'),
+        postgresql_partition_by='RANGE (ts)',
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'events_enriched', columns)
+
+    # A validated CHECK lets ATTACH skip its own scan of the table
+    op.execute(
+        f"ALTER TABLE events_enriched_legacy ADD CONSTRAINT events_enriched_legacy_ts "
+        f"CHECK (ts < '{cutover.isoformat()}') NOT VALID"
+    )
+    op.execute("ALTER TABLE events_enriched_legacy VALIDATE CONSTRAINT events_enriched_legacy_ts")
+    op.execute(
+        f"ALTER TABLE events_enriched ATTACH PARTITION events_enriched_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{cutover.isoformat()}')"
+    )
+    op.execute("ALTER TABLE events_enriched_legacy DROP CONSTRAINT events_enriched_legacy_ts")
+
+    for i in range((today - cutover).days + PARTITION_DAYS_AHEAD + 1):
+        _create_day_partition(cutover + timedelta(days=i))
+    op.execute("CREATE TABLE events_enriched_default PARTITION OF events_enriched DEFAULT")
+
+
+def downgrade() -> None:
+    """Copy every partition back into a plain events_enriched table."""
+    op.rename_table('events_enriched', 'events_enriched_partitioned')
+    op.execute("CREATE TABLE events_enriched (LIKE events_enriched_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO events_enriched SELECT * FROM events_enriched_partitioned")
+    op.execute("DROP TABLE events_enriched_partitioned CASCADE")
+
+    op.create_primary_key('events_enriched_pkey', 'events_enriched', ['id'])
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'events_enriched', columns)
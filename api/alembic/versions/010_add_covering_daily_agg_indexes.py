@@ -0,0 +1,49 @@
+"""Covering (org_id, date) indexes on the daily aggregate tables
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 17:00:00
+
+The primary keys of daily_user_agg, daily_provider_agg and daily_model_agg
+lead with date, so /aggregate/daily (one org, a date range) reads every
+org's rows for those dates. These indexes lead with (org_id, date), then the
+grouping columns, and INCLUDE the summed measures, so the query is answered
+by an index-only scan of one org's range. Built CONCURRENTLY to run online.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '010'
+down_revision: Union[str, None] = '009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MEASURES = ['call_count', 'kwh', 'water_l', 'co2_kg']
+
+INDEXES = {
+    'ix_daily_user_org_date': ('daily_user_agg', ['org_id', 'date', 'user_id']),
+    'ix_daily_provider_org_date': ('daily_provider_agg', ['org_id', 'date', 'provider']),
+    'ix_daily_model_org_date': ('daily_model_agg', ['org_id', 'date', 'provider', 'model']),
+}
+
+
+def upgrade() -> None:
+    """Build the covering indexes without blocking aggregate upserts."""
+    with op.get_context().autocommit_block():
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(
+                name, table, columns,
+                postgresql_include=MEASURES,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Drop the covering indexes."""
+    with op.get_context().autocommit_block():
+        for name, (table, _) in INDEXES.items():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""Add per-org ingest modes
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 18:00:00
+
+Orgs that only use the dashboards do not need a raw events_enriched row per
+call. orgs.ingest_mode selects what the worker writes: every event ("full",
+the default), a deterministic 1-in-raw_sample_rate sample ("sampled") or no
+raw rows ("aggregate_only"). Aggregates are exact in every mode.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011'
+down_revision: Union[str, None] = '010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add orgs.ingest_mode and orgs.raw_sample_rate."""
+    op.add_column('orgs', sa.Column('ingest_mode', sa.String(), nullable=False, server_default='full'))
+    op.create_check_constraint(
+        'ck_orgs_ingest_mode', 'orgs', "ingest_mode IN ('full', 'sampled', 'aggregate_only')"
+    )
+    op.add_column('orgs', sa.Column('raw_sample_rate', sa.Integer(), nullable=False, server_default='10'))
+    op.create_check_constraint('ck_orgs_raw_sample_rate', 'orgs', 'raw_sample_rate BETWEEN 1 AND 10000')
+
+
+def downgrade() -> None:
+    """Drop the ingest mode columns."""
+    op.drop_constraint('ck_orgs_raw_sample_rate', 'orgs', type_='check')
+    op.drop_column('orgs', 'raw_sample_rate')
+    op.drop_constraint('ck_orgs_ingest_mode', 'orgs', type_='check')
+    op.drop_column('orgs', 'ingest_mode')
@@ -0,0 +1,37 @@
+"""Add events_enriched.sample_weight
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 19:00:00
+
+Orgs in the "sampled" ingest mode (011) keep one raw row per raw_sample_rate
+events. Each row now records how many events it stands for, so queries over
+raw rows can scale counts and sums by it (estimates stay unbiased even when
+an org's rate changes). Rows of full-mode orgs, and all existing rows,
+have weight 1. Adding a column with a constant default does not rewrite
+the partitions.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012'
+down_revision: Union[str, None] = '011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add sample_weight with a default of 1."""
+    op.add_column(
+        'events_enriched',
+        sa.Column('sample_weight', sa.SmallInteger(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade() -> None:
+    """Drop sample_weight."""
+    op.drop_column('events_enriched', 'sample_weight')
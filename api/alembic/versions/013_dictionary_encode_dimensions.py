@@ -0,0 +1,141 @@
+"""Dictionary-encode users, providers, models and regions
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 20:00:00
+
+Every events_enriched row repeats its user id, provider, model and region
+as text, and so do the primary keys and covering indexes of the aggregate
+tables. A `dimensions` table now holds each (kind, value) once under an
+integer id, and those columns are replaced by integer keys: user_key,
+provider_key, model_key and region_key. Workers resolve keys through an
+in-memory cache (worker/services/dimensions.py); the API joins dimensions
+to return and filter by the strings. org_id stays text: it is the tenant key
+shared with orgs, users, audit logs and overrides.
+
+The keys have no foreign keys, so inserts do not check dimensions; keys are
+never deleted. This migration rewrites every events_enriched row, so run it
+in a maintenance window with the workers stopped. Dropped columns and the
+old row versions only free their space once the tables are rewritten: run
+`VACUUM FULL` (or pg_repack) on the aggregate tables and on each
+events_enriched partition afterwards, or let retention age them out.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '013'
+down_revision: Union[str, None] = '012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Encoded column -> key column per table; the column name is the dimension kind
+ENCODED = {
+    'events_enriched': {'user_id': 'user_key', 'provider': 'provider_key', 'model': 'model_key', 'region': 'region_key'},
+    'daily_user_agg': {'user_id': 'user_key'},
+    'daily_provider_agg': {'provider': 'provider_key'},
+    'daily_model_agg': {'provider': 'provider_key', 'model': 'model_key'},
+    'hourly_provider_agg': {'provider': 'provider_key'},
+}
+
+# Nullable since 001
+NULLABLE = {('events_enriched', 'model'), ('events_enriched', 'region')}
+
+PRIMARY_KEYS = {
+    'daily_user_agg': ['date', 'org_id', 'user_id'],
+    'daily_provider_agg': ['date', 'org_id', 'provider'],
+    'daily_model_agg': ['date', 'org_id', 'provider', 'model'],
+    'hourly_provider_agg': ['hour', 'org_id', 'provider'],
+}
+
+MEASURES = ['call_count', 'kwh', 'water_l', 'co2_kg']
+
+# Covering indexes from 010, and the user index from 001
+INDEXES = {
+    'ix_daily_user_org_date': ('daily_user_agg', ['org_id', 'date', 'user_id'], MEASURES),
+    'ix_daily_provider_org_date': ('daily_provider_agg', ['org_id', 'date', 'provider'], MEASURES),
+    'ix_daily_model_org_date': ('daily_model_agg', ['org_id', 'date', 'provider', 'model'], MEASURES),
+    'ix_events_user_ts': ('events_enriched', ['user_id', 'ts'], None),
+}
+
+
+def _keyed(table: str, columns):
+    """`columns` with the encoded ones replaced by their key columns."""
+    return [ENCODED[table].get(column, column) for column in columns]
+
+
+def _drop_keys():
+    for name, (table, _, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in PRIMARY_KEYS:
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+
+
+def _create_keys(encoded: bool):
+    for table, columns in PRIMARY_KEYS.items():
+        op.create_primary_key(f'{table}_pkey', table, _keyed(table, columns) if encoded else columns)
+    for name, (table, columns, include) in INDEXES.items():
+        op.create_index(name, table, _keyed(table, columns) if encoded else columns,
+                        postgresql_include=include or [])
+
+
+def upgrade() -> None:
+    """Create and fill dimensions, then swap the text columns for their keys."""
+    op.create_table(
+        'dimensions',
+        sa.Column('id', sa.Integer(), sa.Identity(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('kind', 'value', name='uq_dimensions_kind_value'),
+    )
+
+    values = " UNION ".join(
+        f"SELECT '{column}', {column} FROM {table} WHERE {column} IS NOT NULL"
+        for table, columns in ENCODED.items()
+        for column in columns
+    )
+    op.execute(f"INSERT INTO dimensions (kind, value) {values} ON CONFLICT (kind, value) DO NOTHING")
+
+    for table, columns in ENCODED.items():
+        for key in columns.values():
+            op.add_column(table, sa.Column(key, sa.Integer(), nullable=True))
+        # One pass per table, so every row is rewritten once
+        assignments = ", ".join(
+            f"{key} = (SELECT d.id FROM dimensions d WHERE d.kind = '{column}' AND d.value = {table}.{column})"
+            for column, key in columns.items()
+        )
+        op.execute(f"UPDATE {table} SET {assignments}")
+
+    _drop_keys()
+    for table, columns in ENCODED.items():
+        for column, key in columns.items():
+            op.drop_column(table, column)
+            if (table, column) not in NULLABLE:
+                op.alter_column(table, key, nullable=False)
+    _create_keys(encoded=True)
+
+
+def downgrade() -> None:
+    """Restore the text columns from dimensions and drop the keys."""
+    for table, columns in ENCODED.items():
+        for column in columns:
+            op.add_column(table, sa.Column(column, sa.String(), nullable=True))
+        assignments = ", ".join(
+            f"{column} = (SELECT d.value FROM dimensions d WHERE d.id = {table}.{key})"
+            for column, key in columns.items()
+        )
+        op.execute(f"UPDATE {table} SET {assignments}")
+
+    _drop_keys()
+    for table, columns in ENCODED.items():
+        for column, key in columns.items():
+            op.drop_column(table, key)
+            if (table, column) not in NULLABLE:
+                op.alter_column(table, column, nullable=False)
+    _create_keys(encoded=False)
+
+    op.drop_table('dimensions')
@@ -0,0 +1,36 @@
+"""Record when an org's ingest mode last changed
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 21:00:00
+
+Reconciliation, re-enrichment and retention only trust raw events_enriched
+rows of orgs in the "full" ingest mode (011). The mode alone does not say
+since when: an org that was sampled last month and is full today still has
+sampled days. orgs.ingest_mode_since is set by the settings route whenever
+ingest_mode changes, and the worker only treats raw rows as complete from
+that time on. NULL means the mode has not changed since this migration; an
+org that switched back to full before it can be given the switch time by
+hand.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '014'
+down_revision: Union[str, None] = '013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add orgs.ingest_mode_since."""
+    op.add_column('orgs', sa.Column('ingest_mode_since', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop orgs.ingest_mode_since."""
+    op.drop_column('orgs', 'ingest_mode_since')
@@ -4,7 +4,7 @@ from datetime import datetime
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import health, ingest, query, orgs, users, audits, alerts, reports, auth
+from app.routes import health, ingest, query, orgs, users, audits, alerts, reports, auth, factors
 
 
 @asynccontextmanager
@@ -41,6 +41,7 @@ app.include_router(users.router, prefix="/v1")
 app.include_router(audits.router, prefix="/v1")
 app.include_router(alerts.router, prefix="/v1")
 app.include_router(reports.router, prefix="/v1")
+app.include_router(factors.router, prefix="/v1")
 
 
 @app.get("/")
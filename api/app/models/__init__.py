@@ -1,18 +1,27 @@
-from app.models.org import Org, PlanType
+from app.models.org import Org, PlanType, IngestMode
 from app.models.user import User, Role
 from app.models.event import EventEnriched
-from app.models.aggregate import DailyOrgAgg, DailyUserAgg, DailyProviderAgg, DailyModelAgg
+from app.models.dimension import Dimension
+from app.models.aggregate import (
+    DailyOrgAgg, DailyUserAgg, DailyProviderAgg, DailyModelAgg, HourlyOrgAgg, HourlyProviderAgg
+)
 from app.models.audit import AuditLog
+from app.models.factors import FactorOverride
 
 __all__ = [
     "Org",
     "PlanType",
+    "IngestMode",
     "User",
     "Role",
     "EventEnriched",
+    "Dimension",
     "DailyOrgAgg",
     "DailyUserAgg",
     "DailyProviderAgg",
     "DailyModelAgg",
+    "HourlyOrgAgg",
+    "HourlyProviderAgg",
     "AuditLog",
+    "FactorOverride",
 ]
@@ -1,14 +1,21 @@
 from datetime import date
-from sqlalchemy import Column, String, Integer, Float, Date, Index
+from sqlalchemy import Column, String, Integer, SmallInteger, Float, Date, DateTime, Index
 
 from app.db import Base
 
+# user_key, provider_key and model_key are keys into dimensions (migration 013)
+
+# Summed by the range queries; INCLUDEd in the covering indexes (migration 010)
+MEASURES = ['call_count', 'kwh', 'water_l', 'co2_kg']
+
 
 class DailyOrgAgg(Base):
     __tablename__ = "daily_org_agg"
 
     date = Column(Date, primary_key=True)
     org_id = Column(String, primary_key=True)
+    # Orgs with Org.agg_shards > 1 have one row per writer shard; sum across shards when reading
+    shard = Column(SmallInteger, primary_key=True, default=0)
     call_count = Column(Integer, default=0)
     kwh = Column(Float, default=0.0)
     water_l = Column(Float, default=0.0)
@@ -24,33 +31,77 @@ class DailyUserAgg(Base):
 
     date = Column(Date, primary_key=True)
     org_id = Column(String, primary_key=True)
-    user_id = Column(String, primary_key=True)
+    user_key = Column(Integer, primary_key=True)
     call_count = Column(Integer, default=0)
     kwh = Column(Float, default=0.0)
     water_l = Column(Float, default=0.0)
     co2_kg = Column(Float, default=0.0)
 
+    __table_args__ = (
+        Index('ix_daily_user_org_date', 'org_id', 'date', 'user_key', postgresql_include=MEASURES),
+    )
+
 
 class DailyProviderAgg(Base):
     __tablename__ = "daily_provider_agg"
 
     date = Column(Date, primary_key=True)
     org_id = Column(String, primary_key=True)
-    provider = Column(String, primary_key=True)
+    provider_key = Column(Integer, primary_key=True)
     call_count = Column(Integer, default=0)
     kwh = Column(Float, default=0.0)
     water_l = Column(Float, default=0.0)
     co2_kg = Column(Float, default=0.0)
 
+    __table_args__ = (
+        Index('ix_daily_provider_org_date', 'org_id', 'date', 'provider_key', postgresql_include=MEASURES),
+    )
+
 
 class DailyModelAgg(Base):
     __tablename__ = "daily_model_agg"
 
     date = Column(Date, primary_key=True)
     org_id = Column(String, primary_key=True)
-    provider = Column(String, primary_key=True)
-    model = Column(String, primary_key=True)
+    provider_key = Column(Integer, primary_key=True)
+    model_key = Column(Integer, primary_key=True)
     call_count = Column(Integer, default=0)
     kwh = Column(Float, default=0.0)
     water_l = Column(Float, default=0.0)
     co2_kg = Column(Float, default=0.0)
+
+    __table_args__ = (
+        Index('ix_daily_model_org_date', 'org_id', 'date', 'provider_key', 'model_key', postgresql_include=MEASURES),
+    )
+
+
+class HourlyOrgAgg(Base):
+    """Hourly rollup backing sub-day queries and alert windows (migration 005)."""
+    __tablename__ = "hourly_org_agg"
+
+    hour = Column(DateTime, primary_key=True)  # UTC, truncated to the hour
+    org_id = Column(String, primary_key=True)
+    call_count = Column(Integer, default=0)
+    kwh = Column(Float, default=0.0)
+    water_l = Column(Float, default=0.0)
+    co2_kg = Column(Float, default=0.0)
+
+    __table_args__ = (
+        Index('ix_hourly_org_org_hour', 'org_id', 'hour'),
+    )
+
+
+class HourlyProviderAgg(Base):
+    __tablename__ = "hourly_provider_agg"
+
+    hour = Column(DateTime, primary_key=True)
+    org_id = Column(String, primary_key=True)
+    provider_key = Column(Integer, primary_key=True)
+    call_count = Column(Integer, default=0)
+    kwh = Column(Float, default=0.0)
+    water_l = Column(Float, default=0.0)
+    co2_kg = Column(Float, default=0.0)
+
+    __table_args__ = (
+        Index('ix_hourly_provider_org_hour', 'org_id', 'hour'),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, Integer, Identity, UniqueConstraint
+
+from app.db import Base
+
+
+class Dimension(Base):
+    """
+    Dictionary of event attribute strings (migration 013). events_enriched
+    and the aggregate tables store the id instead of the string.
+    """
+    __tablename__ = "dimensions"
+
+    id = Column(Integer, Identity(), primary_key=True)
+    kind = Column(String, nullable=False)  # user_id, provider, model or region
+    value = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('kind', 'value', name='uq_dimensions_kind_value'),
+    )
@@ -1,7 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Index
-from sqlalchemy.dialects.postgresql import UUID
-import uuid
+from sqlalchemy import Column, String, Integer, SmallInteger, Float, DateTime, JSON, Index, text
 
 from app.db import Base
 
@@ -9,24 +7,32 @@ from app.db import Base
 class EventEnriched(Base):
     __tablename__ = "events_enriched"
 
-    id = Column(String, primary_key=True, default=lambda: f"evt_{uuid.uuid4().hex[:16]}")
-    org_id = Column(String, nullable=False, index=True)
-    user_id = Column(String, nullable=False, index=True)
-    provider = Column(String, nullable=False)
-    model = Column(String)
+    # Time-ordered UUIDv7 text, assigned by the worker or by uuid_v7() (migration 007)
+    id = Column(String, primary_key=True, server_default=text("uuid_v7()::text"))
+    org_id = Column(String, nullable=False)
+    # Keys into dimensions (migration 013)
+    user_key = Column(Integer, nullable=False)
+    provider_key = Column(Integer, nullable=False)
+    model_key = Column(Integer)
     tokens_in = Column(Integer, default=0)
     tokens_out = Column(Integer, default=0)
     node_type = Column(String)
-    region = Column(String)
+    region_key = Column(Integer)
     kwh = Column(Float, nullable=False)
     water_l = Column(Float, nullable=False)
     co2_kg = Column(Float, nullable=False)
-    ts = Column(DateTime, nullable=False, index=True)
+    # Partition key (migration 008), so part of the primary key
+    ts = Column(DateTime, primary_key=True, nullable=False)
     source = Column(String)
     event_metadata = Column('metadata', JSON)  # Renamed to avoid SQLAlchemy reserved word
+    factor_version = Column(String)  # Added in migration 003
+    # Events this row stands for: the org's raw_sample_rate when sampled (migration 012)
+    sample_weight = Column(SmallInteger, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
         Index('ix_events_org_ts', 'org_id', 'ts'),
-        Index('ix_events_user_ts', 'user_id', 'ts'),
+        Index('ix_events_user_ts', 'user_key', 'ts'),
+        # Cross-org ts range scans (migration 009)
+        Index('ix_events_ts_brin', 'ts', postgresql_using='brin'),
     )
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Float, DateTime, UniqueConstraint
+import uuid
+
+from app.db import Base
+
+
+class FactorOverride(Base):
+    """Org-scoped replacement for factors_defaults.yaml values.
+
+    model = "" applies to every model of the provider. Unset (NULL) factors
+    fall back to the global defaults.
+    """
+    __tablename__ = "factors_overrides"
+
+    id = Column(String, primary_key=True, default=lambda: f"fo_{uuid.uuid4().hex[:12]}")
+    org_id = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False, default="")
+    kwh_per_call = Column(Float)
+    pue = Column(Float)
+    water_l_per_kwh = Column(Float)
+    co2_kg_per_kwh = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('org_id', 'provider', 'model', name='uq_factors_overrides_org_provider_model'),
+    )
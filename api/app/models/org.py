@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, String, Integer, DateTime, Enum as SQLEnum, CheckConstraint
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 import enum
@@ -13,6 +13,13 @@ class PlanType(str, enum.Enum):
     ENTERPRISE = "enterprise"
 
 
+class IngestMode(str, enum.Enum):
+    """Which raw events_enriched rows the worker writes for an org (aggregates are always exact)."""
+    FULL = "full"
+    SAMPLED = "sampled"  # a deterministic 1-in-raw_sample_rate sample
+    AGGREGATE_ONLY = "aggregate_only"
+
+
 class Org(Base):
     __tablename__ = "orgs"
 
@@ -20,3 +27,16 @@ class Org(Base):
     name = Column(String, nullable=False)
     plan = Column(SQLEnum(PlanType), default=PlanType.FREE)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # daily_org_agg shards workers spread this org's counters over (hot tenants only)
+    agg_shards = Column(Integer, nullable=False, default=1, server_default="1")
+    # IngestMode value (migration 011); a plain string so the worker can read it as is
+    ingest_mode = Column(String, nullable=False, default=IngestMode.FULL.value, server_default="full")
+    raw_sample_rate = Column(Integer, nullable=False, default=10, server_default="10")
+    # When ingest_mode last changed (migration 014); raw rows are only complete after a switch to full
+    ingest_mode_since = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("agg_shards BETWEEN 1 AND 64", name="ck_orgs_agg_shards"),
+        CheckConstraint("ingest_mode IN ('full', 'sampled', 'aggregate_only')", name="ck_orgs_ingest_mode"),
+        CheckConstraint("raw_sample_rate BETWEEN 1 AND 10000", name="ck_orgs_raw_sample_rate"),
+    )
@@ -0,0 +1,139 @@
+"""
+Factor override routes for EcoMind API
+
+Org-scoped overrides of the default environmental factors. Workers cache
+overrides in process and are told to drop an org's entries by the
+factors_overrides NOTIFY trigger (migration 004) when a change commits.
+
+SECURITY:
+- Reading requires "read_org_data"; changing requires "manage_settings"
+- Every change is recorded in audit_logs
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from app.auth import can_access_resource, get_current_user, require_same_org
+from app.db import get_db
+from app.models import AuditLog, FactorOverride
+from app.models.user import User
+
+router = APIRouter()
+
+
+class FactorOverrideUpsert(BaseModel):
+    provider: str
+    model: str = ""  # "" applies to every model of the provider
+    kwh_per_call: Optional[float] = Field(None, ge=0)
+    pue: Optional[float] = Field(None, ge=1)
+    water_l_per_kwh: Optional[float] = Field(None, ge=0)
+    co2_kg_per_kwh: Optional[float] = Field(None, ge=0)
+
+
+class FactorOverrideResponse(BaseModel):
+    id: str
+    org_id: str
+    provider: str
+    model: str
+    kwh_per_call: Optional[float]
+    pue: Optional[float]
+    water_l_per_kwh: Optional[float]
+    co2_kg_per_kwh: Optional[float]
+    updated_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+def _require_permission(current_user: User, permission: str):
+    if not can_access_resource(current_user, permission):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient permissions. Requires '{permission}'."
+        )
+
+
+@router.get("/orgs/{org_id}/factors/overrides", response_model=list[FactorOverrideResponse])
+async def list_factor_overrides(
+    org_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List factor overrides for an organization"""
+    await require_same_org(org_id, current_user)
+    _require_permission(current_user, "read_org_data")
+
+    return db.query(FactorOverride).filter(FactorOverride.org_id == org_id).order_by(
+        FactorOverride.provider, FactorOverride.model
+    ).all()
+
+
+@router.put("/orgs/{org_id}/factors/overrides", response_model=FactorOverrideResponse)
+async def upsert_factor_override(
+    org_id: str,
+    override: FactorOverrideUpsert,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Create or replace the override for one (provider, model)"""
+    await require_same_org(org_id, current_user)
+    _require_permission(current_user, "manage_settings")
+
+    db_override = db.query(FactorOverride).filter(
+        FactorOverride.org_id == org_id,
+        FactorOverride.provider == override.provider,
+        FactorOverride.model == override.model,
+    ).first()
+    if db_override is None:
+        db_override = FactorOverride(org_id=org_id, provider=override.provider, model=override.model)
+        db.add(db_override)
+
+    db_override.kwh_per_call = override.kwh_per_call
+    db_override.pue = override.pue
+    db_override.water_l_per_kwh = override.water_l_per_kwh
+    db_override.co2_kg_per_kwh = override.co2_kg_per_kwh
+
+    db.add(AuditLog(
+        org_id=org_id,
+        user_id=current_user.id,
+        action="update_factors",
+        resource="factors_overrides",
+        details=override.model_dump(),
+    ))
+    db.commit()
+    db.refresh(db_override)
+    return db_override
+
+
+@router.delete("/orgs/{org_id}/factors/overrides/{override_id}")
+async def delete_factor_override(
+    org_id: str,
+    override_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Delete a factor override; the org falls back to the defaults"""
+    await require_same_org(org_id, current_user)
+    _require_permission(current_user, "manage_settings")
+
+    db_override = db.query(FactorOverride).filter(
+        FactorOverride.id == override_id,
+        FactorOverride.org_id == org_id,
+    ).first()
+    if not db_override:
+        raise HTTPException(status_code=404, detail="Factor override not found")
+
+    db.add(AuditLog(
+        org_id=org_id,
+        user_id=current_user.id,
+        action="delete_factors",
+        resource="factors_overrides",
+        details={"provider": db_override.provider, "model": db_override.model},
+    ))
+    db.delete(db_override)
+    db.commit()
+    return {"status": "deleted", "id": override_id}
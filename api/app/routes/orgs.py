@@ -1,9 +1,14 @@
+from datetime import datetime
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from app.auth import can_access_resource, get_current_user, require_same_org
 from app.db import get_db
-from app.models import Org, PlanType
+from app.models import AuditLog, IngestMode, Org, PlanType
+from app.models.user import User
 
 router = APIRouter()
 
@@ -13,11 +18,23 @@ class OrgCreate(BaseModel):
     plan: PlanType = PlanType.FREE
 
 
+class OrgSettingsUpdate(BaseModel):
+    # Worker-side daily_org_agg shards; raise only for tenants whose counters are hot
+    agg_shards: Optional[int] = Field(None, ge=1, le=64)
+    # Raw events_enriched rows kept: all, 1 in raw_sample_rate, or none
+    ingest_mode: Optional[IngestMode] = None
+    raw_sample_rate: Optional[int] = Field(None, ge=1, le=10000)
+
+
 class OrgResponse(BaseModel):
     id: str
     name: str
     plan: PlanType
     created_at: str
+    agg_shards: int = 1
+    ingest_mode: IngestMode = IngestMode.FULL
+    raw_sample_rate: int = 10
+    ingest_mode_since: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -47,3 +64,45 @@ async def list_orgs(db: Session = Depends(get_db)):
     """List all organizations"""
     orgs = db.query(Org).all()
     return orgs
+
+
+@router.patch("/orgs/{org_id}/settings", response_model=OrgResponse)
+async def update_org_settings(
+    org_id: str,
+    settings: OrgSettingsUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Update an organization's ingestion settings.
+
+    Workers cache settings and pick up changes within
+    WORKER_ORG_CONFIG_TTL_S (default 60s).
+
+    Security:
+    - Requires "manage_settings"; the change is recorded in audit_logs
+    """
+    await require_same_org(org_id, current_user)
+    if not can_access_resource(current_user, "manage_settings"):
+        raise HTTPException(status_code=403, detail="Insufficient permissions. Requires 'manage_settings'.")
+
+    org = db.query(Org).filter(Org.id == org_id).first()
+    if not org:
+        raise HTTPException(status_code=404, detail="Organization not found")
+
+    changes = settings.model_dump(exclude_none=True, mode="json")
+    if changes.get("ingest_mode", org.ingest_mode) != org.ingest_mode:
+        # Workers only rebuild aggregates from raw rows stored after a switch to full
+        org.ingest_mode_since = datetime.utcnow()
+    for field, value in changes.items():
+        setattr(org, field, value)
+    db.add(AuditLog(
+        org_id=org_id,
+        user_id=current_user.id,
+        action="update_settings",
+        resource=f"orgs/{org_id}",
+        details=changes,
+    ))
+    db.commit()
+    db.refresh(org)
+    return org
@@ -5,20 +5,62 @@ SECURITY (Phase 2):
 All routes now require authentication and check organization access.
 """
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Query, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 from app.db import get_db
-from app.models import DailyOrgAgg, DailyUserAgg, DailyProviderAgg, DailyModelAgg
+from app.models import (
+    DailyOrgAgg, DailyUserAgg, DailyProviderAgg, DailyModelAgg, HourlyOrgAgg, HourlyProviderAgg,
+    EventEnriched, Dimension,
+)
 from app.models.user import User, Role
 from app.auth import get_current_user, require_same_org
 
 router = APIRouter()
 
+# Ranges shorter than this are answered from the hourly rollups (kept for at
+# least two days by `python -m worker.maintenance prune-hourly`)
+HOURLY_MAX_RANGE = timedelta(hours=48)
+
+# Raw event listings must be bounded on ts so they only scan the matching
+# daily partitions of events_enriched (migration 008)
+EVENTS_MAX_RANGE = timedelta(days=31)
+
+
+def _parse_utc(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp into naive UTC, like the stored timestamps."""
+    from fastapi import HTTPException, status
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid timestamp: {value}"
+        )
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _dimension_key(kind: str, value: str):
+    """Key of a dimension string (migration 013), as a scalar subquery to filter by."""
+    return select(Dimension.id).where(Dimension.kind == kind, Dimension.value == value).scalar_subquery()
+
+
+def _names(db: Session, keys) -> dict:
+    """
+    Dimension strings by key. Queries group and sort by the integer keys;
+    only the keys in the result are decoded, in one lookup.
+    """
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    return dict(db.query(Dimension.id, Dimension.value).filter(Dimension.id.in_(keys)).all())
+
 
 @router.get("/today")
 async def get_today(
@@ -65,7 +107,7 @@ async def get_today(
         agg = db.query(DailyUserAgg).filter(
             DailyUserAgg.date == today,
             DailyUserAgg.org_id == org_id,
-            DailyUserAgg.user_id == user_id,
+            DailyUserAgg.user_key == _dimension_key("user_id", user_id),
         ).first()
 
         if not agg:
@@ -83,7 +125,7 @@ async def get_today(
 
         # Get top providers for this user today
         top_providers = db.query(
-            DailyProviderAgg.provider,
+            DailyProviderAgg.provider_key,
             DailyProviderAgg.call_count
         ).filter(
             DailyProviderAgg.date == today,
@@ -92,12 +134,13 @@ async def get_today(
 
         # Get top models
         top_models = db.query(
-            DailyModelAgg.model,
+            DailyModelAgg.model_key,
             DailyModelAgg.call_count
         ).filter(
             DailyModelAgg.date == today,
             DailyModelAgg.org_id == org_id,
         ).order_by(DailyModelAgg.call_count.desc()).limit(5).all()
+        names = _names(db, [p for p, _ in top_providers] + [m for m, _ in top_models])
 
         return {
             "date": today.isoformat(),
@@ -107,17 +150,22 @@ async def get_today(
             "kwh": agg.kwh,
             "water_liters": agg.water_l,
             "co2_kg": agg.co2_kg,
-            "top_providers": [{"provider": p, "count": c} for p, c in top_providers],
-            "top_models": [{"model": m, "count": c} for m, c in top_models],
+            "top_providers": [{"provider": names[p], "count": c} for p, c in top_providers],
+            "top_models": [{"model": names[m], "count": c} for m, c in top_models],
         }
     else:
-        # Query org aggregates
-        agg = db.query(DailyOrgAgg).filter(
+        # Query org aggregates, summed across counter shards
+        agg = db.query(
+            func.sum(DailyOrgAgg.call_count).label("call_count"),
+            func.sum(DailyOrgAgg.kwh).label("kwh"),
+            func.sum(DailyOrgAgg.water_l).label("water_l"),
+            func.sum(DailyOrgAgg.co2_kg).label("co2_kg"),
+        ).filter(
             DailyOrgAgg.date == today,
             DailyOrgAgg.org_id == org_id,
-        ).first()
+        ).one()
 
-        if not agg:
+        if agg.call_count is None:
             return {
                 "date": today.isoformat(),
                 "org_id": org_id,
@@ -131,7 +179,7 @@ async def get_today(
 
         # Get top providers
         top_providers = db.query(
-            DailyProviderAgg.provider,
+            DailyProviderAgg.provider_key,
             DailyProviderAgg.call_count
         ).filter(
             DailyProviderAgg.date == today,
@@ -140,12 +188,13 @@ async def get_today(
 
         # Get top models
         top_models = db.query(
-            DailyModelAgg.model,
+            DailyModelAgg.model_key,
             DailyModelAgg.call_count
         ).filter(
             DailyModelAgg.date == today,
             DailyModelAgg.org_id == org_id,
         ).order_by(DailyModelAgg.call_count.desc()).limit(5).all()
+        names = _names(db, [p for p, _ in top_providers] + [m for m, _ in top_models])
 
         return {
             "date": today.isoformat(),
@@ -154,8 +203,8 @@ async def get_today(
             "kwh": agg.kwh,
             "water_liters": agg.water_l,
             "co2_kg": agg.co2_kg,
-            "top_providers": [{"provider": p, "count": c} for p, c in top_providers],
-            "top_models": [{"model": m, "count": c} for m, c in top_models],
+            "top_providers": [{"provider": names[p], "count": c} for p, c in top_providers],
+            "top_models": [{"model": names[m], "count": c} for m, c in top_models],
         }
 
 
@@ -193,7 +242,7 @@ async def get_daily_aggregate(
     if group_by == "provider":
         results = db.query(
             DailyProviderAgg.date,
-            DailyProviderAgg.provider,
+            DailyProviderAgg.provider_key,
             func.sum(DailyProviderAgg.call_count).label("call_count"),
             func.sum(DailyProviderAgg.kwh).label("kwh"),
             func.sum(DailyProviderAgg.water_l).label("water_l"),
@@ -202,7 +251,8 @@ async def get_daily_aggregate(
             DailyProviderAgg.org_id == org_id,
             DailyProviderAgg.date >= from_dt,
             DailyProviderAgg.date <= to_dt,
-        ).group_by(DailyProviderAgg.date, DailyProviderAgg.provider).all()
+        ).group_by(DailyProviderAgg.date, DailyProviderAgg.provider_key).all()
+        names = _names(db, [r.provider_key for r in results])
 
         return {
             "org_id": org_id,
@@ -212,7 +262,7 @@ async def get_daily_aggregate(
             "data": [
                 {
                     "date": r.date.isoformat(),
-                    "provider": r.provider,
+                    "provider": names[r.provider_key],
                     "call_count": r.call_count,
                     "kwh": r.kwh,
                     "water_liters": r.water_l,
@@ -225,8 +275,8 @@ async def get_daily_aggregate(
     elif group_by == "model":
         results = db.query(
             DailyModelAgg.date,
-            DailyModelAgg.provider,
-            DailyModelAgg.model,
+            DailyModelAgg.provider_key,
+            DailyModelAgg.model_key,
             func.sum(DailyModelAgg.call_count).label("call_count"),
             func.sum(DailyModelAgg.kwh).label("kwh"),
             func.sum(DailyModelAgg.water_l).label("water_l"),
@@ -237,9 +287,10 @@ async def get_daily_aggregate(
             DailyModelAgg.date <= to_dt,
         ).group_by(
             DailyModelAgg.date,
-            DailyModelAgg.provider,
-            DailyModelAgg.model
+            DailyModelAgg.provider_key,
+            DailyModelAgg.model_key
         ).all()
+        names = _names(db, [r.provider_key for r in results] + [r.model_key for r in results])
 
         return {
             "org_id": org_id,
@@ -249,8 +300,8 @@ async def get_daily_aggregate(
             "data": [
                 {
                     "date": r.date.isoformat(),
-                    "provider": r.provider,
-                    "model": r.model,
+                    "provider": names[r.provider_key],
+                    "model": names[r.model_key],
                     "call_count": r.call_count,
                     "kwh": r.kwh,
                     "water_liters": r.water_l,
@@ -263,7 +314,7 @@ async def get_daily_aggregate(
     else:  # user
         results = db.query(
             DailyUserAgg.date,
-            DailyUserAgg.user_id,
+            DailyUserAgg.user_key,
             func.sum(DailyUserAgg.call_count).label("call_count"),
             func.sum(DailyUserAgg.kwh).label("kwh"),
             func.sum(DailyUserAgg.water_l).label("water_l"),
@@ -272,7 +323,8 @@ async def get_daily_aggregate(
             DailyUserAgg.org_id == org_id,
             DailyUserAgg.date >= from_dt,
             DailyUserAgg.date <= to_dt,
-        ).group_by(DailyUserAgg.date, DailyUserAgg.user_id).all()
+        ).group_by(DailyUserAgg.date, DailyUserAgg.user_key).all()
+        names = _names(db, [r.user_key for r in results])
 
         return {
             "org_id": org_id,
@@ -282,7 +334,7 @@ async def get_daily_aggregate(
             "data": [
                 {
                     "date": r.date.isoformat(),
-                    "user_id": r.user_id,
+                    "user_id": names[r.user_key],
                     "call_count": r.call_count,
                     "kwh": r.kwh,
                     "water_liters": r.water_l,
@@ -290,4 +342,281 @@ async def get_daily_aggregate(
                 }
                 for r in results
             ],
-        }
\ No newline at end of file
+        }
+
+
+@router.get("/aggregate/range")
+async def get_range_aggregate(
+    org_id: str = Query(...),
+    from_ts: str = Query(..., alias="from", description="ISO 8601 start (inclusive)"),
+    to_ts: str = Query(..., alias="to", description="ISO 8601 end (exclusive)"),
+    group_by: str = Query("org", regex="^(org|provider)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get aggregates for an arbitrary time range.
+
+    Ranges under 48 hours are read from the hourly rollups in hour buckets
+    (the hours overlapping the range); longer ranges from the daily rollups
+    in day buckets (the dates overlapping the range).
+
+    Security:
+    - Requires valid JWT token
+    - User must belong to the requested organization
+    - Requires "read_org_data" permission (ANALYST, ADMIN, OWNER, or BILLING)
+    """
+    # Check organization access
+    await require_same_org(org_id, current_user)
+
+    from app.auth import can_access_resource
+    from fastapi import HTTPException, status
+    if not can_access_resource(current_user, "read_org_data"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions. Requires ANALYST role or higher."
+        )
+
+    from_dt = _parse_utc(from_ts)
+    to_dt = _parse_utc(to_ts)
+    if to_dt <= from_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'"
+        )
+
+    if to_dt - from_dt < HOURLY_MAX_RANGE:
+        granularity = "hour"
+        model = HourlyProviderAgg if group_by == "provider" else HourlyOrgAgg
+        bucket = model.hour
+        in_range = [bucket >= from_dt.replace(minute=0, second=0, microsecond=0), bucket < to_dt]
+    else:
+        granularity = "day"
+        model = DailyProviderAgg if group_by == "provider" else DailyOrgAgg
+        bucket = model.date
+        in_range = [bucket >= from_dt.date(), bucket <= (to_dt - timedelta(microseconds=1)).date()]
+
+    # Grouping by bucket also sums daily_org_agg's counter shards
+    columns = [bucket.label("bucket")]
+    if group_by == "provider":
+        columns.append(model.provider_key)
+
+    results = db.query(
+        *columns,
+        func.sum(model.call_count).label("call_count"),
+        func.sum(model.kwh).label("kwh"),
+        func.sum(model.water_l).label("water_l"),
+        func.sum(model.co2_kg).label("co2_kg"),
+    ).filter(
+        model.org_id == org_id,
+        *in_range,
+    ).group_by(*columns).order_by(bucket).all()
+    names = _names(db, [r.provider_key for r in results]) if group_by == "provider" else {}
+
+    return {
+        "org_id": org_id,
+        "from": from_ts,
+        "to": to_ts,
+        "group_by": group_by,
+        "granularity": granularity,
+        "data": [
+            {
+                "bucket": r.bucket.isoformat(),
+                **({"provider": names[r.provider_key]} if group_by == "provider" else {}),
+                "call_count": r.call_count,
+                "kwh": r.kwh,
+                "water_liters": r.water_l,
+                "co2_kg": r.co2_kg,
+            }
+            for r in results
+        ],
+    }
+
+
+@router.get("/events")
+async def list_events(
+    org_id: str = Query(...),
+    from_ts: str = Query(..., alias="from", description="ISO 8601 start (inclusive)"),
+    to_ts: str = Query(..., alias="to", description="ISO 8601 end (exclusive)"),
+    user_id: Optional[str] = Query(None, description="User ID (optional)"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    List raw enriched events in a time range, newest first.
+
+    The range is required and at most 31 days, so only the daily partitions
+    it overlaps are read.
+
+    Security:
+    - Requires valid JWT token
+    - User must belong to the requested organization
+    - VIEWER role can only list own events
+    - ANALYST+ can list org-wide events
+    """
+    await require_same_org(org_id, current_user)
+
+    from app.auth import can_access_resource
+    from fastapi import HTTPException, status
+    if user_id and current_user.role == Role.VIEWER and user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Viewers can only access their own data"
+        )
+    if not user_id and not can_access_resource(current_user, "read_org_data"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions to access organization-wide data"
+        )
+
+    from_dt = _parse_utc(from_ts)
+    to_dt = _parse_utc(to_ts)
+    if to_dt <= from_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'"
+        )
+    if to_dt - from_dt > EVENTS_MAX_RANGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range must not exceed {EVENTS_MAX_RANGE.days} days"
+        )
+
+    query = db.query(EventEnriched).filter(
+        EventEnriched.org_id == org_id,
+        EventEnriched.ts >= from_dt,
+        EventEnriched.ts < to_dt,
+    )
+    if user_id:
+        query = query.filter(EventEnriched.user_key == _dimension_key("user_id", user_id))
+    events = query.order_by(EventEnriched.ts.desc()).limit(limit).all()
+    names = _names(db, [key for e in events for key in (e.user_key, e.provider_key, e.model_key)])
+
+    return {
+        "org_id": org_id,
+        "from": from_ts,
+        "to": to_ts,
+        "data": [
+            {
+                "id": e.id,
+                "user_id": names[e.user_key],
+                "provider": names[e.provider_key],
+                "model": names.get(e.model_key),
+                "tokens_in": e.tokens_in,
+                "tokens_out": e.tokens_out,
+                "kwh": e.kwh,
+                "water_liters": e.water_l,
+                "co2_kg": e.co2_kg,
+                "ts": e.ts.isoformat(),
+                "factor_version": e.factor_version,
+                "sample_weight": e.sample_weight,
+            }
+            for e in events
+        ],
+    }
+
+
+# Raw event attributes /events/breakdown can group by
+BREAKDOWN_COLUMNS = {
+    "provider": EventEnriched.provider_key,
+    "model": EventEnriched.model_key,
+    "region": EventEnriched.region_key,
+    "node_type": EventEnriched.node_type,
+    "source": EventEnriched.source,
+    "user": EventEnriched.user_key,
+}
+
+# Groups whose keys are decoded from dimensions
+ENCODED_BREAKDOWNS = {"provider", "model", "region", "user"}
+
+
+@router.get("/events/breakdown")
+async def get_events_breakdown(
+    org_id: str = Query(...),
+    from_ts: str = Query(..., alias="from", description="ISO 8601 start (inclusive)"),
+    to_ts: str = Query(..., alias="to", description="ISO 8601 end (exclusive)"),
+    group_by: str = Query("provider", regex="^(provider|model|region|node_type|source|user|metadata)$"),
+    metadata_key: Optional[str] = Query(None, description="Metadata key to group by (group_by=metadata)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Break raw events in a time range down by an event attribute or metadata key.
+
+    Counts and sums are weighted by sample_weight, so for sampled orgs they
+    are unbiased estimates of the totals over all events; `rows` is the
+    number of raw rows behind each group. Aggregate-only orgs have no raw
+    rows. The range is at most 31 days.
+
+    Security:
+    - Requires valid JWT token
+    - User must belong to the requested organization
+    - Requires "read_org_data" permission (ANALYST, ADMIN, OWNER, or BILLING)
+    """
+    await require_same_org(org_id, current_user)
+
+    from app.auth import can_access_resource
+    from fastapi import HTTPException, status
+    if not can_access_resource(current_user, "read_org_data"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions. Requires ANALYST role or higher."
+        )
+    if group_by == "metadata" and not metadata_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="metadata_key is required with group_by=metadata"
+        )
+
+    from_dt = _parse_utc(from_ts)
+    to_dt = _parse_utc(to_ts)
+    if to_dt <= from_dt:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'"
+        )
+    if to_dt - from_dt > EVENTS_MAX_RANGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range must not exceed {EVENTS_MAX_RANGE.days} days"
+        )
+
+    if group_by == "metadata":
+        key = func.json_extract_path_text(EventEnriched.event_metadata, metadata_key)
+    else:
+        key = BREAKDOWN_COLUMNS[group_by]
+    weight = EventEnriched.sample_weight
+
+    results = db.query(
+        key.label("key"),
+        func.count().label("rows"),
+        func.sum(weight).label("call_count"),
+        func.sum(EventEnriched.kwh * weight).label("kwh"),
+        func.sum(EventEnriched.water_l * weight).label("water_l"),
+        func.sum(EventEnriched.co2_kg * weight).label("co2_kg"),
+    ).filter(
+        EventEnriched.org_id == org_id,
+        EventEnriched.ts >= from_dt,
+        EventEnriched.ts < to_dt,
+    ).group_by(key).order_by(func.sum(weight).desc()).all()
+    encoded = group_by in ENCODED_BREAKDOWNS
+    names = _names(db, [r.key for r in results]) if encoded else {}
+
+    return {
+        "org_id": org_id,
+        "from": from_ts,
+        "to": to_ts,
+        "group_by": metadata_key if group_by == "metadata" else group_by,
+        "data": [
+            {
+                "key": names.get(r.key) if encoded else r.key,
+                "rows": r.rows,
+                "call_count": r.call_count,
+                "kwh": r.kwh,
+                "water_liters": r.water_l,
+                "co2_kg": r.co2_kg,
+            }
+            for r in results
+        ],
+    }
@@ -41,19 +41,27 @@ class SchemaVerifier:
 
     # Expected schema definition
     EXPECTED_TABLES = {
-        'orgs': ['id', 'name', 'plan', 'created_at'],
+        'orgs': ['id', 'name', 'plan', 'created_at', 'agg_shards', 'ingest_mode', 'raw_sample_rate',
+                 'ingest_mode_since'],
         'users': ['id', 'org_id', 'email', 'name', 'role', 'created_at', 'password_hash'],
         'events_enriched': [
-            'id', 'org_id', 'user_id', 'provider', 'model',
-            'tokens_in', 'tokens_out', 'node_type', 'region',
+            'id', 'org_id', 'user_key', 'provider_key', 'model_key',
+            'tokens_in', 'tokens_out', 'node_type', 'region_key',
             'kwh', 'water_l', 'co2_kg', 'ts', 'source',
-            'metadata', 'created_at'
+            'metadata', 'created_at', 'factor_version', 'sample_weight'
         ],
-        'daily_org_agg': ['date', 'org_id', 'call_count', 'kwh', 'water_l', 'co2_kg'],
-        'daily_user_agg': ['date', 'org_id', 'user_id', 'call_count', 'kwh', 'water_l', 'co2_kg'],
-        'daily_provider_agg': ['date', 'org_id', 'provider', 'call_count', 'kwh', 'water_l', 'co2_kg'],
-        'daily_model_agg': ['date', 'org_id', 'provider', 'model', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'daily_org_agg': ['date', 'org_id', 'call_count', 'kwh', 'water_l', 'co2_kg', 'shard'],
+        'daily_user_agg': ['date', 'org_id', 'user_key', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'daily_provider_agg': ['date', 'org_id', 'provider_key', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'daily_model_agg': ['date', 'org_id', 'provider_key', 'model_key', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'hourly_org_agg': ['hour', 'org_id', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'hourly_provider_agg': ['hour', 'org_id', 'provider_key', 'call_count', 'kwh', 'water_l', 'co2_kg'],
+        'dimensions': ['id', 'kind', 'value'],
         'audit_logs': ['id', 'org_id', 'user_id', 'action', 'resource', 'details', 'ts'],
+        'factors_overrides': [
+            'id', 'org_id', 'provider', 'model', 'kwh_per_call', 'pue',
+            'water_l_per_kwh', 'co2_kg_per_kwh', 'created_at', 'updated_at'
+        ],
     }
 
     EXPECTED_INDEXES = {
@@ -62,26 +70,32 @@ class SchemaVerifier:
         'events_enriched': [
             'ix_events_org_ts',
             'ix_events_user_ts',
-            'ix_events_enriched_org_id',
-            'ix_events_enriched_ts',
-            'ix_events_enriched_user_id'
+            'ix_events_ts_brin'
         ],
         'daily_org_agg': ['ix_daily_org_date'],
-        'daily_user_agg': [],
-        'daily_provider_agg': [],
-        'daily_model_agg': [],
+        'daily_user_agg': ['ix_daily_user_org_date'],
+        'daily_provider_agg': ['ix_daily_provider_org_date'],
+        'daily_model_agg': ['ix_daily_model_org_date'],
+        'hourly_org_agg': ['ix_hourly_org_org_hour'],
+        'hourly_provider_agg': ['ix_hourly_provider_org_hour'],
+        'dimensions': ['uq_dimensions_kind_value'],
         'audit_logs': ['ix_audit_logs_org_id', 'ix_audit_logs_ts'],
+        'factors_overrides': ['uq_factors_overrides_org_provider_model'],
     }
 
     EXPECTED_PRIMARY_KEYS = {
         'orgs': ['id'],
         'users': ['id'],
-        'events_enriched': ['id'],
-        'daily_org_agg': ['date', 'org_id'],
-        'daily_user_agg': ['date', 'org_id', 'user_id'],
-        'daily_provider_agg': ['date', 'org_id', 'provider'],
-        'daily_model_agg': ['date', 'org_id', 'provider', 'model'],
+        'events_enriched': ['id', 'ts'],
+        'daily_org_agg': ['date', 'org_id', 'shard'],
+        'daily_user_agg': ['date', 'org_id', 'user_key'],
+        'daily_provider_agg': ['date', 'org_id', 'provider_key'],
+        'daily_model_agg': ['date', 'org_id', 'provider_key', 'model_key'],
+        'hourly_org_agg': ['hour', 'org_id'],
+        'hourly_provider_agg': ['hour', 'org_id', 'provider_key'],
+        'dimensions': ['id'],
         'audit_logs': ['id'],
+        'factors_overrides': ['id'],
     }
 
     EXPECTED_FOREIGN_KEYS = {
@@ -138,7 +152,7 @@ class SchemaVerifier:
         expected_tables = set(self.EXPECTED_TABLES.keys())
 
         missing = expected_tables - actual_tables
-        extra = actual_tables - expected_tables - {'alembic_version'}
+        extra = actual_tables - expected_tables - {'alembic_version'} - self.partition_names()
 
         if missing:
             for table in sorted(missing):
@@ -154,6 +168,12 @@ class SchemaVerifier:
         if found and not missing:
             print(f"{Colors.GREEN}  ✓ All {len(expected_tables)} expected tables found{Colors.NC}")
 
+    def partition_names(self) -> Set[str]:
+        """Partitions of partitioned tables (e.g. events_enriched's daily ones, migration 008)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT c.relname FROM pg_class c WHERE c.relispartition")).fetchall()
+        return {row[0] for row in rows}
+
     def verify_columns(self):
         """Verify all expected columns exist in each table."""
         for table_name, expected_columns in self.EXPECTED_TABLES.items():
@@ -98,7 +98,7 @@ class TestInitialMigration:
 
         # Check critical columns
         required_columns = [
-            'id', 'org_id', 'user_id', 'provider', 'model',
+            'id', 'org_id', 'user_key', 'provider_key', 'model_key',  # keys since 013
             'tokens_in', 'tokens_out', 'kwh', 'water_l', 'co2_kg',
             'ts', 'metadata', 'created_at'
         ]
@@ -112,9 +112,7 @@ class TestInitialMigration:
         expected_indexes = {
             'ix_events_org_ts',
             'ix_events_user_ts',
-            'ix_events_enriched_org_id',
-            'ix_events_enriched_ts',
-            'ix_events_enriched_user_id'
+            'ix_events_ts_brin'
         }
 
         assert expected_indexes.issubset(index_names), \
@@ -126,10 +124,10 @@ class TestInitialMigration:
         inspector = inspect(db_engine)
 
         agg_tables = {
-            'daily_org_agg': ['date', 'org_id'],
-            'daily_user_agg': ['date', 'org_id', 'user_id'],
-            'daily_provider_agg': ['date', 'org_id', 'provider'],
-            'daily_model_agg': ['date', 'org_id', 'provider', 'model'],
+            'daily_org_agg': ['date', 'org_id', 'shard'],  # shard since 006
+            'daily_user_agg': ['date', 'org_id', 'user_key'],  # dimension keys since 013
+            'daily_provider_agg': ['date', 'org_id', 'provider_key'],
+            'daily_model_agg': ['date', 'org_id', 'provider_key', 'model_key'],
         }
 
         for table_name, pk_cols in agg_tables.items():
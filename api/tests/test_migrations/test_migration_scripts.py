@@ -179,6 +179,26 @@ class TestAlembicConfiguration:
             assert f"'{table}'" in content or f'"{table}"' in content, \
                 f"Table {table} not found in migration"
 
+    def test_migration_chain_is_linear(self):
+        """Test that every migration revises the previous one and can be rolled back."""
+        import re
+
+        versions = Path(__file__).parent.parent.parent / "alembic" / "versions"
+        migrations = sorted(versions.glob("[0-9][0-9][0-9]_*.py"))
+
+        previous = None
+        for migration in migrations:
+            content = migration.read_text()
+            revision = re.search(r"^revision: str = '(\w+)'", content, re.M).group(1)
+            down_revision = re.search(r"^down_revision: .* = (.+)$", content, re.M).group(1)
+
+            assert revision == migration.name[:3], f"{migration.name}: revision mismatch"
+            assert down_revision == (repr(previous) if previous else "None"), \
+                f"{migration.name}: expected down_revision {previous}"
+            assert "def upgrade()" in content
+            assert "def downgrade()" in content
+            previous = revision
+
 
 class TestDocumentation:
     """Test that all documentation exists."""
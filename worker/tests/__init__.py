@@ -0,0 +1,6 @@
+"""
+EcoMind Worker Test Suite
+
+Unit tests for event enrichment, factor lookup and aggregation.
+These run without Kafka or PostgreSQL; database sessions are faked.
+"""
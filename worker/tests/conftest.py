@@ -0,0 +1,238 @@
+"""
+Pytest configuration and fixtures for EcoMind worker tests.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from worker.services.dimensions import DimensionCache
+from worker.services.enrichment import EnrichmentService
+from worker.services.factors import FactorsService
+
+
+class RecordingCursor:
+    """Stand-in for a psycopg2 cursor that records COPY streams."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def copy_expert(self, sql, file):
+        self.session.copies.append((sql, file.read()))
+
+    def close(self):
+        pass
+
+
+class RecordingSession:
+    """Stand-in for a SQLAlchemy session that records executed statements."""
+
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.copies = []
+        self.committed = False
+        self.rolled_back = False
+        self.closed = False
+        self.fail_on = fail_on
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if self.fail_on and self.fail_on(sql, params or {}):
+            raise RuntimeError("simulated DB error")
+        self.statements.append((sql, params or {}))
+
+    def connection(self):
+        """Mimic Session.connection().connection.cursor()."""
+        session = self
+
+        class _Connection:
+            class connection:
+                @staticmethod
+                def cursor():
+                    return RecordingCursor(session)
+
+        return _Connection()
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeResult:
+    """Stand-in for a SQLAlchemy result holding `rows`."""
+
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+
+class FakeConnection:
+    """
+    Stand-in for a SQLAlchemy connection that records executed statements.
+    Subclasses answer the queries they care about by overriding `answer`.
+    """
+
+    default_isolation_level = "READ COMMITTED"
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.isolation_levels = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        return self.answer(sql, params)
+
+    def answer(self, sql, params):
+        return FakeResult()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def execution_options(self, isolation_level=None):
+        self.isolation_levels.append(isolation_level)
+        return self
+
+    def matching(self, fragment):
+        return [(sql, params) for sql, params in self.statements if fragment in sql]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def factors_service():
+    """Factors service loaded with the hardcoded defaults."""
+    service = FactorsService()
+    service._load_hardcoded_defaults()
+    service.grid_intensity = {"UNKNOWN": 500, "GLOBAL": 475, "US-CAISO": 220, "EU-FR": 60}
+    service.compile()
+    return service
+
+
+@pytest.fixture
+def sessions():
+    """Sessions handed out by the enrichment service, in order."""
+    return []
+
+
+@pytest.fixture
+def dimensions(tmp_path):
+    """Dimension cache over a SQLite dimensions table."""
+    cache = DimensionCache(f"sqlite:///{tmp_path / 'dimensions.db'}")
+    with cache.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE dimensions (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+            "value TEXT NOT NULL, UNIQUE (kind, value))"
+        ))
+    return cache
+
+
+@pytest.fixture
+def enrichment_service(factors_service, sessions, dimensions):
+    """Enrichment service whose sessions record statements instead of hitting Postgres."""
+    service = EnrichmentService(factors_service, "sqlite://", dimensions=dimensions)
+
+    def session_factory():
+        session = RecordingSession()
+        sessions.append(session)
+        return session
+
+    service.SessionLocal = session_factory
+    return service
+
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """
+    Postgres for integration tests: WORKER_TEST_DATABASE_URL (a scratch
+    database, its public schema is dropped) or else a container started
+    with testcontainers, like the API tests. Skipped without either.
+    """
+    url = os.getenv("WORKER_TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+    postgres = pytest.importorskip("testcontainers.postgres")
+    try:
+        container = postgres.PostgresContainer("postgres:15", driver="psycopg2").start()
+    except Exception as e:
+        pytest.skip(f"Cannot start a Postgres container: {e}")
+    try:
+        yield container.get_connection_url()
+    finally:
+        container.stop()
+
+
+@pytest.fixture
+def pg_engine(postgres_url, monkeypatch):
+    """Engine on a clean database migrated to the API's alembic head."""
+    command = pytest.importorskip("alembic.command")
+    from alembic.config import Config
+
+    engine = create_engine(postgres_url)
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+        conn.commit()
+
+    api = Path(__file__).resolve().parents[2] / "api"
+    config = Config()
+    config.set_main_option("script_location", str(api / "alembic"))
+    monkeypatch.setenv("DATABASE_URL", postgres_url)
+    command.upgrade(config, "head")
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_enrichment(pg_engine, postgres_url, factors_service):
+    """Enrichment service writing to the integration database."""
+    service = EnrichmentService(factors_service, postgres_url, dimensions=DimensionCache(postgres_url))
+    yield service
+    service.engine.dispose()
+    service.dimensions.engine.dispose()
+
+
+@pytest.fixture
+def make_event():
+    """Build a raw gateway event."""
+    def _make(**overrides):
+        event = {
+            "org_id": "org_1",
+            "user_id": "user_1",
+            "provider": "openai",
+            "model": "gpt-4o",
+            "region": "US-CAISO",
+            "tokens_in": 10,
+            "tokens_out": 20,
+            "ts": "2025-10-01T12:00:00Z",
+        }
+        event.update(overrides)
+        return event
+    return _make
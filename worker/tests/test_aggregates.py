@@ -0,0 +1,139 @@
+"""
+Tests for the in-memory aggregate accumulator.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from worker.services.aggregates import AggregateAccumulator, add_row, empty_deltas
+from tests.conftest import RecordingSession
+
+
+def _row(**overrides):
+    row = {
+        "org_id": "org_1",
+        "user_key": 1,
+        "provider_key": 2,
+        "model_key": 3,
+        "kwh": 0.001,
+        "water_l": 0.002,
+        "co2_kg": 0.0003,
+        "ts": datetime(2025, 10, 1, 12, 0),
+    }
+    row.update(overrides)
+    return row
+
+
+class TestAggregateAccumulator:
+    """Tests for AggregateAccumulator."""
+
+    def test_keys_grow_with_distinct_keys_not_events(self):
+        """Repeated events for one key collapse into a single delta."""
+        acc = AggregateAccumulator()
+        acc.add_rows([_row() for _ in range(100)])
+
+        assert acc.pending_events == 100
+        assert acc.distinct_keys == 6  # one per aggregate table
+
+        deltas, events = acc.drain()
+        call_count, kwh, _, _ = deltas["daily_org_agg"][(datetime(2025, 10, 1).date(), "org_1", 0)]
+        assert events == 100
+        assert call_count == 100
+        assert kwh == pytest.approx(0.1)
+
+    def test_separate_keys_per_table(self):
+        """Users and models fan out only in their own tables."""
+        acc = AggregateAccumulator()
+        acc.add_rows([_row(user_key=10, model_key=30), _row(user_key=11, model_key=31)])
+        deltas, _ = acc.drain()
+
+        assert len(deltas["daily_org_agg"]) == 1
+        assert len(deltas["daily_user_agg"]) == 2
+        assert len(deltas["daily_provider_agg"]) == 1
+        assert len(deltas["daily_model_agg"]) == 2
+
+    def test_shards_split_only_sharded_counters(self):
+        """Rows in different shards are separate daily_org_agg keys and nothing else."""
+        acc = AggregateAccumulator()
+        acc.add_rows([_row(), _row(), _row()], shards=[0, 1, 1])
+        deltas, _ = acc.drain()
+
+        day = datetime(2025, 10, 1).date()
+        assert deltas["daily_org_agg"][(day, "org_1", 0)][0] == 1
+        assert deltas["daily_org_agg"][(day, "org_1", 1)][0] == 2
+        assert len(deltas["daily_user_agg"]) == 1
+        assert len(deltas["hourly_org_agg"]) == 1
+
+    def test_due_on_event_count(self):
+        """A flush is due once enough events are pending."""
+        acc = AggregateAccumulator(flush_interval_ms=60_000, flush_max_events=3)
+        acc.add_rows([_row(), _row()])
+        assert not acc.due()
+        acc.add_rows([_row()])
+        assert acc.due()
+
+    def test_due_on_interval(self):
+        """A flush is due once the oldest pending event is old enough."""
+        acc = AggregateAccumulator(flush_interval_ms=0, flush_max_events=1000)
+        assert not acc.due()
+        acc.add_rows([_row()])
+        assert acc.due()
+
+    def test_request_flush(self):
+        """A requested flush is due even with nothing pending, and resets on drain."""
+        acc = AggregateAccumulator(flush_interval_ms=60_000)
+        acc.request_flush()
+        assert acc.due()
+        acc.drain()
+        assert not acc.due()
+
+
+class TestFlushAggregates:
+    """Tests for EnrichmentService with an accumulator."""
+
+    def test_batch_defers_aggregates(self, enrichment_service, sessions, make_event):
+        """With an accumulator, batch writes touch only events_enriched."""
+        acc = AggregateAccumulator()
+        enrichment_service.store_enriched_batch([enrichment_service.enrich(make_event())], acc)
+
+        assert all("events_enriched" in sql for sql, _ in sessions[0].statements)
+        assert acc.pending_events == 1
+
+    def test_flush_writes_one_row_per_key(self, enrichment_service, sessions, make_event):
+        """Deltas from many batches are written once per key."""
+        acc = AggregateAccumulator()
+        for _ in range(3):
+            enrichment_service.store_enriched_batch([enrichment_service.enrich(make_event())], acc)
+
+        assert enrichment_service.flush_aggregates(acc) == 6
+        statements = sessions[-1].statements
+        assert len(statements) == 6
+        assert all(params["call_count_0"] == 3 for _, params in statements)
+        assert acc.pending_events == 0
+
+    def test_failed_flush_keeps_deltas(self, enrichment_service, make_event):
+        """Deltas survive a failed flush and are retried."""
+        acc = AggregateAccumulator()
+        rows = [enrichment_service._to_row(enrichment_service.enrich(make_event()))]
+        enrichment_service.dimensions.encode(rows)
+        acc.add_rows(rows)
+
+        enrichment_service.SessionLocal = lambda: RecordingSession(fail_on=lambda sql, p: True)
+        with pytest.raises(RuntimeError):
+            enrichment_service.flush_aggregates(acc)
+
+        assert acc.pending_events == 1
+        assert acc.distinct_keys == 6
+
+
+def test_hourly_keys_truncate_to_the_hour():
+    """Events in one hour share an hourly key; the next hour starts a new one."""
+    deltas = empty_deltas()
+    add_row(deltas, _row(ts=datetime(2025, 10, 1, 12, 5, 30)))
+    add_row(deltas, _row(ts=datetime(2025, 10, 1, 12, 59, 59)))
+    add_row(deltas, _row(ts=datetime(2025, 10, 1, 13, 0, 0)))
+
+    assert deltas["hourly_org_agg"][(datetime(2025, 10, 1, 12), "org_1")][0] == 2
+    assert deltas["hourly_provider_agg"][(datetime(2025, 10, 1, 13), "org_1", 2)][0] == 1
+    assert len(deltas["daily_org_agg"]) == 1
@@ -0,0 +1,243 @@
+"""
+Tests for the asyncio worker runtime, using an in-memory event source.
+"""
+
+import asyncio
+import threading
+
+from worker.async_main import AsyncpgBatchWriter, AsyncWorker, MemoryEventSource
+
+
+class RecordingWriter:
+    """Async writer that records batches and tracks concurrency."""
+
+    def __init__(self, delay=0.0, fail_batches=(), fail_users=()):
+        self.batches = []
+        self.delay = delay
+        self.fail_batches = set(fail_batches)
+        self.fail_users = set(fail_users)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def write(self, events):
+        index = len(self.batches)
+        self.batches.append(events)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if index in self.fail_batches or any(e["user_id"] in self.fail_users for e in events):
+                raise RuntimeError("simulated DB error")
+        finally:
+            self.in_flight -= 1
+
+
+def _run(enrichment_service, events, writer, **kwargs):
+    async def go():
+        worker = AsyncWorker(
+            enrichment_service, MemoryEventSource(events), writer, poll_timeout_ms=50, **kwargs
+        )
+        await worker.run(until_idle=True)
+        return worker
+
+    return asyncio.run(go())
+
+
+class TestAsyncWorker:
+    """Tests for AsyncWorker."""
+
+    def test_enriches_and_writes_all_events(self, enrichment_service, make_event):
+        """Every event is enriched with the sync enrichment logic and written."""
+        events = [make_event(user_id=f"user_{i}") for i in range(7)]
+        writer = RecordingWriter()
+
+        worker = _run(enrichment_service, events, writer, batch_max_size=3)
+
+        written = [e for batch in writer.batches for e in batch]
+        assert [len(b) for b in writer.batches] == [3, 3, 1]
+        assert worker.written == 7
+        assert written[0]["kwh"] == enrichment_service.enrich(events[0])["kwh"]
+
+    def test_keeps_several_batches_in_flight(self, enrichment_service, make_event):
+        """Slow writes overlap up to max_in_flight."""
+        writer = RecordingWriter(delay=0.05)
+
+        _run(enrichment_service, [make_event() for _ in range(10)], writer,
+             batch_max_size=1, max_in_flight=3)
+
+        assert writer.max_in_flight == 3
+        assert len(writer.batches) == 10
+
+    def test_failed_batch_does_not_stop_worker(self, enrichment_service, make_event):
+        """A failing batch is retried in halves and later batches still go through."""
+        writer = RecordingWriter(fail_batches={0})
+
+        worker = _run(enrichment_service, [make_event() for _ in range(4)], writer, batch_max_size=2)
+
+        assert worker.failed == 0
+        assert worker.written == 4
+
+    def test_bad_record_is_dead_lettered(self, enrichment_service, make_event, tmp_path):
+        """Only the record that keeps failing is dead-lettered."""
+        from worker.services.dead_letter import DeadLetterQueue, JsonlDeadLetterSink
+
+        dead_letters = DeadLetterQueue(JsonlDeadLetterSink(tmp_path / "dlq.jsonl"))
+        writer = RecordingWriter(fail_users={"user_bad"})
+        events = [make_event(user_id=f"user_{i}") for i in range(3)] + [make_event(user_id="user_bad")]
+
+        worker = _run(enrichment_service, events, writer, batch_max_size=4, dead_letters=dead_letters)
+
+        assert worker.failed == 1
+        assert worker.written == 3
+        assert dead_letters.stats() == {"RuntimeError": 1}
+
+    def test_stop_waits_for_in_flight_writes(self, enrichment_service, make_event):
+        """stop() lets outstanding batch transactions finish."""
+        writer = RecordingWriter(delay=0.05)
+
+        async def go():
+            worker = AsyncWorker(
+                enrichment_service, MemoryEventSource([make_event() for _ in range(2)]), writer,
+                batch_max_size=1, poll_timeout_ms=50,
+            )
+            task = asyncio.create_task(worker.run())
+            await asyncio.sleep(0.01)
+            worker.stop()
+            await task
+            return worker
+
+        worker = asyncio.run(go())
+        assert writer.in_flight == 0
+        assert worker.written == len(writer.batches)
+
+    def test_offsets_are_committed_after_the_write(self, enrichment_service, make_event):
+        """A poll's offsets are committed only once its batch is written."""
+        source = MemoryEventSource([make_event() for _ in range(4)])
+        committed_during_write = []
+
+        class CheckingWriter(RecordingWriter):
+            async def write(self, events):
+                committed_during_write.append(dict(source.committed))
+                await super().write(events)
+
+        async def go():
+            worker = AsyncWorker(enrichment_service, source, CheckingWriter(), batch_max_size=2,
+                                 poll_timeout_ms=50, max_in_flight=1)
+            await worker.run(until_idle=True)
+
+        asyncio.run(go())
+        assert committed_during_write == [{}, {"memory": 2}]
+        assert source.committed == {"memory": 4}
+
+    def test_later_batches_wait_for_earlier_ones(self, enrichment_service, make_event):
+        """A batch finishing first does not commit past a slower earlier batch."""
+        source = MemoryEventSource([make_event() for _ in range(2)])
+        commits = []
+
+        class SlowFirstWriter(RecordingWriter):
+            calls = 0
+
+            async def write(self, events):
+                self.calls += 1
+                await asyncio.sleep(0.1 if self.calls == 1 else 0)
+                await super().write(events)
+
+        async def commit(offsets):
+            commits.append(dict(offsets))
+
+        source.commit = commit
+
+        async def go():
+            worker = AsyncWorker(enrichment_service, source, SlowFirstWriter(), batch_max_size=1,
+                                 poll_timeout_ms=50, max_in_flight=2)
+            await worker.run(until_idle=True)
+
+        asyncio.run(go())
+        assert commits == [{"memory": 2}]
+
+    def test_connection_errors_are_retried_not_dead_lettered(self, enrichment_service, make_event, tmp_path):
+        """A DB outage holds the batch back instead of bisecting it into the DLQ."""
+        from worker.services.dead_letter import DeadLetterQueue, JsonlDeadLetterSink
+
+        class FlakyWriter(RecordingWriter):
+            async def write(self, events):
+                await super().write(events)
+                if len(self.batches) <= 2:
+                    raise ConnectionRefusedError("database is down")
+
+        dead_letters = DeadLetterQueue(JsonlDeadLetterSink(tmp_path / "dlq.jsonl"))
+        writer = FlakyWriter()
+
+        worker = _run(enrichment_service, [make_event() for _ in range(4)], writer, batch_max_size=4,
+                      dead_letters=dead_letters, retry_backoff_s=0.01)
+
+        assert [len(b) for b in writer.batches] == [4, 4, 4]
+        assert worker.written == 4
+        assert dead_letters.stats() == {}
+
+    def test_a_committed_half_is_not_replayed_when_stopping(self, enrichment_service, make_event, tmp_path):
+        """Stopping during an outage dead-letters the rest of a partly written batch instead of raising."""
+        from worker.services.dead_letter import DeadLetterQueue, JsonlDeadLetterSink
+
+        class HalfWriter(RecordingWriter):
+            async def write(self, events):
+                await super().write(events)
+                if len(self.batches) == 1:
+                    raise RuntimeError("simulated bad record")
+                if len(self.batches) == 3:
+                    worker.stop()
+                    raise ConnectionRefusedError("database is down")
+
+        dead_letters = DeadLetterQueue(JsonlDeadLetterSink(tmp_path / "dlq.jsonl"))
+        worker = AsyncWorker(enrichment_service, MemoryEventSource(), HalfWriter(), dead_letters=dead_letters)
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(4)]
+
+        failed = asyncio.run(worker._write_isolating(batch))
+
+        assert [len(b) for b in worker.writer.batches] == [4, 2, 2]
+        assert failed == 2
+        assert dead_letters.stats() == {"ConnectionRefusedError": 2}
+
+    def test_lookups_run_off_the_event_loop(self, enrichment_service, make_event):
+        """Enrichment and the writer's org config lookups may query Postgres, so they run in threads."""
+        threads = {}
+        enrich, counter_shards = enrichment_service.enrich, enrichment_service.counter_shards
+
+        def record(name, fn):
+            def wrapper(*args):
+                threads[name] = threading.get_ident()
+                return fn(*args)
+            return wrapper
+
+        enrichment_service.enrich = record("enrich", enrich)
+        enrichment_service.counter_shards = record("counter_shards", counter_shards)
+
+        class FakeConnection:
+            def transaction(self):
+                return self
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def copy_records_to_table(self, table, records, columns):
+                self.records = records
+
+            async def executemany(self, sql, args):
+                pass
+
+        class FakePool:
+            conn = FakeConnection()
+
+            def acquire(self):
+                return self.conn
+
+        writer = AsyncpgBatchWriter(enrichment_service, "postgresql://unused", pool_size=1)
+        writer.pool = FakePool()
+        _run(enrichment_service, [make_event() for _ in range(2)], writer)
+
+        assert set(threads) == {"enrich", "counter_shards"}
+        assert threading.get_ident() not in threads.values()
+        assert len(FakePool.conn.records) == 2
@@ -0,0 +1,188 @@
+"""
+Tests for dead-letter routing and batch bisection.
+"""
+
+import json
+
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from tests.conftest import RecordingSession
+from worker.services.dead_letter import DeadLetterQueue, JsonlDeadLetterSink, store_isolating
+
+
+class FailingSessions:
+    """Session factory whose sessions fail when a statement mentions a bad user."""
+
+    def __init__(self, dimensions, bad_users=(), error=None):
+        self.sessions = []
+        self.dimensions = dimensions
+        self.bad_users = set(bad_users)
+        self.error = error
+
+    def users(self, params):
+        """User ids of the events_enriched rows in `params`, decoded from their keys."""
+        with self.dimensions.engine.connect() as conn:
+            names = dict(conn.execute(text("SELECT id, value FROM dimensions WHERE kind = 'user_id'")).fetchall())
+        return [names[value] for key, value in params.items() if key.startswith("user_key_")]
+
+    def __call__(self):
+        session = RecordingSession(fail_on=self._fails)
+        self.sessions.append(session)
+        return session
+
+    def _fails(self, sql, params):
+        if self.error is not None:
+            raise self.error
+        return "events_enriched" in sql and not self.bad_users.isdisjoint(self.users(params))
+
+    def committed_users(self):
+        return sorted(
+            user
+            for session in self.sessions if session.committed
+            for sql, params in session.statements if "events_enriched" in sql
+            for user in self.users(params)
+        )
+
+
+def _dead_letters(tmp_path):
+    return DeadLetterQueue(JsonlDeadLetterSink(tmp_path / "dlq.jsonl"))
+
+
+class TestStoreIsolating:
+    """Tests for store_isolating."""
+
+    def test_good_batch_is_one_transaction(self, enrichment_service, make_event, tmp_path):
+        sessions = FailingSessions(enrichment_service.dimensions)
+        enrichment_service.SessionLocal = sessions
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(8)]
+
+        assert store_isolating(enrichment_service, batch, dead_letters=_dead_letters(tmp_path)) == 0
+        assert len(sessions.sessions) == 1
+
+    def test_bad_record_is_isolated_by_bisection(self, enrichment_service, make_event, tmp_path):
+        """One bad record among 8 costs log2(8) levels of retries, not 8 row-by-row writes."""
+        sessions = FailingSessions(enrichment_service.dimensions, bad_users={"user_5"})
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(8)]
+
+        failed = store_isolating(enrichment_service, batch, dead_letters=dead_letters)
+
+        assert failed == 1
+        assert sessions.committed_users() == [f"user_{i}" for i in range(8) if i != 5]
+        assert len(sessions.sessions) == 7  # 8 → 4+4 → 2+2 → 1+1
+        assert dead_letters.stats() == {"RuntimeError": 1}
+
+        record = json.loads((tmp_path / "dlq.jsonl").read_text())
+        assert record["event"]["user_id"] == "user_5"
+        assert record["stage"] == "store"
+        assert record["error_class"] == "RuntimeError"
+
+    def test_malformed_record_is_dead_lettered(self, enrichment_service, make_event, tmp_path):
+        """A record missing user_id no longer takes its batch down with it."""
+        sessions = FailingSessions(enrichment_service.dimensions)
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        bad = enrichment_service.enrich(make_event())
+        del bad["user_id"]
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(3)] + [bad]
+
+        assert store_isolating(enrichment_service, batch, dead_letters=dead_letters) == 1
+        assert sessions.committed_users() == ["user_0", "user_1", "user_2"]
+        assert dead_letters.stats() == {"KeyError": 1}
+
+    def test_transient_error_is_not_bisected(self, enrichment_service, make_event, tmp_path):
+        sessions = FailingSessions(enrichment_service.dimensions, error=OperationalError("INSERT", {}, Exception("connection refused")))
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        batch = [enrichment_service.enrich(make_event()) for _ in range(8)]
+
+        assert store_isolating(enrichment_service, batch, dead_letters=dead_letters) == 8
+        assert len(sessions.sessions) == 1
+        assert dead_letters.stats() == {"OperationalError": 8}
+
+    def test_transient_error_is_retried_while_allowed(self, enrichment_service, make_event, tmp_path):
+        sessions = FailingSessions(enrichment_service.dimensions, error=OperationalError("INSERT", {}, Exception("connection refused")))
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(4)]
+
+        def should_retry():
+            if len(sessions.sessions) == 3:
+                sessions.error = None  # The database is back
+            return True
+
+        failed = store_isolating(enrichment_service, batch, dead_letters=dead_letters,
+                                 should_retry=should_retry, retry_backoff_s=0)
+
+        assert failed == 0
+        assert len(sessions.sessions) == 4
+        assert sessions.committed_users() == [f"user_{i}" for i in range(4)]
+        assert dead_letters.stats() == {}
+
+    def test_transient_error_is_raised_once_retrying_stops(self, enrichment_service, make_event, tmp_path):
+        sessions = FailingSessions(enrichment_service.dimensions, error=OperationalError("INSERT", {}, Exception("connection refused")))
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        batch = [enrichment_service.enrich(make_event()) for _ in range(4)]
+
+        with pytest.raises(OperationalError):
+            store_isolating(enrichment_service, batch, dead_letters=dead_letters, raise_transient=True,
+                            should_retry=lambda: len(sessions.sessions) < 3, retry_backoff_s=0)
+
+        assert len(sessions.sessions) == 3
+        assert dead_letters.stats() == {}
+
+    def test_transient_error_after_a_committed_half_is_not_raised(self, enrichment_service, make_event, tmp_path):
+        """Raising would make the caller store the committed half a second time."""
+        sessions = FailingSessions(enrichment_service.dimensions)
+        enrichment_service.SessionLocal = sessions
+        dead_letters = _dead_letters(tmp_path)
+        store = enrichment_service.store_enriched_batch
+        calls = []
+
+        def flaky_store(batch, accumulator=None, use_copy=False):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise RuntimeError("bad record")
+            if len(calls) == 3:
+                raise OperationalError("INSERT", {}, Exception("connection refused"))
+            return store(batch, accumulator)
+
+        enrichment_service.store_enriched_batch = flaky_store
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(4)]
+
+        failed = store_isolating(enrichment_service, batch, dead_letters=dead_letters, raise_transient=True)
+
+        assert failed == 2
+        assert calls == [4, 2, 2]
+        assert sessions.committed_users() == ["user_0", "user_1"]
+        assert dead_letters.stats() == {"OperationalError": 2}
+
+    def test_bisection_keeps_use_copy(self, enrichment_service, make_event, tmp_path):
+        sessions = FailingSessions(enrichment_service.dimensions, bad_users={"user_1"})
+        enrichment_service.SessionLocal = sessions
+        store = enrichment_service.store_enriched_batch
+        copies = []
+
+        def recording_store(batch, accumulator=None, use_copy=False):
+            copies.append(use_copy)
+            return store(batch, accumulator)
+
+        enrichment_service.store_enriched_batch = recording_store
+        batch = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(4)]
+
+        assert store_isolating(enrichment_service, batch, dead_letters=_dead_letters(tmp_path), use_copy=True) == 1
+        assert copies == [True] * 5
+
+
+def test_from_env_selects_sink(monkeypatch, tmp_path):
+    monkeypatch.setenv("WORKER_DEAD_LETTER", "off")
+    assert DeadLetterQueue.from_env() is None
+
+    monkeypatch.setenv("WORKER_DEAD_LETTER", "jsonl")
+    monkeypatch.setenv("WORKER_DEAD_LETTER_PATH", str(tmp_path / "dlq.jsonl"))
+    assert isinstance(DeadLetterQueue.from_env().sink, JsonlDeadLetterSink)
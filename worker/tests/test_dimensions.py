@@ -0,0 +1,59 @@
+"""
+Tests for the dimension key cache.
+"""
+
+from sqlalchemy import text
+
+from worker.services.dimensions import DimensionCache
+
+
+def _rows():
+    return [
+        {"user_id": "user_1", "provider": "openai", "model": "gpt-4o", "region": "US-CAISO"},
+        {"user_id": "user_2", "provider": "openai", "model": None, "region": "US-CAISO"},
+    ]
+
+
+def test_encode_sets_key_columns(dimensions):
+    rows = _rows()
+    dimensions.encode(rows)
+
+    assert rows[0]["provider_key"] == rows[1]["provider_key"]
+    assert rows[0]["region_key"] == rows[1]["region_key"]
+    assert rows[0]["user_key"] != rows[1]["user_key"]
+    assert rows[1]["model_key"] is None
+    # Same value under another kind gets its own key
+    keys = dimensions.keys([("user_id", "openai"), ("provider", "openai")])
+    assert keys[("user_id", "openai")] != keys[("provider", "openai")]
+
+
+def test_hits_need_no_round_trip(dimensions):
+    dimensions.encode(_rows())
+    with dimensions.engine.begin() as conn:
+        conn.execute(text("DROP TABLE dimensions"))
+
+    rows = _rows()
+    dimensions.encode(rows)
+
+    assert rows[0]["model_key"] is not None
+    assert dimensions.stats() == {"hits": 5, "misses": 5, "cached": 5}
+
+
+def test_keys_are_shared_between_writers(dimensions):
+    other = DimensionCache(str(dimensions.engine.url))
+    first, second = _rows(), _rows()[::-1]
+
+    dimensions.encode(first)
+    other.encode(second)
+
+    assert [row["user_key"] for row in first] == [row["user_key"] for row in second[::-1]]
+
+
+def test_cache_is_bounded(dimensions):
+    dimensions.max_entries = 2
+    dimensions.keys([("user_id", "a"), ("user_id", "b"), ("user_id", "c")])
+    dimensions.keys([("user_id", "b")])
+
+    assert dimensions.stats()["cached"] == 2
+    with dimensions.engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM dimensions")).scalar() == 3
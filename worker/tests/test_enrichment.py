@@ -0,0 +1,161 @@
+"""
+Tests for EnrichmentService batched writes.
+"""
+
+import csv
+import io
+
+import pytest
+from hypothesis import HealthCheck, given, settings
+from hypothesis import strategies as st
+
+
+class TestStoreEnrichedBatch:
+    """Tests for store_enriched_batch."""
+
+    def test_empty_batch_opens_no_session(self, enrichment_service, sessions):
+        """An empty batch is a no-op."""
+        assert enrichment_service.store_enriched_batch([]) == 0
+        assert sessions == []
+
+    def test_batch_uses_one_transaction(self, enrichment_service, sessions, make_event):
+        """All events of a batch are committed in a single session."""
+        events = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(5)]
+
+        assert enrichment_service.store_enriched_batch(events) == 5
+
+        assert len(sessions) == 1
+        assert sessions[0].committed
+        assert sessions[0].closed
+
+    def test_events_inserted_with_one_statement(self, enrichment_service, sessions, make_event):
+        """Events are written with a multi-row INSERT."""
+        events = [enrichment_service.enrich(make_event()) for _ in range(3)]
+        enrichment_service.store_enriched_batch(events)
+
+        inserts = [s for s in sessions[0].statements if "INTO events_enriched" in s[0]]
+        assert len(inserts) == 1
+        assert "org_id_2" in inserts[0][1]
+
+    def test_retried_events_keep_their_ids(self, enrichment_service, sessions, make_event):
+        """Ids are assigned at enrichment, so writing the same batch again reuses them."""
+        events = [enrichment_service.enrich(make_event()) for _ in range(2)]
+        enrichment_service.store_enriched_batch(events)
+        enrichment_service.store_enriched_batch(events)
+
+        ids = [
+            [params[f"id_{i}"] for i in range(2)]
+            for session in sessions
+            for sql, params in session.statements
+            if "INSERT INTO events_enriched" in sql
+        ]
+        assert ids[0] == ids[1] == [e["event_id"] for e in events]
+
+    def test_one_upsert_row_per_distinct_key(self, enrichment_service, sessions, make_event):
+        """Deltas for the same aggregate key are summed before the upsert."""
+        events = [
+            enrichment_service.enrich(make_event(user_id="user_1")),
+            enrichment_service.enrich(make_event(user_id="user_1")),
+            enrichment_service.enrich(make_event(user_id="user_2")),
+        ]
+        enrichment_service.store_enriched_batch(events)
+
+        statements = dict(
+            (table, params)
+            for sql, params in sessions[0].statements
+            for table in ("daily_org_agg", "daily_user_agg")
+            if f"INSERT INTO {table}" in sql
+        )
+
+        org_params = statements["daily_org_agg"]
+        assert org_params["call_count_0"] == 3
+        assert "call_count_1" not in org_params
+        assert org_params["kwh_0"] == pytest.approx(sum(e["kwh"] for e in events))
+
+        user_params = statements["daily_user_agg"]
+        assert {user_params["call_count_0"], user_params["call_count_1"]} == {1, 2}
+
+    def test_failure_rolls_back(self, enrichment_service, make_event):
+        """A failing statement rolls back the whole batch."""
+        from tests.conftest import RecordingSession
+
+        session = RecordingSession(fail_on=lambda sql, params: "daily_model_agg" in sql)
+        enrichment_service.SessionLocal = lambda: session
+
+        with pytest.raises(RuntimeError):
+            enrichment_service.store_enriched_batch([enrichment_service.enrich(make_event())])
+
+        assert session.rolled_back
+        assert not session.committed
+        assert session.closed
+
+
+class TestCopyMode:
+    """Tests for the COPY bulk write mode."""
+
+    def test_copy_streams_events(self, enrichment_service, sessions, make_event):
+        """With use_copy, events go through COPY and aggregates through upserts."""
+        events = [enrichment_service.enrich(make_event(user_id=f"user_{i}")) for i in range(3)]
+
+        enrichment_service.store_enriched_batch(events, use_copy=True)
+
+        session = sessions[0]
+        assert len(session.copies) == 1
+        sql, data = session.copies[0]
+        assert sql.startswith("COPY events_enriched (id, org_id, user_key, provider_key, model_key")
+        assert "FORMAT csv" in sql
+        assert not any("INTO events_enriched" in s for s, _ in session.statements)
+        assert sum("ON CONFLICT" in s for s, _ in session.statements) == 6
+        assert session.committed
+
+        rows = list(csv.reader(io.StringIO(data)))
+        keys = enrichment_service.dimensions.keys(("user_id", f"user_{i}") for i in range(3))
+        assert [int(row[2]) for row in rows] == [keys[("user_id", f"user_{i}")] for i in range(3)]
+        assert float(rows[0][9]) == events[0]["kwh"]
+        assert [row[0] for row in rows] == [e["event_id"] for e in events]
+        assert rows[0][0] < rows[1][0] < rows[2][0]
+
+    def test_copy_keeps_null_and_empty_distinct(self, enrichment_service, sessions, make_event):
+        """None is written unquoted (NULL) while empty strings stay quoted."""
+        event = enrichment_service.enrich(make_event(node_type=None, source=""))
+
+        enrichment_service.store_enriched_batch([event], use_copy=True)
+
+        line = sessions[0].copies[0][1]
+        assert ',,' in line  # node_type NULL
+        assert ',"",' in line  # empty source
+
+
+PROVIDERS = ["openai", "anthropic", "unknown", "mistral"]
+MODELS = ["gpt-4o", "gpt-4", "claude-3-opus", "claude-3-haiku", "", "not-a-model"]
+REGIONS = ["US-CAISO", "EU-FR", "UNKNOWN", "", "MARS-1"]
+
+
+class TestEnrichBatch:
+    """Tests for the vectorized enrich_batch."""
+
+    def test_empty_batch(self, enrichment_service):
+        """An empty batch returns empty columns."""
+        result = enrichment_service.enrich_batch([], [], [])
+        assert all(len(result[column]) == 0 for column in ("kwh", "water_l", "co2_kg"))
+
+    @settings(suppress_health_check=[HealthCheck.function_scoped_fixture])
+    @given(st.lists(
+        st.tuples(st.sampled_from(PROVIDERS), st.sampled_from(MODELS), st.sampled_from(REGIONS)),
+        max_size=50,
+    ))
+    def test_matches_enrich_exactly(self, enrichment_service, triples):
+        """Every column equals what enrich() computes for the same event, bit for bit."""
+        providers = [p for p, _, _ in triples]
+        models = [m for _, m, _ in triples]
+        regions = [r for _, _, r in triples]
+
+        result = enrichment_service.enrich_batch(providers, models, regions)
+
+        for i, (provider, model, region) in enumerate(triples):
+            expected = enrichment_service.enrich(
+                {"provider": provider, "model": model, "region": region}
+            )
+            assert result["kwh"][i] == expected["kwh"]
+            assert result["water_l"][i] == expected["water_l"]
+            assert result["co2_kg"][i] == expected["co2_kg"]
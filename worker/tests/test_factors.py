@@ -0,0 +1,64 @@
+"""
+Tests for FactorsService's compiled lookup table.
+"""
+
+import pytest
+
+from worker.services import factors as factors_module
+from worker.services.factors import FactorEntry
+
+
+class TestCompiledTable:
+    """Tests for FactorsService.compile and lookup."""
+
+    def test_table_covers_known_triples(self, factors_service):
+        """Every provider/model is compiled for every region, plus UNKNOWN."""
+        assert ("openai", "gpt-4o", "US-CAISO") in factors_service.table
+        assert ("openai", "", "UNKNOWN") in factors_service.table
+        assert ("anthropic", "claude-3-haiku", "EU-FR") in factors_service.table
+
+    def test_table_is_immutable(self, factors_service):
+        """The compiled table cannot be modified in place."""
+        with pytest.raises(TypeError):
+            factors_service.table[("x", "y", "z")] = FactorEntry(0.0, 0.0, 0.0)
+
+    def test_entry_matches_formula(self, factors_service):
+        """Entries hold the final per-call multipliers."""
+        entry = factors_service.lookup("openai", "gpt-4o", "US-CAISO")
+        kwh = 0.0005 * 1.5
+        assert entry == FactorEntry(kwh, kwh * 1.8, (kwh * 220) / 1000.0)
+
+    def test_unknown_region_uses_default_co2(self, factors_service):
+        """Empty and UNKNOWN regions fall back to co2_kg_per_kwh."""
+        kwh = 0.0005 * 1.5
+        assert factors_service.lookup("openai", "gpt-4o", "").co2_kg == kwh * 0.4
+        assert factors_service.lookup("openai", "gpt-4o", "UNKNOWN").co2_kg == kwh * 0.4
+
+    def test_hit_and_miss_counters(self, factors_service):
+        """Compiled and memoized lookups are hits; first-time unseen triples are misses."""
+        factors_service.lookup("openai", "gpt-4o", "US-CAISO")
+        factors_service.lookup("openai", "gpt-5", "US-CAISO")
+        factors_service.lookup("openai", "gpt-5", "US-CAISO")
+
+        stats = factors_service.lookup_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["memoized"] == 1
+
+    def test_unseen_cache_is_bounded(self, factors_service, monkeypatch):
+        """The least recently used unseen triple is evicted past the bound."""
+        monkeypatch.setattr(factors_module, "UNSEEN_CACHE_SIZE", 2)
+        for model in ("a", "b", "c"):
+            factors_service.lookup("openai", model, "EU-FR")
+
+        assert factors_service.lookup_stats()["memoized"] == 2
+        factors_service.lookup("openai", "a", "EU-FR")
+        assert factors_service.misses == 4
+
+    def test_compile_resets_memo(self, factors_service):
+        """Recompiling drops memoized entries and counters."""
+        factors_service.lookup("openai", "gpt-5", "EU-FR")
+        factors_service.compile()
+        assert factors_service.lookup_stats() == {
+            "hits": 0, "misses": 0, "compiled": len(factors_service.table), "memoized": 0,
+        }
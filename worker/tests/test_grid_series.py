@@ -0,0 +1,110 @@
+"""
+Tests for time-varying grid intensity series.
+"""
+
+import numpy as np
+import pytest
+
+from worker.services.grid_series import GridIntensitySeries, IntensitySeries, parse_timestamp
+from worker.services.overrides import FactorOverride
+
+HOUR = 3600
+T0 = parse_timestamp("2025-10-01T00:00:00Z")
+
+SERIES_CSV = """region,ts,gco2_per_kwh
+US-CAISO,2025-10-01T01:00:00Z,200
+US-CAISO,2025-10-01T00:00:00Z,100
+US-CAISO,2025-10-01T02:00:00Z,300
+"""
+
+
+@pytest.fixture
+def series_factors(factors_service, tmp_path):
+    """Factors with an hourly US-CAISO series covering 00:00–03:00 UTC."""
+    path = tmp_path / "series"
+    path.mkdir()
+    (path / "all.csv").write_text(SERIES_CSV)
+    factors_service.grid_series = GridIntensitySeries.load(path)
+    return factors_service
+
+
+class TestIntensitySeries:
+    """Tests for IntensitySeries lookups."""
+
+    def test_value_applies_until_next_sample(self):
+        series = IntensitySeries(np.array([0.0, HOUR, 2 * HOUR]), np.array([1.0, 2.0, 3.0]))
+        assert series.at(0) == 1.0
+        assert series.at(HOUR - 1) == 1.0
+        assert series.at(HOUR) == 2.0
+        assert series.at(3 * HOUR - 1) == 3.0
+
+    def test_outside_series_is_none(self):
+        series = IntensitySeries(np.array([0.0, HOUR]), np.array([1.0, 2.0]))
+        assert series.at(-1) is None
+        assert series.at(2 * HOUR) is None
+
+    def test_cursor_does_not_affect_results(self):
+        series = IntensitySeries(np.arange(0, 48 * HOUR, HOUR, dtype=np.float64), np.arange(48.0))
+        times = np.random.default_rng(1).uniform(-HOUR, 50 * HOUR, 500)
+        values, covered = series.at_many(times)
+        for t, value, ok in zip(times, values, covered):
+            assert series.at(t) == (value if ok else None)
+
+    def test_duplicate_timestamps_keep_last(self):
+        series = IntensitySeries(np.array([0.0, 0.0, HOUR]), np.array([1.0, 5.0, 2.0]))
+        assert len(series) == 2
+        assert series.at(10) == 5.0
+
+
+class TestLoading:
+    """Tests for loading series files."""
+
+    def test_region_from_file_name(self, tmp_path):
+        (tmp_path / "EU-FR.csv").write_text("ts,gco2_per_kwh\n0,50\n3600,70\n")
+        grid = GridIntensitySeries.load(tmp_path)
+        assert grid.at("EU-FR", 4000) == 70.0
+        assert "US-CAISO" not in grid
+
+    def test_rows_are_sorted(self, series_factors):
+        series = series_factors.grid_series.get("US-CAISO")
+        assert list(series.ts) == [T0, T0 + HOUR, T0 + 2 * HOUR]
+        assert list(series.values) == [100.0, 200.0, 300.0]
+
+
+class TestEnrichWithSeries:
+    """Tests for enrichment against intensity series."""
+
+    def test_enrich_uses_intensity_at_event_time(self, enrichment_service, series_factors, make_event):
+        enriched = enrichment_service.enrich(make_event(ts="2025-10-01T01:30:00Z"))
+        assert enriched["co2_kg"] == pytest.approx(enriched["kwh"] * 200 / 1000)
+
+    def test_enrich_outside_series_uses_static_value(self, enrichment_service, series_factors, make_event):
+        enriched = enrichment_service.enrich(make_event(ts="2025-10-02T12:00:00Z"))
+        assert enriched["co2_kg"] == pytest.approx(enriched["kwh"] * 220 / 1000)
+
+    def test_co2_override_wins_over_series(self, series_factors):
+        entry = series_factors.lookup_at(
+            "openai", "gpt-4o", "US-CAISO", T0, FactorOverride(co2_kg_per_kwh=0.1)
+        )
+        assert entry.co2_kg == pytest.approx(entry.kwh * 0.1)
+
+    def test_enrich_batch_matches_enrich(self, enrichment_service, series_factors, make_event):
+        rng = np.random.default_rng(7)
+        events = [
+            make_event(
+                ts=float(T0 + rng.uniform(-HOUR, 4 * HOUR)),
+                region=str(rng.choice(["US-CAISO", "EU-FR", "UNKNOWN"])),
+                model=str(rng.choice(["gpt-4o", "gpt-4"])),
+            )
+            for _ in range(300)
+        ]
+
+        result = enrichment_service.enrich_batch(
+            [e["provider"] for e in events],
+            [e["model"] for e in events],
+            [e["region"] for e in events],
+            timestamps=[e["ts"] for e in events],
+        )
+
+        expected = [enrichment_service.enrich(e)["co2_kg"] for e in events]
+        assert list(result["co2_kg"]) == expected
@@ -0,0 +1,37 @@
+"""
+Tests for time-ordered event ids.
+"""
+
+import re
+import uuid
+
+from worker.services import ids
+from worker.services.ids import UUID7_PATTERN, event_id_ms, new_event_id
+
+
+def test_ids_are_uuid7_with_the_creation_time():
+    event_id = new_event_id(now_ms=1_760_000_000_000)
+
+    parsed = uuid.UUID(event_id)
+    assert parsed.version == 7
+    assert parsed.variant == uuid.RFC_4122
+    assert event_id_ms(event_id) >= 1_760_000_000_000
+    assert re.match(UUID7_PATTERN, event_id)
+
+
+def test_ids_sort_by_creation_order():
+    ids = [new_event_id() for _ in range(10_000)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_ids_keep_increasing_when_the_clock_steps_back(monkeypatch):
+    # Restored afterwards, so later ids carry the real clock again
+    monkeypatch.setattr(ids, "_last_ms", 0)
+    monkeypatch.setattr(ids, "_counter", 0)
+    later = new_event_id(now_ms=2_000_000_000_000)
+    earlier_clock = new_event_id(now_ms=1_000_000_000_000)
+
+    assert earlier_clock > later
+    assert event_id_ms(earlier_clock) == event_id_ms(later)
@@ -0,0 +1,78 @@
+"""
+Tests for the maintenance commands.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from worker.maintenance import prune_hourly, rekey_events
+
+
+class BatchedDeletes:
+    """Connection whose DELETEs report `rows` deleted, `batch_size` at a time."""
+
+    def __init__(self, rows):
+        self.rows = dict(rows)
+        self.statements = []
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        table = sql.split("DELETE FROM ")[1].split()[0]
+        n = min(self.rows.get(table, 0), params["batch_size"])
+        self.rows[table] = self.rows.get(table, 0) - n
+
+        class Result:
+            rowcount = n
+        return Result()
+
+    def commit(self):
+        pass
+
+
+def test_prune_hourly_deletes_in_batches():
+    conn = BatchedDeletes({"hourly_org_agg": 25, "hourly_provider_agg": 3})
+
+    deleted = prune_hourly(conn, keep_days=14, batch_size=10, now=datetime(2025, 10, 15, 8, 30))
+
+    assert deleted == 28
+    assert len(conn.statements) == 3 + 1
+    assert conn.statements[0][1]["cutoff"] == datetime(2025, 10, 1, 8)
+    assert not any("daily_" in sql for sql, _ in conn.statements)
+
+
+def test_prune_hourly_keeps_48_hours():
+    with pytest.raises(ValueError):
+        prune_hourly(BatchedDeletes({}), keep_days=1)
+
+
+class Updates:
+    """Connection whose UPDATEs report `per_window` rows each."""
+
+    def __init__(self, per_window):
+        self.per_window = per_window
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+
+        class Result:
+            rowcount = self.per_window
+        return Result()
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_rekey_events_commits_per_window():
+    conn = Updates(per_window=7)
+
+    rewritten = rekey_events(conn, datetime(2025, 10, 1), datetime(2025, 10, 2), timedelta(hours=6))
+
+    assert rewritten == 28
+    assert conn.commits == 4
+    assert [params["start"].hour for _, params in conn.statements] == [0, 6, 12, 18]
+    assert conn.statements[-1][1]["end"] == datetime(2025, 10, 2)
+    assert "id !~ :uuid7" in conn.statements[0][0]
@@ -0,0 +1,121 @@
+"""
+Tests for cached per-org settings and sharded counter selection.
+"""
+
+import pytest
+from sqlalchemy import text
+
+from worker.services.org_config import CounterShards, OrgConfig, OrgConfigCache, RawEventFilter
+
+
+@pytest.fixture
+def org_config(tmp_path):
+    """Cache over a SQLite orgs table."""
+    cache = OrgConfigCache(f"sqlite:///{tmp_path / 'orgs.db'}", ttl_s=60)
+    with cache.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE orgs (id TEXT PRIMARY KEY, agg_shards INTEGER, ingest_mode TEXT, raw_sample_rate INTEGER)"
+        ))
+        conn.execute(text(
+            "INSERT INTO orgs VALUES ('org_hot', 8, 'full', 10), ('org_1', 1, 'full', 10), "
+            "('org_sampled', 1, 'sampled', 4), ('org_dash', 1, 'aggregate_only', 10)"
+        ))
+    return cache
+
+
+def test_settings_are_cached(org_config):
+    assert org_config.get("org_hot") == OrgConfig(agg_shards=8)
+    with org_config.engine.begin() as conn:
+        conn.execute(text("UPDATE orgs SET agg_shards = 2"))
+    assert org_config.get("org_hot").agg_shards == 8
+    assert org_config.stats() == {"hits": 1, "misses": 1, "cached": 1}
+
+
+def test_unknown_org_and_failed_load_use_defaults(org_config):
+    assert org_config.get("org_missing") == OrgConfig()
+    with org_config.engine.begin() as conn:
+        conn.execute(text("DROP TABLE orgs"))
+    assert org_config.get("org_1") == OrgConfig()
+
+
+def test_shard_follows_the_lowest_assigned_partition(org_config):
+    shards = CounterShards(org_config, by="partition")
+    shards.assign_partitions([13, 5, 9])
+
+    assert shards.shard("org_hot") == 5
+    assert shards.shard("org_1") == 0
+    assert shards.shard("org_missing") == 0
+
+
+def test_hash_slots_ignore_partitions(org_config):
+    shards = CounterShards(org_config, by="hash")
+    slot = shards.slot
+    shards.assign_partitions([3])
+
+    assert shards.slot == slot
+    assert 0 <= shards.shard("org_hot") < 8
+
+
+def test_store_writes_deltas_to_the_writers_shard(enrichment_service, sessions, make_event, org_config):
+    enrichment_service.shards = CounterShards(org_config)
+    enrichment_service.shards.assign_partitions([3])
+    enrichment_service.store_enriched_batch([enrichment_service.enrich(make_event(org_id="org_hot"))])
+
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO daily_org_agg" in sql]
+    assert params["shard_0"] == 3
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO daily_user_agg" in sql]
+    assert "shard_0" not in params
+
+
+def test_ingest_modes_are_loaded(org_config):
+    assert org_config.get("org_sampled") == OrgConfig(ingest_mode="sampled", raw_sample_rate=4)
+    assert org_config.get("org_dash").ingest_mode == "aggregate_only"
+
+
+def test_sampling_is_deterministic_per_event(org_config):
+    raw_events = RawEventFilter(org_config)
+    rows = [{"org_id": "org_sampled", "user_id": f"user_{i}", "id": f"event_{i}"} for i in range(400)]
+
+    weights = [raw_events.sample_weight(row) for row in rows]
+
+    assert set(weights) == {0, 4}
+    assert 60 < weights.count(4) < 140
+    assert weights == [raw_events.sample_weight(row) for row in rows]
+    assert all(raw_events.sample_weight({**row, "org_id": "org_1"}) == 1 for row in rows)
+    assert not any(raw_events.sample_weight({**row, "org_id": "org_dash"}) for row in rows)
+
+
+def test_sampling_does_not_depend_on_the_event_id(enrichment_service, make_event, org_config):
+    """Each enrich() assigns a new id; a replayed event must still be sampled the same way."""
+    raw_events = RawEventFilter(org_config)
+    events = [make_event(org_id="org_sampled", tokens_in=i) for i in range(100)]
+
+    first = [raw_events.sample_weight(enrichment_service._to_row(enrichment_service.enrich(e))) for e in events]
+    replayed = [raw_events.sample_weight(enrichment_service._to_row(enrichment_service.enrich(e))) for e in events]
+
+    assert first == replayed
+    assert set(first) == {0, 4}
+
+
+def test_aggregate_only_orgs_keep_exact_aggregates(enrichment_service, sessions, make_event, org_config):
+    enrichment_service.raw_events = RawEventFilter(org_config)
+    events = [enrichment_service.enrich(make_event(org_id=org_id)) for org_id in ("org_dash", "org_dash", "org_1")]
+    enrichment_service.store_enriched_batch(events)
+
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO events_enriched" in sql]
+    assert params["org_id_0"] == "org_1" and "org_id_1" not in params
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO daily_org_agg" in sql]
+    counts = {params[f"org_id_{i}"]: params[f"call_count_{i}"] for i in range(2)}
+    assert counts == {"org_dash": 2, "org_1": 1}
+
+
+def test_sampled_rows_carry_their_weight(enrichment_service, sessions, make_event, org_config):
+    enrichment_service.raw_events = RawEventFilter(org_config)
+    events = [enrichment_service.enrich(make_event(org_id="org_sampled", tokens_in=i)) for i in range(40)]
+    enrichment_service.store_enriched_batch(events)
+
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO events_enriched" in sql]
+    weights = [v for k, v in params.items() if k.startswith("sample_weight_")]
+    assert weights and set(weights) == {4}
+    (params,) = [p for sql, p in sessions[0].statements if "INSERT INTO daily_org_agg" in sql]
+    assert params["call_count_0"] == 40
@@ -0,0 +1,156 @@
+"""
+Tests for org-scoped factor overrides and their cached resolver.
+"""
+
+import pytest
+from sqlalchemy import text
+
+from worker.services.overrides import FactorOverride, OverrideResolver
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    """Resolver over a SQLite factors_overrides table, without the LISTEN thread."""
+    resolver = OverrideResolver(f"sqlite:///{tmp_path / 'overrides.db'}", ttl_s=60, listen=False)
+    with resolver.engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE factors_overrides (
+                org_id TEXT, provider TEXT, model TEXT,
+                kwh_per_call REAL, pue REAL, water_l_per_kwh REAL, co2_kg_per_kwh REAL
+            )
+        """))
+    return resolver
+
+
+def add_override(resolver, org_id, provider, model="", **factors):
+    with resolver.engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO factors_overrides
+                VALUES (:org_id, :provider, :model, :kwh_per_call, :pue, :water_l_per_kwh, :co2_kg_per_kwh)
+            """),
+            {"org_id": org_id, "provider": provider, "model": model, **FactorOverride(**factors)._asdict()},
+        )
+
+
+def test_model_override_wins_over_provider_override(resolver):
+    add_override(resolver, "org_1", "openai", "", pue=1.1)
+    add_override(resolver, "org_1", "openai", "gpt-4o", pue=1.2)
+
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.2
+    assert resolver.get("org_1", "openai", "gpt-4").pue == 1.1
+    assert resolver.get("org_1", "anthropic", "claude-3-opus") is None
+    assert resolver.get("org_2", "openai", "gpt-4o") is None
+
+
+def test_hits_are_served_from_cache_until_invalidated(resolver):
+    add_override(resolver, "org_1", "openai", pue=1.1)
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.1
+
+    # Changed in the DB, but the cached entry is still served
+    with resolver.engine.begin() as conn:
+        conn.execute(text("UPDATE factors_overrides SET pue = 1.3"))
+    for _ in range(100):
+        assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.1
+    assert resolver.stats()["misses"] == 1
+    assert resolver.stats()["hits"] == 100
+
+    resolver.invalidate("org_1")
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.3
+
+
+def test_invalidate_only_drops_that_org(resolver):
+    resolver.get("org_1", "openai", "gpt-4o")
+    resolver.get("org_2", "openai", "gpt-4o")
+
+    resolver.invalidate("org_1")
+
+    assert resolver.stats()["cached"] == 1
+    resolver.get("org_2", "openai", "gpt-4o")
+    assert resolver.stats()["misses"] == 2
+
+
+def test_load_racing_an_invalidation_is_not_cached(resolver):
+    add_override(resolver, "org_1", "openai", pue=1.1)
+    original_load = resolver._load
+
+    def stale_load(*args):
+        # The change commits and is notified after this read
+        override = original_load(*args)
+        with resolver.engine.begin() as conn:
+            conn.execute(text("UPDATE factors_overrides SET pue = 1.3"))
+        resolver.invalidate("org_1")
+        return override
+
+    resolver._load = stale_load
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.1
+    resolver._load = original_load
+
+    assert resolver.stats()["cached"] == 0
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.3
+
+
+def test_expired_entries_are_reloaded(resolver):
+    resolver.ttl_s = 0
+    resolver.get("org_1", "openai", "gpt-4o")
+    add_override(resolver, "org_1", "openai", pue=1.1)
+
+    assert resolver.get("org_1", "openai", "gpt-4o").pue == 1.1
+    assert resolver.stats()["misses"] == 2
+
+
+def test_cache_is_bounded(resolver):
+    resolver.max_entries = 3
+    for i in range(5):
+        resolver.get(f"org_{i}", "openai", "gpt-4o")
+
+    assert resolver.stats()["cached"] == 3
+
+
+def test_from_env_can_disable_overrides(monkeypatch):
+    monkeypatch.setenv("WORKER_FACTOR_OVERRIDES", "0")
+    assert OverrideResolver.from_env("sqlite://") is None
+
+
+def test_lookup_applies_override_fields(factors_service):
+    default = factors_service.lookup("openai", "gpt-4o", "US-CAISO")
+    entry = factors_service.lookup("openai", "gpt-4o", "US-CAISO", FactorOverride(pue=1.0))
+
+    assert entry.kwh == pytest.approx(0.0005)
+    assert entry.kwh == pytest.approx(default.kwh / 1.5)
+    # Unset fields keep the defaults, including grid intensity for CO2
+    assert entry.co2_kg == pytest.approx(0.0005 * 220 / 1000)
+
+    entry = factors_service.lookup("openai", "gpt-4o", "US-CAISO", FactorOverride(co2_kg_per_kwh=0.1))
+    assert entry.co2_kg == pytest.approx(default.kwh * 0.1)
+
+
+def test_enrich_uses_org_override(enrichment_service, resolver, make_event):
+    add_override(resolver, "org_1", "openai", kwh_per_call=0.001)
+    enrichment_service.overrides = resolver
+
+    overridden = enrichment_service.enrich(make_event(org_id="org_1"))
+    default = enrichment_service.enrich(make_event(org_id="org_2"))
+
+    assert overridden["kwh"] == pytest.approx(0.001 * 1.5)
+    assert default["kwh"] == pytest.approx(0.0005 * 1.5)
+
+
+def test_enrich_batch_matches_enrich_with_overrides(enrichment_service, resolver, make_event):
+    add_override(resolver, "org_1", "openai", "gpt-4o", water_l_per_kwh=0.5)
+    enrichment_service.overrides = resolver
+    events = [
+        make_event(org_id=org_id, model=model)
+        for org_id in ("org_1", "org_2")
+        for model in ("gpt-4o", "gpt-4")
+    ]
+
+    result = enrichment_service.enrich_batch(
+        [e["provider"] for e in events],
+        [e["model"] for e in events],
+        [e["region"] for e in events],
+        org_ids=[e["org_id"] for e in events],
+    )
+
+    expected = [enrichment_service.enrich(e)["water_l"] for e in events]
+    assert list(result["water_l"]) == expected
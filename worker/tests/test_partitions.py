@@ -0,0 +1,59 @@
+"""
+Tests for events_enriched partition management.
+"""
+
+from datetime import date, datetime
+
+from tests.conftest import FakeConnection, FakeResult
+from worker.services.partitions import Partition, create_day_partitions, list_partitions
+
+
+class PartitionConnection(FakeConnection):
+    """Answers the pg_inherits query with `bounds`."""
+
+    def __init__(self, bounds):
+        super().__init__()
+        self.bounds = bounds
+
+    def answer(self, sql, params):
+        return FakeResult(self.bounds if "pg_inherits" in sql else ())
+
+
+BOUNDS = [
+    ("events_enriched_default", "DEFAULT"),
+    ("events_enriched_p20251002", "FOR VALUES FROM ('2025-10-02 00:00:00') TO ('2025-10-03 00:00:00')"),
+    ("events_enriched_legacy", "FOR VALUES FROM (MINVALUE) TO ('2025-10-02 00:00:00')"),
+]
+
+
+def test_partitions_are_parsed_and_ordered():
+    partitions = list_partitions(PartitionConnection(BOUNDS))
+
+    assert partitions == [
+        Partition("events_enriched_legacy", None, datetime(2025, 10, 2)),
+        Partition("events_enriched_p20251002", datetime(2025, 10, 2), datetime(2025, 10, 3)),
+        Partition("events_enriched_default", None, None, default=True),
+    ]
+
+
+def test_only_uncovered_days_are_created():
+    conn = PartitionConnection(BOUNDS)
+
+    created = create_day_partitions(conn, days_ahead=3, today=date(2025, 10, 1))
+
+    assert created == ["events_enriched_p20251003", "events_enriched_p20251004"]
+    assert conn.commits == 2
+    attach = [sql for sql, _ in conn.statements if "ATTACH PARTITION" in sql]
+    assert "FROM ('2025-10-03T00:00:00') TO ('2025-10-04T00:00:00')" in attach[0]
+
+
+def test_rows_in_the_default_partition_move_before_attaching():
+    conn = PartitionConnection(BOUNDS)
+    create_day_partitions(conn, days_ahead=2, today=date(2025, 10, 1))
+
+    sqls = [sql for sql, _ in conn.statements]
+    move = next(i for i, sql in enumerate(sqls) if "DELETE FROM events_enriched_default" in sql)
+    attach = next(i for i, sql in enumerate(sqls) if "ATTACH PARTITION" in sql)
+    lock = next(i for i, sql in enumerate(sqls) if "LOCK TABLE ONLY events_enriched " in sql)
+    assert lock < move < attach
+    assert conn.statements[move][1] == {"start": datetime(2025, 10, 3), "end": datetime(2025, 10, 4)}
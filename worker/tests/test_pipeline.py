@@ -0,0 +1,203 @@
+"""
+Tests for the staged consume/enrich/write pipeline.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from kafka.structs import TopicPartition
+
+from worker.pipeline import _STOP, StagedPipeline
+from worker.services.aggregates import AggregateAccumulator
+
+Record = namedtuple("Record", "topic partition offset value")
+
+
+class FakeConsumer:
+    """Single-partition consumer stand-in that serves a fixed list of events."""
+
+    def __init__(self, events, per_poll=2):
+        self.tp = TopicPartition("events.raw", 0)
+        self.records = [Record("events.raw", 0, i, e) for i, e in enumerate(events)]
+        self.per_poll = per_poll
+        self.position = 0
+        self.assigned = {self.tp}
+        self.paused = set()
+        self.pause_calls = 0
+        self.commits = []
+
+    def subscribe(self, topics, listener=None):
+        self.listener = listener
+
+    def assignment(self):
+        return set(self.assigned)
+
+    def poll(self, timeout_ms=0, max_records=None):
+        if self.tp in self.paused or self.position >= len(self.records):
+            time.sleep(min(timeout_ms, 10) / 1000)
+            return {}
+        chunk = self.records[self.position:self.position + self.per_poll]
+        self.position += len(chunk)
+        return {self.tp: chunk}
+
+    def pause(self, *partitions):
+        self.pause_calls += 1
+        self.paused |= set(partitions)
+
+    def resume(self, *partitions):
+        self.paused -= set(partitions)
+
+    def commit(self, offsets):
+        self.commits.append({tp: meta.offset for tp, meta in offsets.items()})
+
+
+class SlowStore:
+    """Wraps the enrichment service's batch store with a delay."""
+
+    def __init__(self, service, delay):
+        self.service = service
+        self.delay = delay
+        self.original = service.store_enriched_batch
+        self.calls = []
+
+    def __call__(self, batch, accumulator=None, use_copy=False):
+        time.sleep(self.delay)
+        self.calls.append(len(batch))
+        return self.original(batch, accumulator, use_copy=use_copy)
+
+
+def _run_until_consumed(pipeline, consumer, timeout=5.0):
+    done = threading.Event()
+
+    def should_run():
+        return not done.is_set()
+
+    thread = threading.Thread(target=pipeline.run, args=(should_run,))
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while consumer.position < len(consumer.records) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    done.set()
+    thread.join(timeout)
+    assert not thread.is_alive()
+
+
+class TestStagedPipeline:
+    """Tests for StagedPipeline."""
+
+    def test_writes_all_events_and_commits_last_offset(self, enrichment_service, make_event):
+        """Every polled event is stored and the final offset committed."""
+        consumer = FakeConsumer([make_event() for _ in range(5)])
+        store = SlowStore(enrichment_service, 0)
+        enrichment_service.store_enriched_batch = store
+        pipeline = StagedPipeline(consumer, enrichment_service, AggregateAccumulator(), poll_timeout_ms=10)
+
+        _run_until_consumed(pipeline, consumer)
+
+        assert sum(store.calls) == 5
+        assert consumer.commits[-1] == {consumer.tp: 5}
+
+    def test_offsets_committed_only_after_flush(self, enrichment_service, make_event):
+        """Offsets wait until the aggregate deltas for their events are flushed."""
+        consumer = FakeConsumer([make_event() for _ in range(2)])
+        acc = AggregateAccumulator(flush_interval_ms=60_000, flush_max_events=10_000)
+        pipeline = StagedPipeline(consumer, enrichment_service, acc, poll_timeout_ms=10)
+        flushes = []
+        original_flush = enrichment_service.flush_aggregates
+        enrichment_service.flush_aggregates = lambda a: flushes.append(len(consumer.commits)) or original_flush(a)
+
+        _run_until_consumed(pipeline, consumer)
+
+        # The only flush happened at shutdown, before any commit
+        assert flushes == [0]
+        assert consumer.commits == [{consumer.tp: 2}]
+
+    def test_pauses_partitions_when_writer_falls_behind(self, enrichment_service, make_event):
+        """A slow writer fills the bounded queues and the poll stage pauses."""
+        consumer = FakeConsumer([make_event() for _ in range(20)], per_poll=1)
+        enrichment_service.store_enriched_batch = SlowStore(enrichment_service, 0.05)
+        pipeline = StagedPipeline(
+            consumer, enrichment_service, AggregateAccumulator(), queue_size=1, poll_timeout_ms=10,
+        )
+
+        _run_until_consumed(pipeline, consumer)
+
+        assert consumer.pause_calls > 0
+        assert consumer.paused == set()
+        assert consumer.commits[-1] == {consumer.tp: 20}
+
+    def test_drain_commits_everything_polled(self, enrichment_service, make_event):
+        """drain() (used on partition revocation) flushes and commits in-flight work."""
+        consumer = FakeConsumer([make_event() for _ in range(3)], per_poll=3)
+        acc = AggregateAccumulator(flush_interval_ms=60_000)
+        pipeline = StagedPipeline(consumer, enrichment_service, acc)
+        pipeline._enrich_thread.start()
+        pipeline._write_thread.start()
+
+        pipeline._enqueue(pipeline._poll(0, 10))
+        pipeline.drain()
+
+        assert consumer.commits == [{consumer.tp: 3}]
+        assert acc.pending_events == 0
+        pipeline.enrich_queue.put(_STOP)
+        pipeline._write_thread.join(5)
+
+    def test_failed_write_stops_without_committing_past_it(self, enrichment_service, make_event):
+        """A batch that cannot be stored stops the pipeline; its offset is never committed."""
+        consumer = FakeConsumer([make_event() for _ in range(5)], per_poll=1)
+        pipeline = StagedPipeline(consumer, enrichment_service, AggregateAccumulator(), poll_timeout_ms=10)
+        original_store = pipeline._store
+        calls = []
+
+        def failing_store(batch, use_copy):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            original_store(batch, use_copy)
+
+        pipeline._store = failing_store
+        thread = threading.Thread(target=pipeline.run)
+        thread.start()
+        thread.join(5)
+
+        assert not thread.is_alive()
+        assert not pipeline._write_thread.is_alive()
+        assert len(calls) == 2
+        assert all(commit[consumer.tp] <= 1 for commit in consumer.commits)
+
+    def test_drain_returns_when_writer_is_gone(self, enrichment_service, make_event):
+        """drain() gives up instead of hanging when the write stage has exited."""
+        consumer = FakeConsumer([make_event() for _ in range(3)], per_poll=3)
+        pipeline = StagedPipeline(consumer, enrichment_service, AggregateAccumulator(), drain_timeout_s=5)
+        pipeline._enrich_thread.start()
+
+        pipeline._enqueue(pipeline._poll(0, 10))
+        started = time.monotonic()
+        pipeline.drain()
+
+        assert time.monotonic() - started < 2
+        assert consumer.commits == []
+        pipeline.enrich_queue.put(_STOP)
+        pipeline._enrich_thread.join(5)
+
+    def test_records_of_revoked_partitions_are_not_enqueued(self, enrichment_service, make_event):
+        """A rebalance during a paused poll hands the partition, and its records, to another consumer."""
+        consumer = FakeConsumer([make_event() for _ in range(2)])
+        pipeline = StagedPipeline(consumer, enrichment_service, AggregateAccumulator(), queue_size=1)
+        pipeline._write_thread.start()
+        pipeline.enrich_queue.put([])  # No enrich thread, so the queue stays full
+
+        def revoking_poll(timeout_ms=0, max_records=None):
+            consumer.assigned = set()
+            return {}
+
+        records = pipeline._poll(0, 10)
+        consumer.poll = revoking_poll
+        pipeline._enqueue(records)
+
+        assert records == []
+        assert pipeline.enrich_queue.get_nowait() == []
+        assert pipeline.enrich_queue.empty()
+        pipeline.write_queue.put(_STOP)
+        pipeline._write_thread.join(5)
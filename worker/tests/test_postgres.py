@@ -0,0 +1,171 @@
+"""
+Integration tests of the maintenance commands against a real Postgres,
+migrated to the API's alembic head (see the pg_engine fixture).
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from worker.reconcile import reconcile_date
+from worker.reenrich import ReenrichJob
+from worker.retention import apply_retention
+from worker.services.partitions import PARTITION_PREFIX, create_day_partitions
+
+DAY = date(2025, 10, 1)
+DAYS = {"free": 30, "pro": 365, "enterprise": 0}
+
+
+def _add_org(conn, org_id, plan="free", ingest_mode_since=None):
+    conn.execute(
+        text("""
+            INSERT INTO orgs (id, name, plan, created_at, ingest_mode_since)
+            VALUES (:id, :id, :plan, now(), :since)
+        """),
+        {"id": org_id, "plan": plan, "since": ingest_mode_since},
+    )
+    conn.commit()
+
+
+def _store(service, make_event, day, users, org_id="org_1"):
+    events = [make_event(org_id=org_id, user_id=user, ts=f"{day}T12:00:00Z") for user in users]
+    service.store_enriched_batch([service.enrich(event) for event in events])
+
+
+def _calls(conn, table, day=DAY, org_id="org_1"):
+    return conn.execute(
+        text(f"SELECT sum(call_count) FROM {table} WHERE date = :day AND org_id = :org_id"),
+        {"day": day, "org_id": org_id},
+    ).scalar()
+
+
+def test_reconcile_sums_shards_and_swaps_only_drifted_tables(pg_engine, pg_enrichment, make_event):
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_1")
+        _store(pg_enrichment, make_event, DAY, ["user_1", "user_1", "user_2"])
+        # Split the org counter over two shards without changing its sums
+        conn.execute(text("""
+            INSERT INTO daily_org_agg (date, org_id, shard, call_count, kwh, water_l, co2_kg)
+            SELECT date, org_id, 1, 2, kwh * 2 / 3, water_l * 2 / 3, co2_kg * 2 / 3 FROM daily_org_agg
+        """))
+        conn.execute(text("""
+            UPDATE daily_org_agg SET call_count = 1, kwh = kwh / 3, water_l = water_l / 3, co2_kg = co2_kg / 3
+            WHERE shard = 0
+        """))
+        conn.execute(text("DELETE FROM daily_user_agg WHERE call_count = 1"))
+        conn.execute(text("UPDATE daily_model_agg SET call_count = call_count + 5"))
+        conn.commit()
+
+        result = reconcile_date(conn, DAY)
+
+        assert not result.drift["daily_org_agg"]
+        assert result.drift["daily_user_agg"].missing == 1
+        assert result.drift["daily_model_agg"].changed == 1
+        assert result.swapped
+        assert _calls(conn, "daily_model_agg") == 3
+        assert conn.execute(text("SELECT count(*) FROM daily_org_agg")).scalar() == 2
+        assert not any(reconcile_date(conn, DAY).drift.values())
+
+
+def test_reconcile_leaves_orgs_inside_the_mode_switch_grace_alone(pg_engine, pg_enrichment, make_event):
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_1", ingest_mode_since=datetime(2025, 10, 1, 0, 30))
+        _store(pg_enrichment, make_event, DAY, ["user_1", "user_2"])
+        conn.execute(text("UPDATE daily_user_agg SET call_count = 7"))
+        conn.commit()
+
+        result = reconcile_date(conn, DAY)
+
+        assert not any(result.drift.values())
+        assert _calls(conn, "daily_user_agg") == 14
+
+        conn.execute(text("UPDATE orgs SET ingest_mode_since = '2025-09-30 22:00'"))
+        conn.commit()
+        assert reconcile_date(conn, DAY).drift["daily_user_agg"].changed == 2
+        assert _calls(conn, "daily_user_agg") == 2
+
+
+def test_reconcile_skips_dates_past_the_org_retention(pg_engine, pg_enrichment, make_event):
+    expired = datetime.utcnow().date() - timedelta(days=40)
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_free", plan="free")
+        _add_org(conn, "org_ent", plan="enterprise")
+        _store(pg_enrichment, make_event, expired, ["user_1", "user_2"], org_id="org_free")
+        _store(pg_enrichment, make_event, expired, ["user_1", "user_2"], org_id="org_ent")
+        # Part of the free org's date is gone, as after an interrupted retention run
+        conn.execute(text("""
+            DELETE FROM events_enriched
+            WHERE id = (SELECT id FROM events_enriched WHERE org_id = 'org_free' LIMIT 1)
+        """))
+        conn.execute(text("UPDATE daily_user_agg SET call_count = 5 WHERE org_id = 'org_ent'"))
+        conn.commit()
+
+        result = reconcile_date(conn, expired, retention_days=DAYS)
+
+        assert result.drift["daily_user_agg"].changed == 2
+        assert _calls(conn, "daily_org_agg", expired, "org_free") == 2
+        assert _calls(conn, "daily_user_agg", expired, "org_ent") == 2
+
+
+def test_reenrich_updates_changed_events_and_rebuilds_their_aggregates(pg_engine, pg_enrichment,
+                                                                       factors_service, make_event):
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_1")
+        _store(pg_enrichment, make_event, DAY, ["user_1", "user_1", "user_2"])
+        expected = pg_enrichment.enrich(make_event(ts=f"{DAY}T12:00:00Z"))["kwh"]
+        # user_1's events and aggregates were written with old factors
+        conn.execute(text("""
+            UPDATE events_enriched SET kwh = kwh * 2
+            WHERE user_key = (SELECT id FROM dimensions WHERE value = 'user_1')
+        """))
+        conn.execute(text("""
+            UPDATE daily_user_agg SET kwh = kwh * 2
+            WHERE user_key = (SELECT id FROM dimensions WHERE value = 'user_1')
+        """))
+        conn.commit()
+
+        job = ReenrichJob(factors_service, pause_s=0)
+        job.run(conn, DAY, DAY)
+
+        assert job.updated == 2
+        kwh = conn.execute(text("SELECT DISTINCT kwh FROM events_enriched")).scalars().all()
+        assert kwh == [expected]
+        assert not any(reconcile_date(conn, DAY, dry_run=True).drift.values())
+
+
+def test_new_partitions_take_over_rows_from_the_default_partition(pg_engine, pg_enrichment, make_event):
+    today = datetime.utcnow().date()
+    day = today + timedelta(days=20)
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_1")
+        _store(pg_enrichment, make_event, day, ["user_1", "user_2"])
+
+        created = create_day_partitions(conn, days_ahead=20, today=today)
+
+        name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+        assert name in created
+        tables = conn.execute(text("SELECT tableoid::regclass::text FROM events_enriched")).scalars().all()
+        assert tables == [name, name]
+
+
+def test_retention_drops_covered_partitions_and_keeps_uncovered_dates(pg_engine, pg_enrichment, make_event):
+    today = datetime.utcnow().date()
+    in_partition = today + timedelta(days=1)
+    covered, uncovered = date(2025, 10, 1), date(2025, 10, 2)
+    with pg_engine.connect() as conn:
+        _add_org(conn, "org_1", plan="free")
+        for day in (in_partition, covered, uncovered):
+            _store(pg_enrichment, make_event, day, ["user_1", "user_2"])
+        conn.execute(text("UPDATE daily_org_agg SET call_count = 3 WHERE date = :day"), {"day": uncovered})
+        conn.commit()
+
+        # Everything up to today + 30 has expired by then
+        runs, dropped = apply_retention(conn, DAYS, today=today + timedelta(days=60), batch_size=1)
+
+        assert f"{PARTITION_PREFIX}{in_partition:%Y%m%d}" in dropped
+        assert runs["org_1"].deleted == 4
+        assert runs["org_1"].uncovered == (uncovered,)
+        days = conn.execute(text("SELECT DISTINCT CAST(ts AS date) FROM events_enriched")).scalars().all()
+        assert days == [uncovered]
+        details = conn.execute(text("SELECT details FROM audit_logs WHERE action = 'retention'")).scalar()
+        assert details["uncovered_dates"] == [uncovered.isoformat()]
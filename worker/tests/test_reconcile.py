@@ -0,0 +1,119 @@
+"""
+Tests for the aggregate reconciliation command.
+"""
+
+from datetime import date, datetime
+
+from tests.conftest import FakeConnection, FakeResult
+from worker.reconcile import TableDrift, reconcile, reconcile_date
+from worker.services.aggregates import AGGREGATE_KEYS
+
+
+class DriftConnection(FakeConnection):
+    """Answers each table's diff from `drift`."""
+
+    def __init__(self, drift=None):
+        super().__init__()
+        self.drift = drift or {}
+
+    def answer(self, sql, params):
+        for table in AGGREGATE_KEYS:
+            if f"FULL JOIN reconcile_{table} " in sql:
+                return FakeResult([self.drift.get(table, (0, 0, 0))])
+        return FakeResult([(0, 0, 0)])
+
+
+class FakeEngine:
+    def __init__(self, drift=None):
+        self.drift = drift
+        self.connections = []
+
+    def connect(self):
+        conn = DriftConnection(self.drift)
+        self.connections.append(conn)
+        return conn
+
+
+def test_in_sync_date_changes_nothing():
+    conn = DriftConnection()
+    result = reconcile_date(conn, date(2025, 10, 1))
+
+    assert not result.swapped
+    assert len(conn.matching("CREATE TEMP TABLE")) == len(AGGREGATE_KEYS)
+    assert conn.matching("DELETE FROM") == []
+    assert (conn.commits, conn.rollbacks) == (0, 1)
+
+
+def test_only_drifted_tables_are_swapped_in_one_transaction():
+    conn = DriftConnection(drift={"daily_org_agg": (1, 0, 2)})
+    result = reconcile_date(conn, date(2025, 10, 1))
+
+    assert result.swapped
+    assert result.drift["daily_org_agg"] == TableDrift(1, 0, 2)
+    (sql, params), = conn.matching("DELETE FROM")
+    assert "daily_org_agg" in sql
+    assert params == {"start": datetime(2025, 10, 1), "end": datetime(2025, 10, 2)}
+    (sql, _), = conn.matching("INSERT INTO")
+    assert "SELECT * FROM reconcile_daily_org_agg" in sql
+    assert conn.commits == 1
+
+
+def test_recomputed_columns_line_up_with_the_insert():
+    conn = DriftConnection(drift={"hourly_provider_agg": (0, 1, 0)})
+    reconcile_date(conn, date(2025, 10, 1))
+
+    (create, _), = conn.matching("CREATE TEMP TABLE reconcile_hourly_provider_agg")
+    assert "date_trunc('hour', e.ts) AS hour, e.org_id, e.provider_key" in create
+    (insert, _), = conn.matching("INSERT INTO")
+    assert "hourly_provider_agg (hour, org_id, provider_key, call_count, kwh, water_l, co2_kg)" in insert
+
+
+def test_dry_run_reports_without_swapping():
+    conn = DriftConnection(drift={"daily_user_agg": (0, 3, 0)})
+    result = reconcile_date(conn, date(2025, 10, 1), ["daily_user_agg"], dry_run=True)
+
+    assert not result.swapped
+    assert result.drift["daily_user_agg"].extra == 3
+    assert conn.matching("DELETE FROM") == []
+    assert conn.commits == 0
+
+
+def test_every_date_gets_its_own_connection():
+    engine = FakeEngine(drift={"daily_model_agg": (0, 0, 1)})
+    results = reconcile(engine, date(2025, 10, 1), date(2025, 10, 3), workers=2)
+
+    assert [r.day for r in results] == [date(2025, 10, 1), date(2025, 10, 2), date(2025, 10, 3)]
+    assert all(r.swapped for r in results)
+    assert len(engine.connections) == 3
+    assert all(conn.commits == 1 for conn in engine.connections)
+
+
+def test_hourly_tables_are_skipped_past_retention():
+    engine = FakeEngine()
+    reconcile(engine, date(2025, 10, 1), date(2025, 10, 2), hourly_since=date(2025, 10, 2))
+
+    old, recent = sorted(engine.connections, key=lambda c: c.statements[0][1]["start"])
+    assert old.matching("reconcile_hourly_") == []
+    assert len(recent.matching("CREATE TEMP TABLE reconcile_hourly_")) == 2
+
+
+def test_sharded_rows_are_summed_before_the_diff():
+    conn = DriftConnection()
+    reconcile_date(conn, date(2025, 10, 1), ["daily_org_agg"])
+
+    (create, _), = conn.matching("CREATE TEMP TABLE")
+    assert "e.org_id, 0 AS shard" in create
+    (diff, _), = conn.matching("FULL JOIN")
+    assert "GROUP BY date, org_id\n" in diff
+    assert "a.date = r.date AND a.org_id = r.org_id\n" in diff
+
+
+def test_orgs_past_their_raw_retention_are_left_alone():
+    conn = DriftConnection(drift={"daily_user_agg": (0, 3, 0)})
+    days = {"free": 30, "enterprise": 0}
+    reconcile_date(conn, date(2025, 10, 1), ["daily_user_agg"], retention_days=days)
+
+    # The recompute, the diff and the delete all leave those orgs out
+    for fragment in ("CREATE TEMP TABLE", "FULL JOIN", "DELETE FROM"):
+        (sql, _), = conn.matching(fragment)
+        assert "CASE lower(COALESCE(plan::text, 'free')) WHEN 'free' THEN 30 END" in sql
@@ -0,0 +1,88 @@
+"""
+Tests for the set-based re-enrichment job.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from tests.conftest import FakeConnection, FakeResult
+from worker.reenrich import ReenrichJob
+from worker.services.grid_series import GridIntensitySeries, IntensitySeries, parse_timestamp
+from worker.services.overrides import FactorOverride
+
+
+class ReenrichConnection(FakeConnection):
+    """Answers the DISTINCT scan and the per-slice UPDATE."""
+
+    def __init__(self, triples=(), updated_per_slice=0):
+        super().__init__()
+        self.triples = triples
+        self.updated_per_slice = updated_per_slice
+
+    def answer(self, sql, params):
+        if "SELECT DISTINCT org_id, provider_key, model_key, region_key" in sql:
+            return FakeResult(self.triples)
+        if "UPDATE events_enriched" in sql:
+            return FakeResult([(self.updated_per_slice,)])
+        return FakeResult()
+
+
+class StaticOverrides:
+    def __init__(self, overrides):
+        self.overrides = overrides
+
+    def get(self, org_id, provider, model):
+        return self.overrides.get(org_id)
+
+
+def test_factor_table_matches_enrich(factors_service, enrichment_service, make_event):
+    conn = ReenrichConnection(triples=[
+        ("org_1", 1, 2, 3, "openai", "gpt-4o", "US-CAISO"), ("org_1", 1, None, None, "openai", None, None),
+    ])
+    ReenrichJob(factors_service, pause_s=0).run(conn, date(2025, 10, 1), date(2025, 10, 1))
+
+    (_, rows), = conn.matching("INSERT INTO reenrich_factors")
+    enriched = enrichment_service.enrich(make_event())
+    assert (rows[0]["kwh"], rows[0]["water_l"], rows[0]["co2_kg"]) == (
+        enriched["kwh"], enriched["water_l"], enriched["co2_kg"]
+    )
+    # NULL model/region resolve like a missing model/region
+    assert rows[1]["kwh"] == factors_service.lookup("openai", "", "UNKNOWN").kwh
+
+
+def test_one_update_per_slice_and_one_rebuild_per_date(factors_service):
+    conn = ReenrichConnection(triples=[("org_1", 1, 2, 3, "openai", "gpt-4o", "US-CAISO")], updated_per_slice=5)
+    job = ReenrichJob(factors_service, slice_minutes=360, pause_s=0)
+
+    job.run(conn, date(2025, 10, 1), date(2025, 10, 2))
+
+    updates = conn.matching("UPDATE events_enriched")
+    assert len(updates) == 8  # 2 dates × 4 six-hour slices
+    assert updates[0][1]["version"] == factors_service.version
+    assert job.updated == 40
+    # Every aggregate table is rebuilt from GROUP BY for each date
+    assert len(conn.matching("DELETE FROM daily_model_agg")) == 2
+    assert len(conn.matching("INSERT INTO daily_org_agg")) == 2
+
+
+def test_overrides_and_series(factors_service):
+    factors_service.grid_series = GridIntensitySeries({
+        "US-CAISO": IntensitySeries(
+            np.array([parse_timestamp("2025-10-01T00:00:00Z"), parse_timestamp("2025-10-01T12:00:00Z")]),
+            np.array([100.0, 300.0]),
+        ),
+    })
+    conn = ReenrichConnection(triples=[
+        ("org_1", 1, 2, 3, "openai", "gpt-4o", "US-CAISO"), ("org_2", 1, 2, 3, "openai", "gpt-4o", "US-CAISO"),
+    ])
+    overrides = StaticOverrides({"org_2": FactorOverride(co2_kg_per_kwh=0.1, pue=1.0)})
+
+    ReenrichJob(factors_service, overrides, pause_s=0).run(conn, date(2025, 10, 1), date(2025, 10, 1))
+
+    (_, rows), = conn.matching("INSERT INTO reenrich_factors")
+    assert rows[0]["grid_dependent"] is True
+    assert rows[1]["grid_dependent"] is False
+    assert rows[1]["kwh"] == 0.0005
+    (_, series), = conn.matching("INSERT INTO reenrich_series")
+    assert [row["intensity"] for row in series] == [100.0, 300.0]
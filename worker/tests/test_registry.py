@@ -0,0 +1,115 @@
+"""
+Tests for the hot-reloadable factor registry.
+"""
+
+import os
+import threading
+
+import pytest
+
+from worker.services.enrichment import EnrichmentService
+from worker.services.registry import FactorRegistry
+
+FACTORS = """
+defaults:
+  pue: 1.5
+  water_l_per_kwh: 1.8
+  co2_kg_per_kwh: 0.4
+providers:
+  openai:
+    kwh_per_call: {kwh}
+"""
+
+GRID = """
+regions:
+  US-CAISO:
+    gco2_per_kwh: 220
+  UNKNOWN:
+    gco2_per_kwh: 500
+"""
+
+
+@pytest.fixture
+def factor_files(tmp_path):
+    factors = tmp_path / "factors_defaults.yaml"
+    grid = tmp_path / "grid_intensity.yaml"
+    factors.write_text(FACTORS.format(kwh=0.0003))
+    grid.write_text(GRID)
+    return factors, grid
+
+
+def _rewrite(path, content):
+    path.write_text(content)
+    # Make sure the change is visible even on coarse mtime filesystems
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class TestFactorRegistry:
+    """Tests for FactorRegistry."""
+
+    def test_version_is_content_hash(self, factor_files):
+        """Identical files give identical versions."""
+        a = FactorRegistry(*factor_files, reload_interval_s=0)
+        b = FactorRegistry(*factor_files, reload_interval_s=0)
+        a.start()
+        b.start()
+        assert a.version == b.version
+        assert len(a.version) == 12
+
+    def test_reload_swaps_snapshot(self, factor_files):
+        """A changed file produces a new snapshot and version."""
+        registry = FactorRegistry(*factor_files, reload_interval_s=0)
+        registry.start()
+        old = registry.snapshot()
+
+        assert not registry.check_for_changes()
+        _rewrite(factor_files[0], FACTORS.format(kwh=0.0006))
+        assert registry.check_for_changes()
+
+        new = registry.snapshot()
+        assert new is not old
+        assert new.version != old.version
+        assert new.lookup("openai", "", "UNKNOWN").kwh == 2 * old.lookup("openai", "", "UNKNOWN").kwh
+
+    def test_broken_file_keeps_current_snapshot(self, factor_files):
+        """A file that fails to parse leaves the old snapshot serving."""
+        registry = FactorRegistry(*factor_files, reload_interval_s=0)
+        registry.start()
+        version = registry.version
+
+        _rewrite(factor_files[0], "providers: [unclosed")
+        assert not registry.check_for_changes()
+        assert registry.version == version
+
+    def test_enriched_events_carry_version(self, factor_files, make_event):
+        """Enrichment tags each event with the factor version it used."""
+        registry = FactorRegistry(*factor_files, reload_interval_s=0)
+        registry.start()
+        service = EnrichmentService(registry, "sqlite://")
+
+        before = service.enrich(make_event())
+        _rewrite(factor_files[0], FACTORS.format(kwh=0.0006))
+        registry.check_for_changes()
+        after = service.enrich(make_event())
+
+        assert before["factor_version"] != after["factor_version"]
+        assert after["factor_version"] == registry.version
+        assert service._to_row(after)["factor_version"] == registry.version
+
+    def test_background_watcher_reloads(self, factor_files):
+        """The watcher thread picks up changes without a restart."""
+        registry = FactorRegistry(*factor_files, reload_interval_s=0.01)
+        registry.start()
+        version = registry.version
+        try:
+            _rewrite(factor_files[0], FACTORS.format(kwh=0.0009))
+            reloaded = threading.Event()
+            for _ in range(200):
+                if registry.version != version:
+                    reloaded.set()
+                    break
+                reloaded.wait(0.01)
+            assert reloaded.is_set()
+        finally:
+            registry.stop()
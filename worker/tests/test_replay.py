@@ -0,0 +1,109 @@
+"""
+Tests for the offline replay/backfill CLI.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from worker import replay as replay_module
+from worker.replay import Checkpoint, Progress, chunked, read_events, replay
+
+
+@pytest.fixture
+def replay_service(monkeypatch, enrichment_service):
+    """Run replay chunks in-process against the recording enrichment service."""
+    monkeypatch.setattr(replay_module, "_service", enrichment_service)
+    monkeypatch.setattr(replay_module, "_dead_letters", None)
+    return enrichment_service
+
+
+def _write_jsonl(path, events):
+    path.write_text("".join(json.dumps(e) + "\n" for e in events))
+    return path
+
+
+def _run(inputs, checkpoint):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return replay(inputs, executor, checkpoint, max_in_flight=2, progress=Progress(interval_s=60))
+
+
+def _copied_rows(sessions):
+    return sum(data.count("\n") for session in sessions if session.committed for _, data in session.copies)
+
+
+class TestReadEvents:
+    """Tests for input parsing."""
+
+    def test_jsonl(self, tmp_path, make_event):
+        path = _write_jsonl(tmp_path / "events.jsonl", [make_event(), make_event(user_id="user_2")])
+        assert [e["user_id"] for e in read_events(path)] == ["user_1", "user_2"]
+
+    def test_csv_types(self, tmp_path):
+        path = tmp_path / "events.csv"
+        path.write_text(
+            "org_id,user_id,provider,model,region,tokens_in,tokens_out,ts,metadata\n"
+            'org_1,user_1,openai,gpt-4o,,10,20,2025-10-01T12:00:00Z,"{""k"": 1}"\n'
+        )
+        (event,) = read_events(path)
+        assert event["tokens_in"] == 10
+        assert event["metadata"] == {"k": 1}
+        assert "region" not in event
+
+    def test_chunked(self):
+        assert [(i, len(c)) for i, c in chunked(iter(range(7)), 3)] == [(0, 3), (1, 3), (2, 1)]
+
+
+class TestReplay:
+    """Tests for replay()."""
+
+    def test_loads_every_chunk_with_copy(self, tmp_path, replay_service, sessions, make_event):
+        path = _write_jsonl(tmp_path / "events.jsonl", [make_event(user_id=f"u{i}") for i in range(10)])
+        checkpoint = Checkpoint(tmp_path / "cp.json", chunk_size=4)
+
+        progress = _run([path], checkpoint)
+
+        assert progress.written == 10
+        assert progress.chunks == 3
+        assert _copied_rows(sessions) == 10
+        # Aggregates are upserted in each chunk's transaction
+        assert all(any("daily_org_agg" in sql for sql, _ in s.statements) for s in sessions)
+
+    def test_resume_skips_checkpointed_chunks(self, tmp_path, replay_service, sessions, make_event):
+        path = _write_jsonl(tmp_path / "events.jsonl", [make_event(user_id=f"u{i}") for i in range(10)])
+        _run([path], Checkpoint(tmp_path / "cp.json", chunk_size=4))
+        sessions.clear()
+
+        progress = _run([path], Checkpoint(tmp_path / "cp.json", chunk_size=4))
+
+        assert progress.written == 0
+        assert progress.skipped == 10
+        assert sessions == []
+
+    def test_failed_chunk_is_not_checkpointed(self, tmp_path, replay_service, make_event):
+        path = _write_jsonl(tmp_path / "events.jsonl", [make_event(user_id=f"u{i}") for i in range(8)])
+        calls = []
+
+        def store(batch, accumulator=None, use_copy=False):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise OperationalError("COPY", {}, Exception("server closed the connection"))
+            return len(batch)
+
+        replay_service.store_enriched_batch = store
+        checkpoint = Checkpoint(tmp_path / "cp.json", chunk_size=4)
+
+        with pytest.raises(OperationalError):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                replay([path], executor, checkpoint, max_in_flight=1, progress=Progress(interval_s=60))
+
+        reloaded = Checkpoint(tmp_path / "cp.json", chunk_size=4)
+        assert reloaded.is_done(str(path.resolve()), 0)
+        assert not reloaded.is_done(str(path.resolve()), 1)
+
+    def test_checkpoint_rejects_other_chunk_size(self, tmp_path):
+        Checkpoint(tmp_path / "cp.json", chunk_size=4).mark_done("f", 0)
+        with pytest.raises(ValueError):
+            Checkpoint(tmp_path / "cp.json", chunk_size=8)
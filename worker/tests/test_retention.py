@@ -0,0 +1,211 @@
+"""
+Tests for plan-driven raw event retention.
+"""
+
+import json
+from datetime import date, timedelta
+
+from tests.conftest import FakeConnection, FakeResult
+from worker.retention import (
+    apply_retention,
+    coverage,
+    delete_expired_rows,
+    org_cutoffs,
+    retention_days_from_env,
+)
+
+DAYS = {"free": 30, "pro": 365, "enterprise": 0}
+TODAY = date(2025, 10, 1)
+
+
+class RetentionConnection(FakeConnection):
+    """
+    Answers the retention queries from canned data: `orgs` rows, partition
+    `bounds`, whether a partition has `retained` rows, `raw` coverage rows
+    per source and each org's (date, rows) left to delete.
+    """
+
+    def __init__(self, orgs, bounds=(), retained=(), raw=None, pending=None):
+        super().__init__()
+        self.orgs = orgs
+        self.bounds = list(bounds)
+        self.retained = set(retained)
+        self.raw = raw or {}
+        self.pending = dict(pending or {})
+
+    def answer(self, sql, params):
+        if "pg_inherits" in sql:
+            return FakeResult(self.bounds)
+        if "SELECT EXISTS" in sql:
+            return FakeResult([(any(f"FROM {name} " in sql for name in self.retained),)])
+        if "WITH raw AS" in sql:
+            source = sql.split("FROM ", 1)[1].split()[0]
+            org_id = (params or {}).get("org_id")
+            return FakeResult([r for r in self.raw.get(source, []) if org_id in (None, r[0])])
+        if "FROM orgs" in sql:
+            return FakeResult(self.orgs)
+        if sql.lstrip().startswith("SELECT CAST(ts AS date)"):
+            return FakeResult([(d, n) for d, n in self.pending.get(params["org_id"], []) if d < params["end"]])
+        if sql.lstrip().startswith("DELETE FROM events_enriched"):
+            days = self.pending.get(params["org_id"], [])
+            deleted = [(d, n) for d, n in days if params["start"] <= d < params["end"]]
+            self.pending[params["org_id"]] = [day for day in days if day not in deleted]
+            return FakeResult(rowcount=sum(n for _, n in deleted))
+        return FakeResult()
+
+
+BOUNDS = [
+    ("events_enriched_legacy", "FOR VALUES FROM (MINVALUE) TO ('2025-08-01 00:00:00')"),
+    ("events_enriched_p20250801", "FOR VALUES FROM ('2025-08-01 00:00:00') TO ('2025-08-02 00:00:00')"),
+    ("events_enriched_p20250802", "FOR VALUES FROM ('2025-08-02 00:00:00') TO ('2025-08-03 00:00:00')"),
+    ("events_enriched_default", "DEFAULT"),
+]
+
+
+def test_retention_days_come_from_env(monkeypatch):
+    monkeypatch.setenv("WORKER_RETENTION_DAYS_PRO", "90")
+
+    assert retention_days_from_env() == {"free": 30, "pro": 90, "enterprise": 0}
+
+
+def test_orgs_without_finite_retention_have_no_cutoff():
+    conn = RetentionConnection([("org_free", "free"), ("org_pro", "pro"), ("org_ent", "enterprise")])
+
+    assert org_cutoffs(conn, DAYS, TODAY) == {
+        "org_free": ("free", date(2025, 9, 1)),
+        "org_pro": ("pro", date(2024, 10, 1)),
+    }
+
+
+def test_dates_whose_aggregates_differ_are_uncovered():
+    conn = RetentionConnection([], raw={"events_enriched": [
+        ("org_a", date(2025, 8, 1), 10, 10, True),
+        ("org_a", date(2025, 8, 2), 10, 9, True),
+        ("org_b", date(2025, 8, 1), 5, None, True),
+    ]})
+
+    counts, uncovered = coverage(conn, "events_enriched", "true")
+
+    assert counts == {"org_a": 20, "org_b": 5}
+    assert uncovered == {"org_a": [date(2025, 8, 2)], "org_b": [date(2025, 8, 1)]}
+
+
+def test_incomplete_raw_events_only_need_enough_aggregated_calls():
+    conn = RetentionConnection([], raw={"events_enriched": [
+        ("org_sampled", date(2025, 8, 1), 10, 100, False),
+        ("org_sampled", date(2025, 8, 2), 10, 9, False),
+    ]})
+
+    _, uncovered = coverage(conn, "events_enriched", "true")
+
+    assert uncovered == {"org_sampled": [date(2025, 8, 2)]}
+
+
+def test_expired_partitions_are_dropped_and_the_rest_batch_deleted():
+    conn = RetentionConnection(
+        [("org_free", "free"), ("org_ent", "enterprise")],
+        bounds=BOUNDS,
+        retained={"events_enriched_p20250802"},
+        raw={"events_enriched_p20250801": [("org_free", date(2025, 8, 1), 7, 7, True)]},
+        pending={"org_free": [(date(2025, 7, 1), 4), (date(2025, 7, 2), 4), (date(2025, 7, 3), 4)]},
+    )
+
+    runs, dropped = apply_retention(conn, DAYS, today=TODAY, batch_size=5)
+
+    assert dropped == ["events_enriched_p20250801"]
+    # The default partition rules out DETACH ... CONCURRENTLY
+    (detach, _), = conn.matching("DETACH PARTITION")
+    assert detach == "ALTER TABLE events_enriched DETACH PARTITION events_enriched_p20250801"
+    assert conn.matching("SET LOCAL lock_timeout")
+    assert conn.matching("DROP TABLE events_enriched_p20250801")
+    assert not conn.matching("DROP TABLE events_enriched_p20250802")
+    # 7 rows went with the partition, 12 in one transaction per date
+    assert runs["org_free"].deleted == 19
+    assert len(conn.matching("DELETE FROM events_enriched WHERE")) == 3
+    assert "org_ent" not in runs
+
+    (_, params), = conn.matching("INSERT INTO audit_logs")
+    details = json.loads(params["details"])
+    assert params["org_id"] == "org_free"
+    assert details == {"plan": "free", "retention_days": 30, "cutoff": "2025-09-01",
+                       "deleted": 19, "uncovered_dates": []}
+
+
+def test_partitions_are_detached_concurrently_without_a_default_partition():
+    conn = RetentionConnection(
+        [("org_free", "free")],
+        bounds=BOUNDS[:-1],
+        retained={"events_enriched_p20250802"},
+        raw={"events_enriched_p20250801": [("org_free", date(2025, 8, 1), 7, 7, True)]},
+    )
+
+    _, dropped = apply_retention(conn, DAYS, today=TODAY)
+
+    assert dropped == ["events_enriched_p20250801"]
+    statements = [sql for sql, _ in conn.statements]
+    detach = statements.index("ALTER TABLE events_enriched DETACH PARTITION events_enriched_p20250801 CONCURRENTLY")
+    assert statements.index("DROP TABLE events_enriched_p20250801") > detach
+    # Outside a transaction block, and back to the default level afterwards
+    assert conn.isolation_levels == ["AUTOCOMMIT", "READ COMMITTED"]
+
+
+def test_uncovered_dates_are_kept():
+    conn = RetentionConnection(
+        [("org_free", "free")],
+        bounds=BOUNDS,
+        raw={
+            "events_enriched_p20250801": [("org_free", date(2025, 8, 1), 7, 6, True)],
+            "events_enriched_p20250802": [("org_free", date(2025, 8, 2), 3, 3, True)],
+            "events_enriched": [("org_free", date(2025, 8, 1), 7, 6, True), ("org_free", date(2025, 7, 1), 4, 4, True)],
+        },
+        pending={"org_free": [(date(2025, 7, 1), 4), (date(2025, 8, 1), 7)]},
+    )
+
+    runs, dropped = apply_retention(conn, DAYS, today=TODAY)
+
+    assert dropped == ["events_enriched_p20250802"]
+    (_, params), = conn.matching("DELETE FROM events_enriched WHERE")
+    assert params["end"] == date(2025, 7, 2)
+    assert conn.pending["org_free"] == [(date(2025, 8, 1), 7)]
+    assert runs["org_free"].uncovered == (date(2025, 8, 1),)
+    details = json.loads(conn.matching("INSERT INTO audit_logs")[0][1]["details"])
+    assert details["uncovered_dates"] == ["2025-08-01"]
+
+
+def test_dry_run_changes_nothing():
+    conn = RetentionConnection(
+        [("org_free", "free")],
+        bounds=BOUNDS,
+        raw={
+            "events_enriched_p20250801": [("org_free", date(2025, 8, 1), 7, 7, True)],
+            "events_enriched_p20250802": [("org_free", date(2025, 8, 2), 3, 3, True)],
+            "events_enriched": [("org_free", date(2025, 8, 1), 7, 7, True), ("org_free", date(2025, 8, 2), 3, 3, True)],
+        },
+    )
+
+    runs, dropped = apply_retention(conn, DAYS, today=TODAY, dry_run=True)
+
+    assert dropped == ["events_enriched_p20250801", "events_enriched_p20250802"]
+    assert runs["org_free"].deleted == 10
+    assert not conn.matching("DROP TABLE events_enriched_p")
+    assert not conn.matching("DELETE FROM")
+    assert not conn.matching("INSERT INTO audit_logs")
+
+
+def test_whole_dates_are_deleted_oldest_first_in_batches():
+    conn = RetentionConnection([("org_free", "free")], pending={"org_free": [
+        (date(2025, 7, 1), 2), (date(2025, 7, 2), 2), (date(2025, 7, 3), 9), (date(2025, 7, 4), 1),
+    ]})
+
+    deleted = delete_expired_rows(conn, "org_free", date(2025, 9, 1), batch_size=5)
+
+    assert deleted == 14
+    # A date larger than the batch goes alone; none is ever split
+    deletes = conn.matching("DELETE FROM events_enriched")
+    ranges = [(p["start"], p["end"] - timedelta(days=1)) for _, p in deletes]
+    assert ranges == [
+        (date(2025, 7, 1), date(2025, 7, 2)),
+        (date(2025, 7, 3), date(2025, 7, 3)),
+        (date(2025, 7, 4), date(2025, 7, 4)),
+    ]
+    assert conn.commits == 3
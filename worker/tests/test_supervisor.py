@@ -0,0 +1,80 @@
+"""
+Tests for the multi-process worker supervisor.
+"""
+
+import os
+import signal
+import sys
+import time
+
+from worker.supervisor import Supervisor
+
+
+def _crash():
+    sys.exit(3)
+
+
+def _serve_until_sigterm():
+    stopped = []
+    signal.signal(signal.SIGTERM, lambda sig, frame: stopped.append(sig))
+    while not stopped:
+        time.sleep(0.01)
+    os._exit(0)
+
+
+def _wait_for_exit(supervisor, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while any(p.is_alive() for p in supervisor.children.values()):
+        assert time.monotonic() < deadline, "children did not exit"
+        time.sleep(0.01)
+
+
+class TestSupervisor:
+    """Tests for Supervisor."""
+
+    def test_starts_one_process_per_slot(self):
+        """Every slot gets its own child process."""
+        supervisor = Supervisor(_serve_until_sigterm, 3, shutdown_timeout_s=5)
+        supervisor.start()
+        try:
+            pids = {p.pid for p in supervisor.children.values()}
+            assert len(pids) == 3
+            assert os.getpid() not in pids
+        finally:
+            supervisor.stop()
+
+    def test_restarts_crashed_children(self):
+        """A child that exits is replaced once its backoff has passed."""
+        supervisor = Supervisor(_crash, 2, restart_backoff_s=0)
+        supervisor.start()
+        first_pids = {p.pid for p in supervisor.children.values()}
+        _wait_for_exit(supervisor)
+
+        supervisor.check_children()
+
+        assert supervisor.restarts == {0: 1, 1: 1}
+        assert not first_pids & {p.pid for p in supervisor.children.values()}
+        supervisor.stop()
+
+    def test_backoff_delays_restart(self):
+        """Crashing children are not restarted before their backoff elapses."""
+        supervisor = Supervisor(_crash, 1, restart_backoff_s=60)
+        supervisor.start()
+        _wait_for_exit(supervisor)
+
+        supervisor.check_children()
+
+        assert supervisor.restarts == {}
+        supervisor.stop()
+
+    def test_stop_sends_sigterm_to_all_children(self):
+        """stop() shuts every child down cleanly via SIGTERM."""
+        supervisor = Supervisor(_serve_until_sigterm, 2, shutdown_timeout_s=5)
+        supervisor.start()
+        time.sleep(0.2)  # let the children install their handlers
+
+        supervisor.stop()
+
+        assert all(p.exitcode == 0 for p in supervisor.children.values())
+        supervisor.check_children()
+        assert supervisor.restarts == {}
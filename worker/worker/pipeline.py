@@ -0,0 +1,312 @@
+"""
+Staged consume → enrich → write pipeline (WORKER_RUNTIME=pipeline).
+
+Three threads connected by bounded queues, so Kafka fetches, enrichment and
+DB commits overlap instead of adding up:
+
+- poll: owns the KafkaConsumer (which is not thread-safe). When the enrich
+  queue is full it pauses its partitions and keeps polling for group
+  membership only, instead of buffering without limit. It is also the only
+  thread that commits offsets.
+- enrich: runs EnrichmentService.enrich over each polled batch.
+- write: stores batches and flushes aggregate deltas, then hands the
+  offsets covered by the flush back to the poll thread for commit.
+
+Offsets are committed only after the events and the aggregate deltas they
+produced are in Postgres, so a crash replays uncommitted work (at-least-once).
+"""
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from kafka import ConsumerRebalanceListener
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+from worker.services.aggregates import AggregateAccumulator
+from worker.services.dead_letter import DeadLetterQueue, store_isolating
+from worker.services.enrichment import EnrichmentService
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on the enrich and write queues
+_STOP = object()
+
+
+def _commit_offset(offset: int) -> OffsetAndMetadata:
+    # kafka-python >= 2.1 adds a leader_epoch field
+    if len(OffsetAndMetadata._fields) == 3:
+        return OffsetAndMetadata(offset, "", -1)
+    return OffsetAndMetadata(offset, "")
+
+
+def merge_offsets(into: Dict[Any, int], offsets: Dict[Any, int]):
+    """Merge next-offsets per partition into `into`, keeping the highest."""
+    for tp, offset in offsets.items():
+        into[tp] = max(into.get(tp, 0), offset)
+
+
+def commit_offsets(consumer, offsets: Dict[Any, int]) -> bool:
+    """Commit next-offsets per partition; a failed commit only means replaying those batches."""
+    try:
+        consumer.commit({tp: _commit_offset(o) for tp, o in offsets.items()})
+        return True
+    except Exception as e:
+        logger.error(f"Offset commit failed, batches will be replayed: {e}")
+        return False
+
+
+class _DrainOnRevoke(ConsumerRebalanceListener):
+    def __init__(self, pipeline: "StagedPipeline"):
+        self.pipeline = pipeline
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            logger.info(f"Partitions revoked: {sorted(tp.partition for tp in revoked)}, draining")
+            self.pipeline.drain()
+
+    def on_partitions_assigned(self, assigned):
+        logger.info(f"Partitions assigned: {sorted(tp.partition for tp in assigned)}")
+        shards = self.pipeline.enrichment.shards
+        if shards is not None:
+            shards.assign_partitions(tp.partition for tp in assigned)
+
+
+class StagedPipeline:
+    """Bounded-queue pipeline around one consumer and one EnrichmentService."""
+
+    def __init__(
+        self,
+        consumer,
+        enrichment_service: EnrichmentService,
+        accumulator: AggregateAccumulator,
+        batch_max_size: int = 500,
+        queue_size: int = 4,
+        copy_threshold: int = 250,
+        poll_timeout_ms: int = 1000,
+        drain_timeout_s: float = 30.0,
+        dead_letters: Optional[DeadLetterQueue] = None,
+    ):
+        self.consumer = consumer
+        self.enrichment = enrichment_service
+        self.accumulator = accumulator
+        self.batch_max_size = batch_max_size
+        self.copy_threshold = copy_threshold
+        self.poll_timeout_ms = poll_timeout_ms
+        self.drain_timeout_s = drain_timeout_s
+        self.dead_letters = dead_letters
+
+        self.enrich_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.commit_queue: queue.Queue = queue.Queue()
+
+        self.running = True
+        self._should_run: Callable[[], bool] = lambda: True
+        self.paused_count = 0
+        self._flushed = threading.Event()
+        self._pending_offsets: Dict[Any, int] = {}
+        # Set once a batch could not be written; no later batch is stored or committed
+        self._failed = False
+        self._enrich_thread = threading.Thread(target=self._enrich_loop, name="enrich", daemon=True)
+        self._write_thread = threading.Thread(target=self._write_loop, name="write", daemon=True)
+
+    def stop(self):
+        """Ask the pipeline to finish in-flight batches and exit. Signal-safe."""
+        self.running = False
+
+    def subscribe(self, topics: List[str]):
+        self.consumer.subscribe(topics, listener=_DrainOnRevoke(self))
+
+    def run(self, should_run: Callable[[], bool] = lambda: True):
+        """Run the poll stage on the calling thread until stop() or `should_run()` is False."""
+        self._should_run = should_run
+        self._enrich_thread.start()
+        self._write_thread.start()
+        try:
+            while self.running and should_run():
+                if not self._write_thread.is_alive():
+                    logger.error("Write stage exited, stopping the pipeline")
+                    break
+                records = self._poll(self.poll_timeout_ms, self.batch_max_size)
+                if records:
+                    self._enqueue(records)
+                self._commit_confirmed()
+        finally:
+            self._put_stop()
+            self._write_thread.join()
+            self._commit_confirmed()
+
+    def drain(self):
+        """
+        Wait until every polled batch is written and its deltas flushed, then
+        commit. Runs on the poll thread (e.g. before partitions are revoked).
+        """
+        if not (self._join(self.enrich_queue, self._enrich_thread)
+                and self._join(self.write_queue, self._write_thread)):
+            self._commit_confirmed()
+            return
+        self._flushed.clear()
+        self.accumulator.request_flush()
+        if not self._flushed.wait(self.drain_timeout_s):
+            logger.error("Timed out waiting for aggregate flush while draining")
+        self._commit_confirmed()
+
+    def _join(self, q: queue.Queue, thread: threading.Thread) -> bool:
+        """Like q.join(), but gives up if the thread consuming `q` has exited."""
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                if not thread.is_alive():
+                    logger.error(f"{thread.name} stage exited with {q.unfinished_tasks} batches queued")
+                    return False
+                q.all_tasks_done.wait(0.1)
+        return True
+
+    def _put_stop(self):
+        """Queue the end-of-stream marker unless the enrich stage is gone."""
+        while self._enrich_thread.is_alive():
+            try:
+                self.enrich_queue.put(_STOP, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    # poll stage
+
+    def _poll(self, timeout_ms: int, max_records: int) -> List[Any]:
+        msg_pack = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        return [message for messages in msg_pack.values() for message in messages]
+
+    def _enqueue(self, records: List[Any]):
+        """Put a polled batch on the enrich queue, pausing partitions while it is full."""
+        try:
+            self.enrich_queue.put_nowait(records)
+            return
+        except queue.Full:
+            pass
+
+        paused = set(self.consumer.assignment())
+        self.consumer.pause(*paused)
+        self.paused_count += 1
+        logger.info(f"Writer is behind, pausing {len(paused)} partitions")
+        try:
+            while True:
+                try:
+                    self.enrich_queue.put(records, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+                if not self.running or not self._write_thread.is_alive():
+                    # Not committed, so these are replayed after a restart
+                    return
+                # Keeps group membership alive; paused partitions return nothing
+                self._commit_confirmed()
+                newly_assigned = set(self.consumer.assignment()) - paused
+                if newly_assigned:
+                    self.consumer.pause(*newly_assigned)
+                    paused |= newly_assigned
+                records.extend(self._poll(100, self.batch_max_size))
+                # The poll may have rebalanced; revoked partitions' records belong to their new owner
+                records[:] = self._owned(records)
+                if not records:
+                    return
+        finally:
+            self.consumer.resume(*(paused & set(self.consumer.assignment())))
+
+    def _owned(self, records: List[Any]) -> List[Any]:
+        """`records` of partitions still assigned to this consumer."""
+        assigned = set(self.consumer.assignment())
+        return [r for r in records if TopicPartition(r.topic, r.partition) in assigned]
+
+    def _commit_confirmed(self):
+        """Commit offsets the writer has confirmed."""
+        offsets: Dict[Any, int] = {}
+        while True:
+            try:
+                merge_offsets(offsets, self.commit_queue.get_nowait())
+            except queue.Empty:
+                break
+        if offsets:
+            commit_offsets(self.consumer, offsets)
+
+    # enrich stage
+
+    def _enrich_loop(self):
+        while True:
+            records = self.enrich_queue.get()
+            try:
+                if records is _STOP:
+                    self.write_queue.put(_STOP)
+                    return
+
+                batch = []
+                offsets: Dict[Any, int] = {}
+                for record in records:
+                    merge_offsets(
+                        offsets, {TopicPartition(record.topic, record.partition): record.offset + 1}
+                    )
+                    try:
+                        batch.append(self.enrichment.enrich(record.value))
+                    except Exception as e:
+                        logger.error(f"Error processing event: {e}", exc_info=True)
+                        if self.dead_letters is not None:
+                            self.dead_letters.send(record.value, e, "enrich")
+                self.write_queue.put((batch, offsets, len(records) > self.copy_threshold))
+            finally:
+                self.enrich_queue.task_done()
+
+    # write stage
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self.write_queue.get(timeout=0.1)
+            except queue.Empty:
+                item = None
+
+            try:
+                if item is _STOP:
+                    self.accumulator.request_flush()
+                    self._flush()
+                    return
+                if item is not None:
+                    self._write(*item)
+                if self.accumulator.due():
+                    self._flush()
+            except Exception as e:
+                logger.error(f"Write stage error: {e}", exc_info=True)
+            finally:
+                if item is not None:
+                    self.write_queue.task_done()
+
+    def _write(self, batch: List[Dict[str, Any]], offsets: Dict[Any, int], use_copy: bool):
+        if self._failed:
+            # Skipped batches are replayed along with the failed one
+            return
+        try:
+            self._store(batch, use_copy)
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} events not stored, stopping so it is replayed: {e}",
+                         exc_info=True)
+            self._failed = True
+            self.stop()
+            return
+        merge_offsets(self._pending_offsets, offsets)
+
+    def _store(self, batch: List[Dict[str, Any]], use_copy: bool):
+        # Retrying while the DB is down backs up the queues, which pauses polling
+        store_isolating(
+            self.enrichment, batch, self.accumulator, self.dead_letters, use_copy=use_copy,
+            raise_transient=True, should_retry=lambda: self.running and self._should_run(),
+        )
+
+    def _flush(self):
+        try:
+            self.enrichment.flush_aggregates(self.accumulator)
+        except Exception as e:
+            logger.error(f"Aggregate flush failed, will retry: {e}", exc_info=True)
+            return
+        if self._pending_offsets:
+            self.commit_queue.put(self._pending_offsets)
+            self._pending_offsets = {}
+        self._flushed.set()
+
@@ -0,0 +1,203 @@
+import threading
+import time
+from datetime import timezone
+from typing import Dict, Any, List, Optional
+
+# Primary key columns of each aggregate table; the first is the time bucket.
+# Users, providers and models are dimension keys, like in events_enriched.
+AGGREGATE_KEYS = {
+    "daily_org_agg": ("date", "org_id", "shard"),
+    "daily_user_agg": ("date", "org_id", "user_key"),
+    "daily_provider_agg": ("date", "org_id", "provider_key"),
+    "daily_model_agg": ("date", "org_id", "provider_key", "model_key"),
+    "hourly_org_agg": ("hour", "org_id"),
+    "hourly_provider_agg": ("hour", "org_id", "provider_key"),
+}
+
+# Key column of sharded counters (migration 006). It is not an event
+# attribute: writers pick a shard, rows rebuilt from events go to shard 0
+# and readers sum across shards.
+SHARD_COLUMN = "shard"
+
+# SQL computing each time bucket from an events_enriched.ts expression
+BUCKET_SQL = {
+    "date": "CAST({ts} AS date)",
+    "hour": "date_trunc('hour', {ts})",
+}
+
+# {table: {key tuple: [call_count, kwh, water_l, co2_kg]}}
+AggregateDeltas = Dict[str, Dict[tuple, List[float]]]
+
+
+def event_columns(table: str) -> List[str]:
+    """Key columns of `table` that are event attributes (neither the bucket nor the shard)."""
+    return [c for c in AGGREGATE_KEYS[table][1:] if c != SHARD_COLUMN]
+
+
+# How long after orgs.ingest_mode_since workers may still apply the old
+# mode: their org config cache (WORKER_ORG_CONFIG_TTL_S) with room to spare
+MODE_SWITCH_GRACE = "1 hour"
+
+
+def complete_raw_sql(at: str, org_id: str = "org_id",
+                     retention_days: Optional[Dict[str, int]] = None) -> str:
+    """
+    SQL predicate on an org id column: true for orgs that store every event
+    in events_enriched (ingest_mode "full", API migration 011) and already
+    did at timestamp expression `at`, i.e. switched to full at least
+    MODE_SWITCH_GRACE before it (orgs.ingest_mode_since, migration 014).
+    Aggregates of sampled and aggregate-only periods cannot be recomputed
+    from raw events.
+
+    With `retention_days` (days per plan, as worker.retention reads them),
+    orgs whose raw events at `at` are past retention are excluded too:
+    retention may already have deleted them, while their aggregates stay.
+    """
+    predicate = (
+        f"{org_id} NOT IN (SELECT id FROM orgs WHERE ingest_mode <> 'full' "
+        f"OR ingest_mode_since > {at} - interval '{MODE_SWITCH_GRACE}')"
+    )
+    expiring = " ".join(
+        f"WHEN '{plan}' THEN {int(days)}" for plan, days in (retention_days or {}).items() if days > 0
+    )
+    if expiring:
+        # Same cutoff as worker.retention: events before today - days expire
+        predicate += (
+            f" AND {org_id} NOT IN (SELECT id FROM orgs WHERE {at} < CAST(timezone('UTC', now()) AS date) "
+            f"- CASE lower(COALESCE(plan::text, 'free')) {expiring} END)"
+        )
+    return predicate
+
+
+def recompute_sql(table: str, join: str = "", retention_days: Optional[Dict[str, int]] = None) -> str:
+    """
+    SELECT recomputing `table` from events_enriched `e` with :start <= ts < :end,
+    for orgs with complete raw events from :start on (see complete_raw_sql).
+
+    Columns are named and ordered like the table, with every row in shard 0.
+    Counts and sums are weighted by sample_weight, like the API's raw-event
+    queries; it is 1 for every row of a complete org. `join` can restrict
+    the events, e.g. to a set of keys.
+    """
+    bucket, *columns = AGGREGATE_KEYS[table]
+    bucket_sql = BUCKET_SQL[bucket].format(ts="e.ts")
+    group_by = ", ".join([bucket_sql, *(f"e.{c}" for c in event_columns(table))])
+    select = ", ".join(f"0 AS {c}" if c == SHARD_COLUMN else f"e.{c}" for c in columns)
+    return f"""
+        SELECT {bucket_sql} AS {bucket}, {select},
+               sum(e.sample_weight) AS call_count, sum(e.kwh * e.sample_weight) AS kwh,
+               sum(e.water_l * e.sample_weight) AS water_l, sum(e.co2_kg * e.sample_weight) AS co2_kg
+        FROM events_enriched e {join}
+        WHERE e.ts >= :start AND e.ts < :end AND {complete_raw_sql(":start", "e.org_id", retention_days)}
+        GROUP BY {group_by}
+    """
+
+
+def empty_deltas() -> AggregateDeltas:
+    return {table: {} for table in AGGREGATE_KEYS}
+
+
+def add_row(deltas: AggregateDeltas, row: Dict[str, Any], shard: int = 0):
+    """Add one events_enriched row to the deltas of every aggregate table, in `shard` where sharded."""
+    ts = row["ts"]
+    if ts.tzinfo is not None:
+        # Buckets are UTC, like the naive timestamps stored in events_enriched
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    row = {**row, "date": ts.date(), "hour": ts.replace(minute=0, second=0, microsecond=0), SHARD_COLUMN: shard}
+    for table, key_columns in AGGREGATE_KEYS.items():
+        key = tuple(row[column] for column in key_columns)
+        delta = deltas[table].setdefault(key, [0, 0.0, 0.0, 0.0])
+        delta[0] += 1
+        delta[1] += row["kwh"]
+        delta[2] += row["water_l"]
+        delta[3] += row["co2_kg"]
+
+
+def merge_deltas(into: AggregateDeltas, other: AggregateDeltas):
+    """Add every delta of `other` into `into`."""
+    for table, keys in other.items():
+        target = into.setdefault(table, {})
+        for key, (call_count, kwh, water_l, co2_kg) in keys.items():
+            delta = target.setdefault(key, [0, 0.0, 0.0, 0.0])
+            delta[0] += call_count
+            delta[1] += kwh
+            delta[2] += water_l
+            delta[3] += co2_kg
+
+
+class AggregateAccumulator:
+    """
+    In-memory pre-aggregation of the daily and hourly rollups.
+
+    Holds summed deltas keyed by (date, org), (date, org, user),
+    (date, org, provider), (date, org, provider, model), (hour, org) and
+    (hour, org, provider) so that the
+    aggregate tables receive one upsert per distinct key per flush instead
+    of one per event. A flush is due once `flush_interval_ms` has passed
+    since the first pending event or `flush_max_events` events are pending,
+    or when a flush has been requested (e.g. on shutdown).
+
+    Pending deltas exist only in memory, so consumers must not commit the
+    Kafka offsets of their events before a flush has succeeded; a failed
+    flush merges its deltas back and the offsets stay uncommitted with them.
+    """
+
+    def __init__(self, flush_interval_ms: int = 1000, flush_max_events: int = 5000):
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_max_events = flush_max_events
+        self._lock = threading.Lock()
+        self._deltas = empty_deltas()
+        self._pending_events = 0
+        self._first_pending: Optional[float] = None
+        self._flush_requested = False
+
+    @property
+    def pending_events(self) -> int:
+        return self._pending_events
+
+    @property
+    def distinct_keys(self) -> int:
+        return sum(len(keys) for keys in self._deltas.values())
+
+    def add_rows(self, rows: List[Dict[str, Any]], shards: Optional[List[int]] = None):
+        """Accumulate events_enriched rows, into `shards[i]` of sharded counters for row i."""
+        with self._lock:
+            for i, row in enumerate(rows):
+                add_row(self._deltas, row, shards[i] if shards is not None else 0)
+            self._note_pending(len(rows))
+
+    def merge(self, deltas: AggregateDeltas, events: int = 0):
+        """Merge already-summed deltas back in (e.g. after a failed flush)."""
+        with self._lock:
+            merge_deltas(self._deltas, deltas)
+            self._note_pending(events)
+
+    def request_flush(self):
+        """Make the next `due()` check return True. Safe to call from a signal handler."""
+        self._flush_requested = True
+
+    def due(self) -> bool:
+        """Whether pending deltas should be written now."""
+        if self._flush_requested:
+            return True
+        if not self._pending_events:
+            return False
+        if self._pending_events >= self.flush_max_events:
+            return True
+        elapsed_ms = (time.monotonic() - self._first_pending) * 1000
+        return elapsed_ms >= self.flush_interval_ms
+
+    def drain(self) -> tuple[AggregateDeltas, int]:
+        """Take the pending deltas and the number of events they cover, and reset."""
+        with self._lock:
+            deltas, events = self._deltas, self._pending_events
+            self._deltas = empty_deltas()
+            self._pending_events = 0
+            self._first_pending = None
+            self._flush_requested = False
+            return deltas, events
+
+    def _note_pending(self, events: int):
+        if events and self._first_pending is None:
+            self._first_pending = time.monotonic()
+        self._pending_events += events
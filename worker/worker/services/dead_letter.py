@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the records themselves (the DB is down or
+# restarting); bisecting a batch that failed with one of these is pointless
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, ConnectionError)
+
+
+class JsonlDeadLetterSink:
+    """Appends dead letters to a local JSONL file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def send(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def close(self):
+        pass
+
+
+class KafkaDeadLetterSink:
+    """Produces dead letters to a Kafka topic."""
+
+    def __init__(self, brokers: List[str], topic: str = "events.deadletter"):
+        from kafka import KafkaProducer
+
+        self.topic = topic
+        self.producer = KafkaProducer(
+            bootstrap_servers=brokers,
+            value_serializer=lambda v: json.dumps(v, default=str).encode("utf-8"),
+        )
+
+    def send(self, record: Dict[str, Any]):
+        self.producer.send(self.topic, record)
+
+    def close(self):
+        self.producer.flush()
+        self.producer.close()
+
+
+class DeadLetterQueue:
+    """
+    Routes events that cannot be enriched or stored to a sink, with the
+    error attached, instead of dropping them. Counts dead letters per
+    error class.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["DeadLetterQueue"]:
+        """
+        WORKER_DEAD_LETTER selects the sink: "kafka" (topic
+        WORKER_DEAD_LETTER_TOPIC), "jsonl" (file WORKER_DEAD_LETTER_PATH)
+        or "off".
+        """
+        kind = os.getenv("WORKER_DEAD_LETTER", "kafka")
+        if kind == "off":
+            return None
+        if kind == "jsonl":
+            return cls(JsonlDeadLetterSink(os.getenv("WORKER_DEAD_LETTER_PATH", "dead_letter.jsonl")))
+        if kind == "kafka":
+            brokers = os.getenv("KAFKA_BROKERS", "localhost:9092").split(",")
+            return cls(KafkaDeadLetterSink(brokers, os.getenv("WORKER_DEAD_LETTER_TOPIC", "events.deadletter")))
+        raise ValueError(f"Unknown WORKER_DEAD_LETTER sink: {kind}")
+
+    def send(self, event: Dict[str, Any], error: BaseException, stage: str):
+        """Dead-letter one event that failed in `stage` ("enrich" or "store")."""
+        error_class = type(error).__name__
+        with self._lock:
+            self.counts[error_class] += 1
+        logger.warning(f"Dead-lettering event at {stage}: {error_class}: {error}")
+        try:
+            self.sink.send({
+                "event": event,
+                "stage": stage,
+                "error_class": error_class,
+                "error": str(error),
+                "failed_at": datetime.utcnow().isoformat() + "Z",
+            })
+        except Exception as e:
+            logger.error(f"Dead-letter sink failed, event lost: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Dead letters so far, per error class."""
+        with self._lock:
+            return dict(self.counts)
+
+    def close(self):
+        self.sink.close()
+
+
+def store_isolating(enrichment_service, batch: List[Dict[str, Any]], accumulator=None,
+                    dead_letters: Optional[DeadLetterQueue] = None, use_copy: bool = False,
+                    raise_transient: bool = False, should_retry: Optional[Callable[[], bool]] = None,
+                    retry_backoff_s: float = 1.0, max_backoff_s: float = 30.0) -> int:
+    """
+    Store a batch, isolating records that make it fail.
+
+    A failed batch is split in half and each half retried, so k bad records
+    in a batch of n cost O(k log n) transactions rather than n. Records that
+    still fail on their own go to `dead_letters` (or are logged and dropped
+    without one). Transient DB errors are never bisected: while
+    `should_retry()` holds they are retried with backoff, then re-raised
+    with `raise_transient` (so the caller leaves the offsets uncommitted) or
+    else dead-letter the records. Once part of the batch has been committed
+    they are never re-raised, since the caller would store that part again
+    when it retries or replays the batch; the rest is dead-lettered. Returns
+    the number of records that could not be stored.
+    """
+    committed = False
+
+    def store(records: List[Dict[str, Any]]) -> int:
+        nonlocal committed
+        if not records:
+            return 0
+        delay = retry_backoff_s
+        while True:
+            try:
+                enrichment_service.store_enriched_batch(records, accumulator, use_copy=use_copy)
+                committed = True
+                return 0
+            except TRANSIENT_ERRORS as e:
+                if should_retry is not None and should_retry():
+                    logger.warning(f"Database unavailable, retrying batch of {len(records)} in {delay:.1f}s: {e}")
+                    _sleep_while(delay, should_retry)
+                    delay = min(delay * 2, max_backoff_s)
+                    continue
+                if raise_transient and not committed:
+                    raise
+                _dead_letter_all(records, e, dead_letters)
+                return len(records)
+            except Exception as e:
+                if len(records) == 1:
+                    _dead_letter_all(records, e, dead_letters)
+                    return len(records)
+                logger.error(f"Batch write of {len(records)} events failed, bisecting: {e}")
+                break
+
+        mid = len(records) // 2
+        return store(records[:mid]) + store(records[mid:])
+
+    return store(batch)
+
+
+def _dead_letter_all(batch: List[Dict[str, Any]], error: BaseException, dead_letters: Optional[DeadLetterQueue]):
+    for enriched in batch:
+        if dead_letters is not None:
+            dead_letters.send(enriched, error, "store")
+        else:
+            logger.error(f"Error storing event: {error}")
+
+
+def _sleep_while(seconds: float, condition: Callable[[], bool]):
+    """Sleep up to `seconds`, waking early once `condition()` is False."""
+    deadline = time.monotonic() + seconds
+    while condition() and time.monotonic() < deadline:
+        time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import create_engine, text
+
+# Dictionary-encoded event attributes (API migration 013): attribute -> key
+# column in events_enriched and the aggregate tables. The attribute name is
+# the `kind` of its values in the dimensions table.
+DIMENSION_KEYS = {
+    "user_id": "user_key",
+    "provider": "provider_key",
+    "model": "model_key",
+    "region": "region_key",
+}
+
+# Values resolved per round trip on cache misses
+RESOLVE_CHUNK_SIZE = 500
+
+
+class DimensionCache:
+    """
+    Interns dimension strings as the integer surrogate keys of the
+    dimensions table, so events and aggregates store small integers.
+
+    A key never changes once assigned, so cached entries never expire; the
+    cache is only bounded (LRU). Misses of a batch are resolved together,
+    inserting new values, in their own transaction: a key must not vanish
+    with a rolled-back batch while it is still cached.
+    """
+
+    def __init__(self, db_url: str, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.engine = create_engine(db_url)
+        self._cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, db_url: str) -> "DimensionCache":
+        return cls(db_url, max_entries=int(os.getenv("WORKER_DIMENSION_CACHE_SIZE", "100000")))
+
+    def encode(self, rows: List[Dict[str, Any]]):
+        """Set the key columns of events_enriched rows from their attributes, in place."""
+        keys = self.keys(
+            (kind, row[kind]) for row in rows for kind in DIMENSION_KEYS if row.get(kind) is not None
+        )
+        for row in rows:
+            for kind, column in DIMENSION_KEYS.items():
+                value = row.get(kind)
+                row[column] = None if value is None else keys[(kind, value)]
+
+    def keys(self, values: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """Key of every (kind, value), creating the missing ones."""
+        found: Dict[Tuple[str, str], int] = {}
+        missing = []
+        with self._lock:
+            for value in dict.fromkeys(values):
+                key = self._cache.get(value)
+                if key is None:
+                    missing.append(value)
+                else:
+                    self._cache.move_to_end(value)
+                    found[value] = key
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            resolved = self._resolve(missing)
+            found.update(resolved)
+            with self._lock:
+                self._cache.update(resolved)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
+
+    def _resolve(self, values: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        resolved = {}
+        with self.engine.begin() as conn:
+            for start in range(0, len(values), RESOLVE_CHUNK_SIZE):
+                chunk = values[start:start + RESOLVE_CHUNK_SIZE]
+                rows = ", ".join(f"(:kind_{i}, :value_{i})" for i in range(len(chunk)))
+                params = {}
+                for i, (kind, value) in enumerate(chunk):
+                    params[f"kind_{i}"] = kind
+                    params[f"value_{i}"] = value
+                # Values another writer inserts concurrently are skipped here and
+                # visible to the SELECT, which runs after that writer committed
+                conn.execute(
+                    text(f"INSERT INTO dimensions (kind, value) VALUES {rows} ON CONFLICT (kind, value) DO NOTHING"),
+                    params,
+                )
+                result = conn.execute(
+                    text(f"SELECT kind, value, id FROM dimensions WHERE (kind, value) IN (VALUES {rows})"),
+                    params,
+                )
+                resolved.update({(kind, value): key for kind, value, key in result})
+        return resolved
+
@@ -1,15 +1,51 @@
+import csv
+import io
+import json
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Sequence
 
+import numpy as np
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from worker.services.aggregates import (
+    AGGREGATE_KEYS,
+    AggregateAccumulator,
+    AggregateDeltas,
+    add_row,
+    empty_deltas,
+)
+from worker.services.dimensions import DimensionCache
+from worker.services.grid_series import parse_timestamp
+from worker.services.ids import new_event_id
+
+# Rows per multi-row INSERT; keeps bind parameters well under the Postgres limit
+INSERT_CHUNK_SIZE = 1000
+
+# Column order of the COPY stream into events_enriched; user, provider, model
+# and region are stored as dimension keys (see DimensionCache)
+COPY_COLUMNS = (
+    "id", "org_id", "user_key", "provider_key", "model_key", "tokens_in", "tokens_out",
+    "node_type", "region_key", "kwh", "water_l", "co2_kg", "ts", "source", "metadata",
+    "factor_version", "sample_weight", "created_at",
+)
+
 
 class EnrichmentService:
     """Service for enriching raw events with environmental impact."""
 
-    def __init__(self, factors_service, db_url: str):
+    def __init__(self, factors_service, db_url: str, overrides=None, shards=None, raw_events=None,
+                 dimensions: Optional[DimensionCache] = None):
         self.factors = factors_service
+        # Optional OverrideResolver for org-scoped factors
+        self.overrides = overrides
+        # Optional CounterShards spreading hot orgs' daily_org_agg rows over shards
+        self.shards = shards
+        # Optional RawEventFilter applying orgs' ingest modes (sampled / aggregate-only)
+        self.raw_events = raw_events
+        # Interns user ids, providers, models and regions as integer keys
+        self.dimensions = dimensions or DimensionCache.from_env(db_url)
         self.engine = create_engine(db_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
 
@@ -17,153 +53,319 @@ class EnrichmentService:
         """
         Enrich event with kWh, water, CO2.
 
-        Formula:
+        Formula (precomputed per provider/model/region by FactorsService):
         - kwh_base = kwh_per_call (from provider/model lookup)
         - kwh = kwh_base * pue
         - water_l = kwh * water_l_per_kwh
         - co2_kg = kwh * (grid_intensity / 1000) OR kwh * co2_kg_per_kwh
+
+        Org overrides, when configured, come from the resolver's cache. For
+        regions with an intensity series, CO2 uses the intensity at the
+        event's `ts`. The event gets its time-ordered events_enriched id here,
+        so retries of the same enriched event reuse it.
         """
         provider = event.get("provider", "unknown")
         model = event.get("model", "")
         region = event.get("region", "UNKNOWN")
 
-        # Get factors
-        kwh_base = self.factors.get_kwh_per_call(provider, model)
-        pue = self.factors.get_pue()
-        water_per_kwh = self.factors.get_water_per_kwh()
-
-        # Compute
-        kwh = kwh_base * pue
-        water_l = kwh * water_per_kwh
+        override = None
+        if self.overrides is not None:
+            override = self.overrides.get(event.get("org_id"), provider, model)
 
-        # CO2: use grid intensity if region known, else default
-        if region and region != "UNKNOWN":
-            grid_gco2 = self.factors.get_grid_intensity(region)
-            co2_kg = (kwh * grid_gco2) / 1000.0  # gCO2 → kgCO2
+        factors = self.factors.snapshot()
+        if factors.has_series(region):
+            ts = event.get("ts")
+            at = parse_timestamp(ts) if ts else time.time()
+            kwh, water_l, co2_kg = factors.lookup_at(provider, model, region, at, override)
         else:
-            co2_kg_per_kwh = self.factors.get_co2_per_kwh()
-            co2_kg = kwh * co2_kg_per_kwh
+            kwh, water_l, co2_kg = factors.lookup(provider, model, region, override)
 
         enriched = {
             **event,
+            "event_id": new_event_id(),
             "kwh": kwh,
             "water_l": water_l,
             "co2_kg": co2_kg,
+            "factor_version": factors.version,
             "enriched_at": datetime.utcnow().isoformat() + "Z",
         }
 
         return enriched
 
-    def store_enriched(self, enriched: Dict[str, Any]):
+    def enrich_batch(
+        self,
+        providers: Sequence[str],
+        models: Sequence[str],
+        regions: Sequence[str],
+        org_ids: Optional[Sequence[str]] = None,
+        timestamps: Optional[Sequence[float]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Vectorized `enrich` over columnar event arrays.
+
+        Each distinct (provider, model, region) is resolved through the
+        compiled factor table once; events are mapped to those indices and
+        the columns gathered with NumPy, so results match `enrich` exactly.
+        Pass `org_ids` to apply org overrides; keys then include the org.
+        Pass `timestamps` (epoch seconds) to take CO2 from the intensity
+        series, resolved with one `searchsorted` per region.
+
+        Returns {"kwh", "water_l", "co2_kg"} as float64 arrays and the
+        "factor_version" used for the whole batch.
+        """
+        factors = self.factors.snapshot()
+        by_org = org_ids is not None and self.overrides is not None
+        keys = zip(org_ids, providers, models, regions) if by_org else zip(providers, models, regions)
+        index: Dict[tuple, int] = {}
+        codes = np.fromiter(
+            (index.setdefault(key, len(index)) for key in keys),
+            dtype=np.intp,
+            count=len(providers),
+        )
+        if by_org:
+            overrides = [self.overrides.get(org_id, provider, model) for org_id, provider, model, _ in index]
+        else:
+            overrides = [None] * len(index)
+        entries = [
+            factors.lookup(*key[-3:], override) for key, override in zip(index, overrides)
+        ]
+        table = np.array(entries, dtype=np.float64).reshape(len(index), 3)
+
+        values = table[codes]
+        kwh, water_l, co2_kg = values[:, 0], values[:, 1], values[:, 2]
+
+        if timestamps is not None and factors.grid_series is not None:
+            ts = np.asarray(timestamps, dtype=np.float64)
+            # Key indices whose CO2 follows the series, grouped by region
+            by_region: Dict[str, List[int]] = {}
+            for i, (key, override) in enumerate(zip(index, overrides)):
+                if factors.has_series(key[-1]) and (override is None or override.co2_kg_per_kwh is None):
+                    by_region.setdefault(key[-1], []).append(i)
+            for region, key_indices in by_region.items():
+                rows = np.isin(codes, key_indices)
+                intensity, covered = factors.grid_series.get(region).at_many(ts[rows])
+                co2_kg[rows] = np.where(covered, (kwh[rows] * intensity) / 1000.0, co2_kg[rows])
+
+        return {
+            "kwh": kwh,
+            "water_l": water_l,
+            "co2_kg": co2_kg,
+            "factor_version": factors.version,
+        }
+
+    def store_enriched(self, enriched: Dict[str, Any],
+                       accumulator: Optional[AggregateAccumulator] = None):
         """Store enriched event and update daily aggregates"""
+        self.store_enriched_batch([enriched], accumulator)
+
+    def store_enriched_batch(self, events: List[Dict[str, Any]],
+                             accumulator: Optional[AggregateAccumulator] = None,
+                             use_copy: bool = False) -> int:
+        """
+        Store a batch of enriched events in a single transaction.
+
+        Events are written with multi-row INSERTs, except those the org's
+        ingest mode skips (see `raw_rows`). Without an accumulator the
+        daily aggregates receive one upsert per distinct key in the same
+        transaction; with one, the deltas are handed to the accumulator once
+        the events are committed and written later by `flush_aggregates`.
+
+        With `use_copy`, events are streamed with `COPY ... FROM STDIN` instead
+        of INSERTs, which is much cheaper for large batches such as backfills.
+        Aggregates are still applied through upserts.
+
+        Aggregates always include every event. Returns the number of events
+        processed.
+        """
+        if not events:
+            return 0
+
+        rows = [self._to_row(enriched) for enriched in events]
+        self.dimensions.encode(rows)
+        shards = self.counter_shards(rows)
+        raw_rows = self.raw_rows(rows)
+
         db = self.SessionLocal()
         try:
-            # Parse timestamp
-            ts_str = enriched.get("ts")
-            if ts_str:
-                ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+            if use_copy and raw_rows:
+                self._copy_events(db, raw_rows)
             else:
-                ts = datetime.utcnow()
-
-            event_date = ts.date()
-            org_id = enriched["org_id"]
-            user_id = enriched["user_id"]
-            provider = enriched["provider"]
-            model = enriched.get("model", "unknown")
-            kwh = enriched["kwh"]
-            water_l = enriched["water_l"]
-            co2_kg = enriched["co2_kg"]
-
-            # Insert into events_enriched
-            db.execute(
-                text("""
-                    INSERT INTO events_enriched
-                    (id, org_id, user_id, provider, model, tokens_in, tokens_out,
-                     node_type, region, kwh, water_l, co2_kg, ts, source, metadata, created_at)
-                    VALUES
-                    (gen_random_uuid()::text, :org_id, :user_id, :provider, :model, :tokens_in, :tokens_out,
-                     :node_type, :region, :kwh, :water_l, :co2_kg, :ts, :source, :metadata::jsonb, now())
-                """),
-                {
-                    "org_id": org_id,
-                    "user_id": user_id,
-                    "provider": provider,
-                    "model": model,
-                    "tokens_in": enriched.get("tokens_in", 0),
-                    "tokens_out": enriched.get("tokens_out", 0),
-                    "node_type": enriched.get("node_type"),
-                    "region": enriched.get("region"),
-                    "kwh": kwh,
-                    "water_l": water_l,
-                    "co2_kg": co2_kg,
-                    "ts": ts,
-                    "source": enriched.get("source", "gateway"),
-                    "metadata": str(enriched.get("metadata", {})),
-                }
-            )
+                self._insert_events(db, raw_rows)
+            if accumulator is None:
+                aggregates = empty_deltas()
+                for row, shard in zip(rows, shards):
+                    add_row(aggregates, row, shard)
+                self._upsert_aggregates(db, aggregates)
+            db.commit()
+            skipped = f", {len(rows) - len(raw_rows)} aggregate-only" if len(raw_rows) < len(rows) else ""
+            print(f"✅ Stored batch: {len(rows)} events{skipped}{' (COPY)' if use_copy else ''}")
 
-            # Update daily_org_agg
-            db.execute(
-                text("""
-                    INSERT INTO daily_org_agg (date, org_id, call_count, kwh, water_l, co2_kg)
-                    VALUES (:date, :org_id, 1, :kwh, :water_l, :co2_kg)
-                    ON CONFLICT (date, org_id) DO UPDATE SET
-                        call_count = daily_org_agg.call_count + 1,
-                        kwh = daily_org_agg.kwh + EXCLUDED.kwh,
-                        water_l = daily_org_agg.water_l + EXCLUDED.water_l,
-                        co2_kg = daily_org_agg.co2_kg + EXCLUDED.co2_kg
-                """),
-                {"date": event_date, "org_id": org_id, "kwh": kwh, "water_l": water_l, "co2_kg": co2_kg}
-            )
+        except Exception as e:
+            db.rollback()
+            print(f"❌ DB error: {e}")
+            raise
+        finally:
+            db.close()
 
-            # Update daily_user_agg
-            db.execute(
-                text("""
-                    INSERT INTO daily_user_agg (date, org_id, user_id, call_count, kwh, water_l, co2_kg)
-                    VALUES (:date, :org_id, :user_id, 1, :kwh, :water_l, :co2_kg)
-                    ON CONFLICT (date, org_id, user_id) DO UPDATE SET
-                        call_count = daily_user_agg.call_count + 1,
-                        kwh = daily_user_agg.kwh + EXCLUDED.kwh,
-                        water_l = daily_user_agg.water_l + EXCLUDED.water_l,
-                        co2_kg = daily_user_agg.co2_kg + EXCLUDED.co2_kg
-                """),
-                {"date": event_date, "org_id": org_id, "user_id": user_id, "kwh": kwh, "water_l": water_l, "co2_kg": co2_kg}
-            )
+        if accumulator is not None:
+            accumulator.add_rows(rows, shards)
+        return len(rows)
 
-            # Update daily_provider_agg
-            db.execute(
-                text("""
-                    INSERT INTO daily_provider_agg (date, org_id, provider, call_count, kwh, water_l, co2_kg)
-                    VALUES (:date, :org_id, :provider, 1, :kwh, :water_l, :co2_kg)
-                    ON CONFLICT (date, org_id, provider) DO UPDATE SET
-                        call_count = daily_provider_agg.call_count + 1,
-                        kwh = daily_provider_agg.kwh + EXCLUDED.kwh,
-                        water_l = daily_provider_agg.water_l + EXCLUDED.water_l,
-                        co2_kg = daily_provider_agg.co2_kg + EXCLUDED.co2_kg
-                """),
-                {"date": event_date, "org_id": org_id, "provider": provider, "kwh": kwh, "water_l": water_l, "co2_kg": co2_kg}
-            )
+    def flush_aggregates(self, accumulator: AggregateAccumulator) -> int:
+        """
+        Write the accumulator's pending deltas in one transaction.
 
-            # Update daily_model_agg
-            db.execute(
-                text("""
-                    INSERT INTO daily_model_agg (date, org_id, provider, model, call_count, kwh, water_l, co2_kg)
-                    VALUES (:date, :org_id, :provider, :model, 1, :kwh, :water_l, :co2_kg)
-                    ON CONFLICT (date, org_id, provider, model) DO UPDATE SET
-                        call_count = daily_model_agg.call_count + 1,
-                        kwh = daily_model_agg.kwh + EXCLUDED.kwh,
-                        water_l = daily_model_agg.water_l + EXCLUDED.water_l,
-                        co2_kg = daily_model_agg.co2_kg + EXCLUDED.co2_kg
-                """),
-                {"date": event_date, "org_id": org_id, "provider": provider, "model": model, "kwh": kwh, "water_l": water_l, "co2_kg": co2_kg}
-            )
+        On failure the deltas are merged back so the next flush retries them.
+        Returns the number of aggregate keys written.
+        """
+        aggregates, events = accumulator.drain()
+        keys = sum(len(k) for k in aggregates.values())
+        if not keys:
+            return 0
 
+        db = self.SessionLocal()
+        try:
+            self._upsert_aggregates(db, aggregates)
             db.commit()
-            print(f"✅ Stored: {org_id}/{user_id}, {provider}/{model}, kWh={kwh:.6f}, CO2={co2_kg:.6f}")
+            print(f"✅ Flushed aggregates: {events} events into {keys} keys")
+            return keys
 
         except Exception as e:
             db.rollback()
-            print(f"❌ DB error: {e}")
+            accumulator.merge(aggregates, events)
+            print(f"❌ DB error flushing aggregates: {e}")
             raise
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    def counter_shards(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """The sharded-counter shard of each events_enriched row."""
+        if self.shards is None:
+            return [0] * len(rows)
+        return [self.shards.shard(row["org_id"]) for row in rows]
+
+    def raw_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        The rows that get a raw events_enriched row under their org's ingest
+        mode, each with the sample_weight it is stored with.
+        """
+        if self.raw_events is None:
+            return rows
+        raw_rows = []
+        for row in rows:
+            weight = self.raw_events.sample_weight(row)
+            if weight:
+                raw_rows.append({**row, "sample_weight": weight})
+        return raw_rows
+
+    def _to_row(self, enriched: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Map an enriched event onto the events_enriched column layout, with
+        the dimension attributes as strings until `dimensions.encode`.
+        """
+        # Parse timestamp
+        ts_str = enriched.get("ts")
+        if ts_str:
+            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+        else:
+            ts = datetime.utcnow()
+
+        return {
+            "id": enriched.get("event_id") or new_event_id(),
+            "org_id": enriched["org_id"],
+            "user_id": enriched["user_id"],
+            "provider": enriched["provider"],
+            "model": enriched.get("model", "unknown"),
+            "tokens_in": enriched.get("tokens_in", 0),
+            "tokens_out": enriched.get("tokens_out", 0),
+            "node_type": enriched.get("node_type"),
+            "region": enriched.get("region"),
+            "kwh": enriched["kwh"],
+            "water_l": enriched["water_l"],
+            "co2_kg": enriched["co2_kg"],
+            "ts": ts,
+            "source": enriched.get("source", "gateway"),
+            "metadata": json.dumps(enriched.get("metadata", {}), default=str),
+            "factor_version": enriched.get("factor_version"),
+            # Events this row stands for; above 1 for sampled orgs (see raw_rows)
+            "sample_weight": 1,
+        }
+
+    def _insert_events(self, db, rows: List[Dict[str, Any]]):
+        """Insert events_enriched rows with multi-row VALUES statements."""
+        columns = COPY_COLUMNS[:-1]
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_CHUNK_SIZE]
+            values = []
+            params: Dict[str, Any] = {}
+            for i, row in enumerate(chunk):
+                placeholders = [
+                    f"CAST(:{column}_{i} AS jsonb)" if column == "metadata" else f":{column}_{i}"
+                    for column in columns
+                ]
+                values.append(f"({', '.join(placeholders)}, now())")
+                params.update({f"{column}_{i}": row[column] for column in columns})
+
+            db.execute(
+                text(f"""
+                    INSERT INTO events_enriched ({", ".join(COPY_COLUMNS)})
+                    VALUES {", ".join(values)}
+                """),
+                params,
+            )
+
+    def _copy_events(self, db, rows: List[Dict[str, Any]]):
+        """Stream events_enriched rows through psycopg2 COPY in CSV form."""
+        created_at = datetime.utcnow()
+        buf = io.StringIO()
+        # None is written as an unquoted empty field, which COPY reads as NULL;
+        # every other value is quoted so empty strings stay empty strings
+        writer = csv.writer(buf, quoting=csv.QUOTE_NOTNULL, lineterminator="\n")
+        for row in rows:
+            writer.writerow(
+                [*(row[column] for column in COPY_COLUMNS[:-1]), created_at]
+            )
+        buf.seek(0)
+
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY events_enriched ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cursor.close()
+
+    def _upsert_aggregates(self, db, aggregates: AggregateDeltas):
+        """Apply summed deltas with one ON CONFLICT upsert row per distinct key."""
+        for table, key_columns in AGGREGATE_KEYS.items():
+            # Sorted keys give concurrent writers the same row lock order (no deadlocks)
+            items = sorted(aggregates.get(table, {}).items())
+            for start in range(0, len(items), INSERT_CHUNK_SIZE):
+                chunk = items[start:start + INSERT_CHUNK_SIZE]
+                values = []
+                params: Dict[str, Any] = {}
+                for i, (key, (call_count, kwh, water_l, co2_kg)) in enumerate(chunk):
+                    placeholders = [f":{column}_{i}" for column in key_columns]
+                    placeholders += [f":call_count_{i}", f":kwh_{i}", f":water_l_{i}", f":co2_kg_{i}"]
+                    values.append(f"({', '.join(placeholders)})")
+                    params.update({f"{column}_{i}": value for column, value in zip(key_columns, key)})
+                    params.update({
+                        f"call_count_{i}": call_count,
+                        f"kwh_{i}": kwh,
+                        f"water_l_{i}": water_l,
+                        f"co2_kg_{i}": co2_kg,
+                    })
+
+                db.execute(
+                    text(f"""
+                        INSERT INTO {table} ({", ".join(key_columns)}, call_count, kwh, water_l, co2_kg)
+                        VALUES {", ".join(values)}
+                        ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET
+                            call_count = {table}.call_count + EXCLUDED.call_count,
+                            kwh = {table}.kwh + EXCLUDED.kwh,
+                            water_l = {table}.water_l + EXCLUDED.water_l,
+                            co2_kg = {table}.co2_kg + EXCLUDED.co2_kg
+                    """),
+                    params,
+                )
@@ -1,9 +1,34 @@
+import hashlib
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, NamedTuple, Optional, Tuple
 
 import yaml
 
+from worker.services.grid_series import GridIntensitySeries
+
+
+class FactorEntry(NamedTuple):
+    """Final per-call impact for one (provider, model, region) triple."""
+    kwh: float
+    water_l: float
+    co2_kg: float
+
+
+# Bound on memoized lookups for triples not in the compiled table
+UNSEEN_CACHE_SIZE = 4096
+
+
+def find_factor_file(name: str) -> Optional[Path]:
+    """Find a factor file in docs/ relative to the working directory or its parents."""
+    for p in [Path("docs") / name, Path("../docs") / name, Path("../../docs") / name]:
+        if p.exists():
+            return p
+    return None
+
 
 class FactorsService:
     """Service for loading and merging environmental factors."""
@@ -11,47 +36,42 @@ class FactorsService:
     def __init__(self):
         self.defaults: Dict[str, Any] = {}
         self.grid_intensity: Dict[str, float] = {}
+        # Time-varying intensity; takes precedence over grid_intensity where it has data
+        self.grid_series: Optional[GridIntensitySeries] = None
+        self.table: Mapping[Tuple[str, str, str], FactorEntry] = MappingProxyType({})
+        self._unseen: "OrderedDict[Tuple[str, str, str], FactorEntry]" = OrderedDict()
+        self._unseen_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version = "unversioned"
 
-    def load_defaults(self):
-        """Load default factors from YAML."""
+    def load_defaults(self, factors_path: Optional[Path] = None, grid_path: Optional[Path] = None,
+                      series_path: Optional[Path] = None):
+        """Load default factors from YAML, and intensity series from `series_path` if given."""
         # Look for factors_defaults.yaml in docs/ or local
-        possible_paths = [
-            Path("docs/factors_defaults.yaml"),
-            Path("../docs/factors_defaults.yaml"),
-            Path("../../docs/factors_defaults.yaml"),
-        ]
-
-        factors_file = None
-        for p in possible_paths:
-            if p.exists():
-                factors_file = p
-                break
+        factors_file = factors_path or find_factor_file("factors_defaults.yaml")
+        digest = hashlib.sha256()
 
         if factors_file:
-            with open(factors_file) as f:
-                data = yaml.safe_load(f)
+            with open(factors_file, "rb") as f:
+                raw = f.read()
+                digest.update(raw)
+                data = yaml.safe_load(raw)
                 self.defaults = data
                 print(f"✅ Loaded factors from {factors_file}")
         else:
             print("⚠️  factors_defaults.yaml not found, using hardcoded defaults")
             self._load_hardcoded_defaults()
+            digest.update(b"hardcoded-factors")
 
         # Load grid intensity
-        possible_grid_paths = [
-            Path("docs/grid_intensity.yaml"),
-            Path("../docs/grid_intensity.yaml"),
-            Path("../../docs/grid_intensity.yaml"),
-        ]
-
-        grid_file = None
-        for p in possible_grid_paths:
-            if p.exists():
-                grid_file = p
-                break
+        grid_file = grid_path or find_factor_file("grid_intensity.yaml")
 
         if grid_file:
-            with open(grid_file) as f:
-                data = yaml.safe_load(f)
+            with open(grid_file, "rb") as f:
+                raw = f.read()
+                digest.update(raw)
+                data = yaml.safe_load(raw)
                 regions = data.get("regions", {})
                 self.grid_intensity = {
                     k: v["gco2_per_kwh"] for k, v in regions.items()
@@ -60,6 +80,138 @@ class FactorsService:
         else:
             print("⚠️  grid_intensity.yaml not found, using defaults")
             self.grid_intensity = {"UNKNOWN": 500, "GLOBAL": 475}
+            digest.update(b"hardcoded-grid")
+
+        if series_path:
+            self.grid_series = GridIntensitySeries.load(series_path, digest)
+            print(f"✅ Loaded grid intensity series for {len(self.grid_series.series)} regions from {series_path}")
+
+        self.version = digest.hexdigest()[:12]
+        self.compile()
+
+    def snapshot(self) -> "FactorsService":
+        """The factor set to use for one event or batch (see FactorRegistry)."""
+        return self
+
+    def compile(self):
+        """
+        Build the flat lookup table from the loaded factors.
+
+        Every known provider (with its default "" and each configured model)
+        is crossed with every known region and "UNKNOWN", so the hot path is
+        a single dict lookup. Memoized unseen triples are discarded.
+        """
+        table = {}
+        for provider, provider_data in self.defaults.get("providers", {}).items():
+            models = ["", *provider_data.get("models", {})]
+            for model in models:
+                for region in [*self.grid_intensity, "UNKNOWN"]:
+                    table[(provider, model, region)] = self._resolve(provider, model, region)
+
+        with self._unseen_lock:
+            self.table = MappingProxyType(table)
+            self._unseen = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+        print(f"✅ Compiled {len(table)} factor entries")
+
+    def lookup(self, provider: str, model: str, region: str, override=None) -> FactorEntry:
+        """
+        Per-call kWh, water and CO2 for a (provider, model, region) triple.
+
+        With an org `override` (see OverrideResolver) the entry is computed
+        directly from the override, bypassing the compiled table.
+        """
+        if override is not None:
+            return self._resolve(provider, model, region, override)
+
+        key = (provider, model, region)
+        entry = self.table.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        with self._unseen_lock:
+            entry = self._unseen.get(key)
+            if entry is not None:
+                self._unseen.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            entry = self._resolve(provider, model, region)
+            self._unseen[key] = entry
+            if len(self._unseen) > UNSEEN_CACHE_SIZE:
+                self._unseen.popitem(last=False)
+            return entry
+
+    def has_series(self, region: str) -> bool:
+        """Whether CO2 for `region` depends on the event time."""
+        return self.grid_series is not None and region in self.grid_series
+
+    def lookup_at(self, provider: str, model: str, region: str, ts: Optional[float],
+                  override=None) -> FactorEntry:
+        """
+        `lookup` with CO2 from the region's intensity at epoch second `ts`.
+
+        Falls back to the static entry when there is no series value at `ts`
+        or the org overrides co2_kg_per_kwh.
+        """
+        entry = self.lookup(provider, model, region, override)
+        if ts is None or self.grid_series is None:
+            return entry
+        if override is not None and override.co2_kg_per_kwh is not None:
+            return entry
+        intensity = self.grid_series.at(region, ts)
+        if intensity is None:
+            return entry
+        return entry._replace(co2_kg=(entry.kwh * intensity) / 1000.0)  # gCO2 → kgCO2
+
+    def lookup_stats(self) -> Dict[str, int]:
+        """Lookup hit/miss counters and table sizes."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "compiled": len(self.table),
+            "memoized": len(self._unseen),
+        }
+
+    def _resolve(self, provider: str, model: str, region: str, override=None) -> FactorEntry:
+        """
+        Walk the factor dicts for one triple.
+
+        - kwh = kwh_per_call * pue
+        - water_l = kwh * water_l_per_kwh
+        - co2_kg = kwh * (grid_intensity / 1000) OR kwh * co2_kg_per_kwh
+
+        Fields set on `override` replace the corresponding defaults; an
+        overridden co2_kg_per_kwh also takes precedence over grid intensity.
+        """
+        kwh_per_call = self.get_kwh_per_call(provider, model)
+        pue = self.get_pue()
+        water_per_kwh = self.get_water_per_kwh()
+        co2_per_kwh = None
+        if override is not None:
+            if override.kwh_per_call is not None:
+                kwh_per_call = override.kwh_per_call
+            if override.pue is not None:
+                pue = override.pue
+            if override.water_l_per_kwh is not None:
+                water_per_kwh = override.water_l_per_kwh
+            co2_per_kwh = override.co2_kg_per_kwh
+
+        kwh = kwh_per_call * pue
+        water_l = kwh * water_per_kwh
+
+        # CO2: an org's own factor, else grid intensity if region known, else default
+        if co2_per_kwh is not None:
+            co2_kg = kwh * co2_per_kwh
+        elif region and region != "UNKNOWN":
+            co2_kg = (kwh * self.get_grid_intensity(region)) / 1000.0  # gCO2 → kgCO2
+        else:
+            co2_kg = kwh * self.get_co2_per_kwh()
+
+        return FactorEntry(kwh, water_l, co2_kg)
 
     def _load_hardcoded_defaults(self):
         """Fallback hardcoded defaults."""
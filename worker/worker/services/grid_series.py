@@ -0,0 +1,148 @@
+import csv
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Coverage assumed after the last sample of a series that has only one
+DEFAULT_STEP_S = 3600
+
+
+def parse_timestamp(value) -> float:
+    """Epoch seconds from an ISO 8601 string (naive means UTC) or a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def series_files(path: Optional[Path]) -> List[Path]:
+    """The CSV/Parquet files of a series path (a single file or a directory)."""
+    if path is None:
+        return []
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.suffix in (".csv", ".parquet"))
+    return [path] if path.exists() else []
+
+
+class IntensitySeries:
+    """
+    Grid intensity of one region over time, as a step function.
+
+    `ts` (epoch seconds) and `values` (gCO2/kWh) are sorted NumPy arrays;
+    sample i applies from ts[i] until the next sample, and the last sample
+    for one more step. Outside that range there is no value. Scalar lookups
+    remember the last interval hit, so a stream of events in time order is
+    answered without a search.
+    """
+
+    def __init__(self, ts: np.ndarray, values: np.ndarray):
+        order = np.argsort(ts, kind="stable")
+        ts, values = ts[order], values[order]
+        # Duplicate timestamps: the sample read last wins
+        keep = np.append(ts[1:] != ts[:-1], True)
+        self.ts = ts[keep]
+        self.values = values[keep]
+        step = self.ts[-1] - self.ts[-2] if len(self.ts) > 1 else DEFAULT_STEP_S
+        self.end = self.ts[-1] + step
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def at(self, t: float) -> Optional[float]:
+        """Intensity at epoch second `t`, or None outside the series."""
+        i = self._cursor
+        ts = self.ts
+        if ts[i] <= t and (i + 1 == len(ts) or t < ts[i + 1]):
+            return float(self.values[i]) if t < self.end else None
+
+        i = int(np.searchsorted(ts, t, side="right")) - 1
+        if i < 0 or t >= self.end:
+            return None
+        self._cursor = i
+        return float(self.values[i])
+
+    def at_many(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Intensities at every epoch second in `t` and a mask of which are covered."""
+        idx = np.searchsorted(self.ts, t, side="right") - 1
+        covered = (idx >= 0) & (t < self.end)
+        return self.values[np.maximum(idx, 0)], covered
+
+
+class GridIntensitySeries:
+    """Time-varying grid intensity per region, loaded from CSV or Parquet files."""
+
+    def __init__(self, series: Dict[str, IntensitySeries]):
+        self.series = series
+
+    def __contains__(self, region: str) -> bool:
+        return region in self.series
+
+    def get(self, region: str) -> Optional[IntensitySeries]:
+        return self.series.get(region)
+
+    def at(self, region: str, t: float) -> Optional[float]:
+        series = self.series.get(region)
+        return series.at(t) if series is not None else None
+
+    @classmethod
+    def load(cls, path: Path, digest=None) -> "GridIntensitySeries":
+        """
+        Load every series file under `path`.
+
+        Files have `ts` and `gco2_per_kwh` columns and optionally `region`;
+        without one, the file name (e.g. US-CAISO.csv) is the region. `ts`
+        is ISO 8601 or epoch seconds. File contents are fed to `digest`.
+        """
+        columns: Dict[str, Tuple[List[float], List[float]]] = {}
+        for file in series_files(path):
+            if digest is not None:
+                digest.update(file.read_bytes())
+            reader = cls._read_parquet if file.suffix == ".parquet" else cls._read_csv
+            for region, ts, value in reader(file):
+                region_ts, region_values = columns.setdefault(region, ([], []))
+                region_ts.append(ts)
+                region_values.append(value)
+
+        return cls({
+            region: IntensitySeries(np.array(ts, dtype=np.float64), np.array(values, dtype=np.float64))
+            for region, (ts, values) in columns.items()
+        })
+
+    @staticmethod
+    def _read_csv(file: Path):
+        with open(file, newline="") as f:
+            for row in csv.DictReader(f):
+                yield (
+                    row.get("region") or file.stem,
+                    parse_timestamp(row["ts"]),
+                    float(row["gco2_per_kwh"]),
+                )
+
+    @staticmethod
+    def _read_parquet(file: Path):
+        # Optional dependency: pip install -e ".[parquet]"
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(file)
+        ts = table.column("ts")
+        if pa.types.is_timestamp(ts.type):
+            # Stored as UTC ticks of the column's unit
+            per_second = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}[ts.type.unit]
+            ts_values = [t / per_second for t in ts.cast(pa.int64()).to_pylist()]
+        else:
+            ts_values = [parse_timestamp(t) for t in ts.to_pylist()]
+        values = table.column("gco2_per_kwh").to_pylist()
+        if "region" in table.column_names:
+            regions = table.column("region").to_pylist()
+        else:
+            regions = [file.stem] * len(values)
+        yield from zip(regions, ts_values, (float(v) for v in values))
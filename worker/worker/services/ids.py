@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+import uuid
+
+# Matches the text form of a UUIDv7 (version nibble 7), as written by
+# new_event_id and the uuid_v7() SQL function of API migration 007
+UUID7_PATTERN = "^[0-9a-f]{8}-[0-9a-f]{4}-7"
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def new_event_id(now_ms: int = None) -> str:
+    """
+    A time-ordered events_enriched.id: a UUIDv7 (RFC 9562) in text form.
+
+    The first 48 bits are Unix milliseconds, so ids sort by creation time
+    and inserts land on the right edge of the primary key index instead of
+    on random leaf pages. A 12-bit counter seeded at random each millisecond
+    keeps ids of one process strictly increasing, even when the clock steps
+    back; the last 62 bits are random.
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000 if now_ms is None else now_ms
+        if ms > _last_ms:
+            _last_ms = ms
+            # Top counter bit clear, so a millisecond has room for 2048+ ids
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    rand = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand
+    return str(uuid.UUID(int=value))
+
+
+def event_id_ms(event_id: str) -> int:
+    """Unix milliseconds embedded in a UUIDv7 event id."""
+    return uuid.UUID(event_id).int >> 80
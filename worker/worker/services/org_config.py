@@ -0,0 +1,169 @@
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+
+# orgs.ingest_mode values (API migration 011): which raw events_enriched rows are written
+INGEST_MODES = ("full", "sampled", "aggregate_only")
+
+
+class OrgConfig(NamedTuple):
+    """Per-org worker settings from the orgs table (defaults apply to unknown orgs)."""
+    agg_shards: int = 1
+    ingest_mode: str = "full"
+    raw_sample_rate: int = 10
+
+
+class OrgConfigCache:
+    """
+    In-process LRU+TTL cache of per-org settings.
+
+    Settings only tune how events are written, never what is counted, so a
+    stale entry is harmless and changes simply take effect within `ttl_s`.
+    For the same reason a failed load falls back to the defaults instead of
+    failing the batch being written.
+    """
+
+    def __init__(self, db_url: str, ttl_s: float = 60.0, max_entries: int = 10000):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.engine = create_engine(db_url)
+        self._cache: "OrderedDict[str, Tuple[float, OrgConfig]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, db_url: str) -> "OrgConfigCache":
+        return cls(
+            db_url,
+            ttl_s=float(os.getenv("WORKER_ORG_CONFIG_TTL_S", "60")),
+            max_entries=int(os.getenv("WORKER_ORG_CONFIG_CACHE_SIZE", "10000")),
+        )
+
+    def get(self, org_id: str) -> OrgConfig:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(org_id)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(org_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        config = self._load(org_id)
+        with self._lock:
+            self._cache[org_id] = (now + self.ttl_s, config)
+            self._cache.move_to_end(org_id)
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return config
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
+
+    def _load(self, org_id: str) -> OrgConfig:
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(
+                    text("SELECT agg_shards, ingest_mode, raw_sample_rate FROM orgs WHERE id = :org_id"),
+                    {"org_id": org_id},
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Could not load settings of org {org_id}, using defaults: {e}")
+            return OrgConfig()
+        if row is None:
+            return OrgConfig()
+        agg_shards, ingest_mode, raw_sample_rate = row
+        return OrgConfig(
+            agg_shards=max(1, agg_shards or 1),
+            ingest_mode=ingest_mode if ingest_mode in INGEST_MODES else "full",
+            raw_sample_rate=max(1, raw_sample_rate or 1),
+        )
+
+
+class CounterShards:
+    """
+    Picks the shard of the sharded aggregate counters (daily_org_agg) this
+    writer adds an org's deltas to.
+
+    Each writer sticks to one slot, so with at least as many shards as
+    writers, concurrent writers of a hot org update different rows instead
+    of queueing on one row lock. The slot is the lowest Kafka partition
+    assigned to the consumer ("partition", unique within the consumer group)
+    or a hash of the host and process ("hash", also the fallback until
+    partitions are assigned). Orgs with one shard always use shard 0.
+    """
+
+    def __init__(self, org_config: OrgConfigCache, by: str = "partition"):
+        if by not in ("partition", "hash"):
+            raise ValueError(f"Unknown shard selection: {by}")
+        self.org_config = org_config
+        self.by = by
+        self.slot = zlib.crc32(f"{socket.gethostname()}:{os.getpid()}".encode())
+
+    @classmethod
+    def from_env(cls, org_config: OrgConfigCache) -> "CounterShards":
+        """WORKER_AGG_SHARD_BY selects "partition" or "hash" slots."""
+        return cls(org_config, os.getenv("WORKER_AGG_SHARD_BY", "partition"))
+
+    def assign_partitions(self, partitions: Iterable[int]):
+        """Take the slot from the consumer's partitions after a rebalance."""
+        partitions = list(partitions)
+        if self.by == "partition" and partitions:
+            self.slot = min(partitions)
+
+    def shard(self, org_id: str) -> int:
+        shards = self.org_config.get(org_id).agg_shards
+        return self.slot % shards if shards > 1 else 0
+
+
+# Raw event attributes hashed to sample events_enriched rows. Gateway events
+# carry no id of their own, so identical events are kept or skipped together.
+SAMPLE_KEY_COLUMNS = (
+    "org_id", "user_id", "provider", "model", "region", "tokens_in", "tokens_out", "ts", "source", "metadata",
+)
+
+
+def sample_key(row) -> bytes:
+    """Bytes identifying an events_enriched row's source event across retries and replays."""
+    return "\x1f".join(str(row.get(column)) for column in SAMPLE_KEY_COLUMNS).encode()
+
+
+class RawEventFilter:
+    """
+    Decides which enriched events get a raw events_enriched row, by the
+    org's ingest mode: every event ("full"), a deterministic 1-in-
+    raw_sample_rate sample ("sampled") or none ("aggregate_only").
+
+    Aggregates are always computed from every event, so they stay exact in
+    all modes. Sampling hashes the attributes the event arrived with (see
+    SAMPLE_KEY_COLUMNS), so a retried or replayed event is kept or skipped
+    the same way each time; its events_enriched id is assigned anew by every
+    enrich() and would not be.
+    """
+
+    def __init__(self, org_config: OrgConfigCache):
+        self.org_config = org_config
+
+    def sample_weight(self, row) -> int:
+        """
+        The events_enriched.sample_weight to store the row with: the number
+        of events it stands for (the sampling rate), or 0 if it is not stored.
+        """
+        config = self.org_config.get(row["org_id"])
+        if config.ingest_mode == "aggregate_only":
+            return 0
+        if config.ingest_mode == "sampled" and config.raw_sample_rate > 1:
+            kept = zlib.crc32(sample_key(row)) % config.raw_sample_rate == 0
+            return config.raw_sample_rate if kept else 0
+        return 1
@@ -0,0 +1,173 @@
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Channel the factors_overrides trigger (API migration 004) notifies on; payload is the org_id
+NOTIFY_CHANNEL = "factors_overrides"
+
+
+class FactorOverride(NamedTuple):
+    """One factors_overrides row. None fields fall back to the global defaults."""
+    kwh_per_call: Optional[float] = None
+    pue: Optional[float] = None
+    water_l_per_kwh: Optional[float] = None
+    co2_kg_per_kwh: Optional[float] = None
+
+
+class OverrideResolver:
+    """
+    In-process LRU+TTL cache of org-scoped factor overrides.
+
+    Entries are keyed by (org_id, provider, model) and hold the matching
+    override, or None when the org has none, so the hot path is a dict
+    lookup and the DB is only queried on a miss or after expiry. An exact
+    model override wins over the provider-wide one (model = "").
+
+    A background thread LISTENs on the factors_overrides channel and drops
+    an org's entries as soon as a change to its overrides commits; the TTL
+    bounds staleness while that connection is down. Each invalidation bumps
+    the org's generation, and a load that started under an older generation
+    is returned but not cached, so a slow read cannot undo an invalidation.
+    """
+
+    def __init__(self, db_url: str, ttl_s: float = 300.0, max_entries: int = 10000,
+                 listen: bool = True, reconnect_backoff_s: float = 5.0):
+        self.db_url = db_url
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.listen = listen
+        self.reconnect_backoff_s = reconnect_backoff_s
+        self.engine = create_engine(db_url)
+        self._cache: "OrderedDict[Tuple[str, str, str], Tuple[float, Optional[FactorOverride]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped per org by invalidate(), and for every org by clear()
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, db_url: str) -> Optional["OverrideResolver"]:
+        """Resolver configured from the environment, or None when overrides are disabled."""
+        if os.getenv("WORKER_FACTOR_OVERRIDES", "1") in ("0", "false", "no"):
+            return None
+        return cls(
+            db_url,
+            ttl_s=float(os.getenv("WORKER_OVERRIDE_CACHE_TTL_S", "300")),
+            max_entries=int(os.getenv("WORKER_OVERRIDE_CACHE_SIZE", "10000")),
+        )
+
+    def get(self, org_id: str, provider: str, model: str) -> Optional[FactorOverride]:
+        """The override applying to (org_id, provider, model), if any."""
+        key = (org_id, provider, model)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            generation = self._generation(org_id)
+
+        override = self._load(org_id, provider, model)
+        with self._lock:
+            if self._generation(org_id) != generation:
+                # Invalidated while loading; the row read may predate the change
+                return override
+            self._cache[key] = (now + self.ttl_s, override)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return override
+
+    def invalidate(self, org_id: str):
+        """Drop every cached entry of one org."""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == org_id]:
+                del self._cache[key]
+            self._generations[org_id] = self._generations.get(org_id, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._epoch += 1
+
+    def _generation(self, org_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(org_id, 0)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hit/miss/invalidation counters and size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "cached": len(self._cache),
+        }
+
+    def start(self):
+        """Start listening for override changes."""
+        if self.listen and self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="factor-overrides", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _load(self, org_id: str, provider: str, model: str) -> Optional[FactorOverride]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("""
+                    SELECT model, kwh_per_call, pue, water_l_per_kwh, co2_kg_per_kwh
+                    FROM factors_overrides
+                    WHERE org_id = :org_id AND provider = :provider AND model IN (:model, '')
+                """),
+                {"org_id": org_id, "provider": provider, "model": model},
+            ).fetchall()
+        if not rows:
+            return None
+        # Exact model first, provider-wide ("") second
+        best = min(rows, key=lambda r: r[0] == "")
+        return FactorOverride(*best[1:])
+
+    def _listen(self):
+        import psycopg2
+
+        dsn = make_url(self.db_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Changes made while we were not listening were missed
+                self.clear()
+                logger.info(f"Listening for factor override changes on '{NOTIFY_CHANNEL}'")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.invalidate(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Factor override listener failed, reconnecting: {e}")
+                self._stop.wait(self.reconnect_backoff_s)
+            finally:
+                if conn is not None:
+                    conn.close()
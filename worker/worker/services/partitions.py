@@ -0,0 +1,94 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+# Daily partitions of events_enriched (API migration 008) are named <prefix>YYYYMMDD
+PARTITION_PREFIX = "events_enriched_p"
+
+_BOUND = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)")
+
+
+class Partition(NamedTuple):
+    """One partition of events_enriched. start/end are None for MINVALUE/MAXVALUE."""
+    name: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    default: bool = False
+
+
+def _bound(value: str) -> Optional[datetime]:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn) -> List[Partition]:
+    """Partitions of events_enriched ordered by start, the default partition last."""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events_enriched'::regclass
+    """)).fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions.append(Partition(name, None, None, default=True))
+            continue
+        start, end = _BOUND.match(bound).groups()
+        partitions.append(Partition(name, _bound(start), _bound(end)))
+    return sorted(partitions, key=lambda p: (p.default, p.start or datetime.min))
+
+
+def _overlaps(partition: Partition, start: datetime, end: datetime) -> bool:
+    if partition.default:
+        return False
+    return (partition.start is None or partition.start < end) and (partition.end is None or start < partition.end)
+
+
+def create_day_partitions(conn, days_ahead: int, today: Optional[date] = None) -> List[str]:
+    """
+    Create the daily partitions from `today` through `today + days_ahead`
+    that no existing partition covers. Returns the names created.
+
+    Each partition is built as a plain table, filled with the rows of its
+    day that had landed in the default partition, and then attached, one
+    transaction per day. events_enriched is locked against inserts before
+    the move: ATTACH checks that the default partition holds no rows of the
+    new day, and a worker inserting one of today's events in between would
+    fail that check. Locking only the default partition is not enough, as an
+    insert routed there before the ATTACH fails once it commits. Inserts wait
+    for each day's commit; reads are not blocked.
+    """
+    today = today or datetime.utcnow().date()
+    partitions = list_partitions(conn)
+    default = next((p.name for p in partitions if p.default), None)
+
+    created = []
+    for i in range(days_ahead + 1):
+        start = datetime.combine(today + timedelta(days=i), datetime.min.time())
+        end = start + timedelta(days=1)
+        if any(_overlaps(p, start, end) for p in partitions):
+            continue
+        name = f"{PARTITION_PREFIX}{start:%Y%m%d}"
+        conn.execute(text(f"CREATE TABLE {name} (LIKE events_enriched INCLUDING DEFAULTS)"))
+        if default is not None:
+            conn.execute(text("LOCK TABLE ONLY events_enriched IN SHARE ROW EXCLUSIVE MODE"))
+            conn.execute(
+                text(f"""
+                    WITH moved AS (
+                        DELETE FROM {default} WHERE ts >= :start AND ts < :end RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                """),
+                {"start": start, "end": end},
+            )
+        conn.execute(text(
+            f"ALTER TABLE events_enriched ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        conn.commit()
+        created.append(name)
+    return created
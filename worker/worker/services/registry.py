@@ -0,0 +1,113 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from worker.services.factors import FactorsService, find_factor_file
+from worker.services.grid_series import series_files
+
+logger = logging.getLogger(__name__)
+
+
+class FactorRegistry:
+    """
+    Hot-reloadable, versioned factor snapshots.
+
+    A background thread watches the factor files and, when they change,
+    loads and compiles a new FactorsService off the hot path, then swaps it
+    in with a single reference assignment. Enrichment takes `snapshot()`
+    once per event or batch, so it never blocks on a reload and never mixes
+    two factor versions in one result. A file that fails to load leaves the
+    current snapshot in place.
+    """
+
+    def __init__(self, factors_path: Optional[Path] = None, grid_path: Optional[Path] = None,
+                 reload_interval_s: float = 30.0, series_path: Optional[Path] = None):
+        self.factors_path = factors_path or find_factor_file("factors_defaults.yaml")
+        self.grid_path = grid_path or find_factor_file("grid_intensity.yaml")
+        self.series_path = series_path
+        self.reload_interval_s = reload_interval_s
+        self._current: Optional[FactorsService] = None
+        self._stamp: Tuple = ()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "FactorRegistry":
+        factors_path = os.getenv("FACTORS_PATH")
+        grid_path = os.getenv("GRID_INTENSITY_PATH")
+        series_path = os.getenv("GRID_INTENSITY_SERIES_PATH")
+        return cls(
+            factors_path=Path(factors_path) if factors_path else None,
+            grid_path=Path(grid_path) if grid_path else None,
+            reload_interval_s=float(os.getenv("WORKER_FACTORS_RELOAD_INTERVAL_S", "30")),
+            series_path=Path(series_path) if series_path else None,
+        )
+
+    @property
+    def version(self) -> str:
+        return self.snapshot().version
+
+    def snapshot(self) -> FactorsService:
+        """The current compiled factor set."""
+        return self._current
+
+    def lookup_stats(self) -> Dict[str, int]:
+        return self.snapshot().lookup_stats()
+
+    def load(self) -> FactorsService:
+        """Build and swap in a new snapshot from the factor files."""
+        stamp = self._file_stamp()
+        factors = FactorsService()
+        factors.load_defaults(self.factors_path, self.grid_path, self.series_path)
+        previous = self._current
+        self._current = factors
+        self._stamp = stamp
+        if previous is None:
+            logger.info(f"Factors version {factors.version} loaded")
+        elif previous.version != factors.version:
+            logger.info(f"Factors reloaded: {previous.version} → {factors.version}")
+        return factors
+
+    def check_for_changes(self) -> bool:
+        """Reload if a factor file changed since the last load. Returns True on reload."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            # Not retried until the files change again
+            self._stamp = stamp
+            logger.error(f"Factor reload failed, keeping version {self.version}: {e}")
+            return False
+
+    def start(self):
+        """Load the first snapshot and start watching for changes."""
+        if self._current is None:
+            self.load()
+        if self.reload_interval_s > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="factor-registry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval_s):
+            self.check_for_changes()
+
+    def _file_stamp(self) -> Tuple:
+        stamp = []
+        for path in (self.factors_path, self.grid_path, *series_files(self.series_path)):
+            try:
+                st = os.stat(path) if path else None
+                stamp.append((st.st_mtime_ns, st.st_size) if st else None)
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
@@ -0,0 +1,118 @@
+"""
+Multi-process supervisor for the worker.
+
+Forks N consumer processes that join the same `ecomind-worker` consumer
+group, so Kafka spreads the `events.raw` partitions across them and each
+process enriches and writes with its own DB engine. Crashed children are
+restarted with exponential backoff; SIGTERM/SIGINT are forwarded to every
+child, which flushes its pending batch and aggregates before exiting.
+"""
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Children are forked so the target needs no pickling and inherits loaded modules
+_mp = multiprocessing.get_context("fork")
+
+
+class Supervisor:
+    """Keeps `num_processes` copies of `target` running until stopped."""
+
+    def __init__(
+        self,
+        target: Callable[[], None],
+        num_processes: int,
+        restart_backoff_s: float = 1.0,
+        max_backoff_s: float = 30.0,
+        shutdown_timeout_s: float = 30.0,
+    ):
+        self.target = target
+        self.num_processes = num_processes
+        self.restart_backoff_s = restart_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.shutdown_timeout_s = shutdown_timeout_s
+        self.children: Dict[int, multiprocessing.Process] = {}
+        self.restarts: Dict[int, int] = {}
+        self._started: Dict[int, float] = {}
+        self._next_start: Dict[int, float] = {}
+        self.stopping = False
+
+    def start(self):
+        """Fork every child slot."""
+        for slot in range(self.num_processes):
+            self._spawn(slot)
+
+    def check_children(self):
+        """Restart children that exited, backing off when they keep crashing."""
+        if self.stopping:
+            return
+        now = time.monotonic()
+        for slot, proc in list(self.children.items()):
+            if proc.is_alive():
+                continue
+            if slot not in self._next_start:
+                # A child that stayed up for a while starts over with the shortest backoff
+                if now - self._started[slot] >= self.max_backoff_s:
+                    self.restarts[slot] = 0
+                restarts = self.restarts.get(slot, 0)
+                delay = min(self.max_backoff_s, self.restart_backoff_s * (2 ** restarts))
+                logger.warning(
+                    f"Worker process {slot} (pid={proc.pid}) exited with code {proc.exitcode}, "
+                    f"restarting in {delay:.1f}s"
+                )
+                self._next_start[slot] = now + delay
+            if now >= self._next_start[slot]:
+                self.restarts[slot] = self.restarts.get(slot, 0) + 1
+                self._spawn(slot)
+
+    def stop(self):
+        """Send SIGTERM to every child and wait for a clean shutdown."""
+        self.stopping = True
+        for proc in self.children.values():
+            if proc.is_alive():
+                proc.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout_s
+        for slot, proc in self.children.items():
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                logger.error(f"Worker process {slot} (pid={proc.pid}) did not stop, killing")
+                proc.kill()
+                proc.join()
+
+    def run(self, poll_interval_s: float = 1.0):
+        """Supervise children until SIGTERM/SIGINT, then shut them all down."""
+
+        def handle_signal(sig, frame):
+            logger.info("Received shutdown signal, stopping worker processes...")
+            self.stopping = True
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        logger.info(f"🚀 Supervising {self.num_processes} worker processes")
+        self.start()
+        try:
+            while not self.stopping:
+                self.check_children()
+                time.sleep(poll_interval_s)
+        finally:
+            self.stop()
+            logger.info("🛑 All worker processes stopped")
+
+    def _spawn(self, slot: int):
+        self._next_start.pop(slot, None)
+        proc = _mp.Process(target=self.target, name=f"ecomind-worker-{slot}", daemon=False)
+        proc.start()
+        self.children[slot] = proc
+        self._started[slot] = time.monotonic()
+        logger.info(f"Started worker process {slot} (pid={proc.pid})")
+
+
+def supervise(target: Callable[[], None], num_processes: int):
+    """Run `target` in `num_processes` supervised child processes."""
+    Supervisor(target, num_processes).run()